@@ -0,0 +1,88 @@
+"""Check that the document core imports quickly and without Qt.
+
+Run from the repository root:
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget 150 --repeat 10
+
+The core modules (document model, geometry, file formats, undo history and
+autosave journal) and the headless render tools are imported in a fresh
+interpreter with `-X importtime`. The fastest of --repeat runs is reported
+with its slowest imports, and the exit status is 1 when any PyQt6 module
+was loaded or the total import time is over --budget milliseconds.
+tests/test_import_budget.py checks the Qt rule on every test run.
+"""
+import argparse
+import subprocess
+import sys
+
+# Modules that must import without PyQt6, e.g. in worker processes and CLI
+# tools; the GUI layer imports Qt itself
+CORE_MODULES = (
+    "path_storage", "spatial_index", "utils", "path_manager", "snapping",
+    "selection", "tools", "history", "curve_fitting", "document_format",
+    "svg_export", "svg_import", "journal", "profiler",
+    "render_cli", "tiled_render",
+)
+# About 150 ms on a development machine, of which numpy is two thirds
+BUDGET_MS = 250
+
+def measure(modules):
+    """Import `modules` in a fresh interpreter.
+
+    Returns (name, self_us, cumulative_us, depth) for every module loaded,
+    in the order `-X importtime` reports them.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return rows
+
+def total_ms(rows):
+    return sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=BUDGET_MS,
+                        help="largest allowed total import time in milliseconds")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="fresh interpreters to run; the fastest counts")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("modules", nargs="*", default=CORE_MODULES,
+                        help="modules to check instead of the core")
+    args = parser.parse_args(argv)
+
+    # The first run also writes the bytecode caches, so it is not counted
+    measure(args.modules)
+    rows = min((measure(args.modules) for _ in range(max(args.repeat, 1))), key=total_ms)
+
+    top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: -row[2])
+    print(f"{'module':36} {'self':>10} {'cumulative':>12}")
+    for name, self_us, cumulative, _ in top_level[:args.top]:
+        print(f"{name:36} {self_us / 1000:8.1f} ms {cumulative / 1000:10.1f} ms")
+    total = total_ms(rows)
+    print(f"{'total':36} {'':>10} {total:10.1f} ms  (budget {args.budget:.0f} ms)")
+
+    failed = False
+    qt = sorted(name for name, _, _, _ in rows if name.split(".")[0] == "PyQt6")
+    if qt:
+        print(f"Qt imported: {', '.join(qt)}")
+        failed = True
+    if total > args.budget:
+        print(f"over budget by {total - args.budget:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
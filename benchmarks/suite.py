@@ -0,0 +1,257 @@
+"""Time the editor's hot paths on reproducible synthetic documents.
+
+Run from the repository root:
+
+    python -m benchmarks.suite -o results.json
+    python -m benchmarks.suite --compare baseline.json
+
+Every benchmark is sampled repeatedly and reported as seconds per call with
+its median and percentiles. With --compare, medians are checked against a
+stored result file and the run fails when one got slower than --threshold.
+Documents are generated from a fixed seed, so runs are comparable.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+
+# Canvas painting is timed without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from path_manager import PathManager, Path
+from tools import ToolState, DirectSelectTool
+from benchmarks.svg_import import build_document
+
+PERCENTILES = (10, 90, 99)
+VIEW_SIZE = (1200, 800)
+
+_application = None
+
+def build_freeform_document(path_count, points_per_path, seed=0):
+    """A few huge freeform paths: smooth random walks across the view."""
+    rng = np.random.default_rng(seed)
+    path_manager = PathManager()
+    for _ in range(path_count):
+        angles = np.cumsum(rng.normal(scale=0.3, size=points_per_path))
+        steps = np.stack((np.cos(angles), np.sin(angles)), axis=1) * 3
+        positions = np.cumsum(steps, axis=0) + rng.random(2) * VIEW_SIZE
+        # Keep the walk on screen by folding it back at the edges
+        positions = np.abs((positions + VIEW_SIZE) % (2 * np.array(VIEW_SIZE)) - VIEW_SIZE)
+        tangents = np.gradient(positions, axis=0) / 3
+        path = Path()
+        path.extend_points(positions, positions - tangents, positions + tangents)
+        path_manager.add_path(path)
+    return path_manager
+
+def build_snap_field(point_count, seed=0):
+    """A tool state with a dense field of snap points over the view."""
+    rng = np.random.default_rng(seed)
+    tool_state = ToolState()
+    for position in rng.random((point_count, 2)) * VIEW_SIZE:
+        tool_state.add_snap_point(position, radius=float(rng.uniform(5, 20)))
+    return tool_state
+
+def query_positions(count, seed=1):
+    """Endless cycle of pointer positions spread over the view."""
+    rng = np.random.default_rng(seed)
+    return itertools.cycle([tuple(p) for p in rng.random((count, 2)) * VIEW_SIZE])
+
+def measure(function, repeat, min_time=0.005):
+    """Return (seconds per call for each sample, calls per sample).
+
+    Fast functions are called several times per sample so that every sample
+    lasts at least `min_time` and timer resolution does not dominate.
+    """
+    function()
+    start = time.perf_counter()
+    function()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / max(once, 1e-9)))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number)
+    return samples, number
+
+def summarize(samples, number):
+    samples = np.asarray(samples)
+    summary = {
+        "median": float(np.median(samples)),
+        "mean": float(samples.mean()),
+        "min": float(samples.min()),
+        "max": float(samples.max()),
+        "samples": len(samples),
+        "calls_per_sample": number,
+    }
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(samples, percentile))
+    return summary
+
+def core_benchmarks(scale):
+    """Yield (name, function) for the benchmarks that need no widgets."""
+    short = build_document(int(5000 * scale), 8)
+    freeform = build_freeform_document(4, int(50000 * scale))
+    paths = list(short.paths)
+
+    yield "bezier_points/short_paths", lambda: [path.get_bezier_points() for path in paths]
+    yield "bezier_points/freeform", lambda: [path.get_bezier_points() for path in freeform.paths]
+    yield "export_svg/short_paths", short.export_svg
+    yield "export_svg/freeform", freeform.export_svg
+
+    # Hit-testing goes through the document's point index, as on the canvas
+    for label, document in (("short_paths", short), ("freeform", freeform)):
+        yield f"find_closest_point/{label}", lambda document=document, positions=query_positions(256): \
+            document.find_closest_point(next(positions), DirectSelectTool.SELECTION_THRESHOLD)
+
+    snap_field = build_snap_field(int(20000 * scale))
+    positions = query_positions(256)
+    yield "snap/snap_points", lambda: snap_field.get_snap_position(next(positions))
+
+    anchors = ToolState()
+    anchors.snap_engine.point_index = short.point_index
+    anchors.snap_engine.snap_to_anchors = True
+    anchors.snap_engine.snap_to_grid = True
+    positions = query_positions(256)
+    yield "snap/anchors_and_grid", lambda: anchors.get_snap_position(next(positions))
+
+def paint_benchmarks(scale):
+    """Yield (name, function) timing full offscreen repaints of a canvas."""
+    global _application
+    from PyQt6.QtCore import QPointF
+    from PyQt6.QtWidgets import QApplication
+    from canvas import Canvas
+    _application = QApplication.instance() or QApplication([])
+
+    documents = (
+        ("short_paths", build_document(int(5000 * scale), 8), ToolState()),
+        ("freeform", build_freeform_document(4, int(50000 * scale)), ToolState()),
+        ("snap_field", PathManager(), build_snap_field(int(20000 * scale))),
+    )
+    for label, path_manager, tool_state in documents:
+        canvas = Canvas(path_manager, tool_state)
+        canvas.resize(*VIEW_SIZE)
+
+        def cold(canvas=canvas):
+            # Everything is redrawn, as after a zoom or a document change
+            canvas.document_changed()
+            canvas.grab()
+
+        def pan(canvas=canvas, steps=itertools.cycle(((8, 5), (-8, -5)))):
+            # Panning reuses the rendered layer and draws only the exposed strips
+            canvas.scroll_view(*next(steps))
+            canvas.grab()
+
+        yield f"paint/{label}_cold", cold
+        yield f"paint/{label}_warm", canvas.grab
+        yield f"paint/{label}_pan", pan
+
+    for label, path_manager, _ in documents[:2]:
+        canvas = Canvas(path_manager, ToolState())
+        canvas.resize(*VIEW_SIZE)
+        # Zoomed out far enough to draw level-of-detail proxies
+        canvas.zoom = 0.1
+        canvas.offset = QPointF(VIEW_SIZE[0] / 2, VIEW_SIZE[1] / 2)
+        canvas.grab()
+        canvas.proxy_cache.wait()
+
+        def overview(canvas=canvas):
+            canvas.static_layer_dirty = True
+            canvas.grab()
+
+        yield f"paint/{label}_overview", overview
+
+def run(names, repeat, scale, progress=None):
+    results = {}
+    for source in (core_benchmarks, paint_benchmarks):
+        for name, function in source(scale):
+            if names and not any(pattern in name for pattern in names):
+                continue
+            results[name] = summarize(*measure(function, repeat))
+            if progress:
+                progress(name, results[name])
+    return results
+
+def environment():
+    from PyQt6.QtCore import QT_VERSION_STR
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "qt": QT_VERSION_STR,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(results, baseline, threshold):
+    """Print each median against the baseline; returns the regressed names."""
+    regressions = []
+    print(f"{'benchmark':36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:36} {'-':>12} {format_time(result['median']):>12}      new")
+            continue
+        ratio = result["median"] / old["median"]
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        else:
+            flag = ""
+        print(f"{name:36} {format_time(old['median']):>12} "
+              f"{format_time(result['median']):>12} {ratio - 1:+8.1%}{flag}")
+    return regressions
+
+def format_time(seconds):
+    for unit, factor in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * factor >= 1:
+            return f"{seconds * factor:.2f} {unit}"
+    return f"{seconds * 1e9:.0f} ns"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="compare with a results file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative slowdown of a median counted as a regression")
+    parser.add_argument("--repeat", type=int, default=25, help="samples per benchmark")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply the synthetic document sizes, e.g. 0.1 for a quick run")
+    parser.add_argument("names", nargs="*", help="only run benchmarks containing these")
+    args = parser.parse_args(argv)
+
+    def progress(name, result):
+        print(f"{name:36} median {format_time(result['median']):>10}  "
+              f"p90 {format_time(result['p90']):>10}", file=sys.stderr)
+
+    results = run(args.names, args.repeat, args.scale, progress)
+    report = {
+        "environment": environment(),
+        "settings": {"repeat": args.repeat, "scale": args.scale},
+        "benchmarks": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("settings", {}).get("scale") != args.scale:
+            print("warning: baseline was recorded with a different --scale", file=sys.stderr)
+        regressions = compare(results, baseline["benchmarks"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
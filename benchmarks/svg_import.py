@@ -0,0 +1,58 @@
+"""Measure SVG import throughput on a synthetic document.
+
+Run from the repository root:
+
+    python -m benchmarks.svg_import --paths 20000 --points 16
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from path_manager import PathManager, Path
+from svg_import import import_svg, iter_svg_paths
+
+def build_document(path_count, points_per_path, seed=0):
+    rng = np.random.default_rng(seed)
+    path_manager = PathManager()
+    for _ in range(path_count):
+        path = Path()
+        centre = rng.random(2) * 800
+        positions = centre + rng.normal(scale=40, size=(points_per_path, 2))
+        path.extend_points(
+            positions,
+            positions + rng.normal(scale=10, size=(points_per_path, 2)),
+            positions + rng.normal(scale=10, size=(points_per_path, 2)),
+        )
+        path_manager.add_path(path)
+    return path_manager
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", type=int, default=20000)
+    parser.add_argument("--points", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "document.svg")
+        build_document(args.paths, args.points).save_svg(filename)
+        size = os.path.getsize(filename)
+
+        parse_timings, import_timings = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            parsed = sum(1 for _ in iter_svg_paths(filename))
+            parse_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            import_svg(filename, PathManager())
+            import_timings.append(time.perf_counter() - start)
+
+    print(f"{parsed} paths, {size / 1e6:.1f} MB")
+    for label, timings in (("parse", parse_timings), ("import + index", import_timings)):
+        best = min(timings)
+        print(f"{label}: best {best:.3f} s, {size / 1e6 / best:.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,337 @@
 from PyQt6.QtWidgets import QWidget
-from PyQt6.QtCore import Qt, QPointF
-from PyQt6.QtGui import QPainter, QPen, QColor, QPainterPath
+from PyQt6.QtCore import Qt, QPointF, QRect, QRectF, QTimer, pyqtSignal
+from PyQt6.QtGui import QPainter, QPen, QColor, QPixmap, QRegion, QTransform
+import math
 import numpy as np
 from styles import Colors
-from tools import ToolMode
-
-class DirectSelectTool:
-    SELECTION_THRESHOLD = 10
-
-    @staticmethod
-    def find_closest_point(pos, path, threshold):
-        closest_point = None
-        min_distance = float('inf')
-        is_handle = False
-        is_in_handle = False
-
-        for point in path.points:
-            dist = distance(pos, point.position)
-            if dist < min_distance:
-                min_distance = dist
-                closest_point = point
-                is_handle = False
-                is_in_handle = False
-
-            if point.handle_in is not None:
-                dist = distance(pos, point.handle_in)
-                if dist < min_distance:
-                    min_distance = dist
-                    closest_point = point
-                    is_handle = True
-                    is_in_handle = True
-
-            if point.handle_out is not None:
-                dist = distance(pos, point.handle_out)
-                if dist < min_distance:
-                    min_distance = dist
-                    closest_point = point
-                    is_handle = True
-                    is_in_handle = False
-
-        return closest_point, is_handle, is_in_handle
-
-def distance(p1, p2):
-    return np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+from tools import ToolMode, DirectSelectTool
+from render_cache import PainterPathCache, draw_path, draw_path_part
+from lod import ProxyCache, draw_proxies, level_for_zoom
+from grid_renderer import GridRenderer
+from curve_fitting import StrokeFitter
+from frame_scheduler import FrameScheduler
+from profiler import FrameProfiler
+from selection import SelectionTransform, translation, scaling, rotation
+from utils import distance
 
 class Canvas(QWidget):
-    def __init__(self, path_manager, tool_state):
+    # How far anchors and handle markers reach beyond their point, in scene units
+    CONTROL_POINT_EXTENT = 6
+    MAX_SELECTION_MARKERS = 5000
+    # Zoom factor per wheel step, and the zoom range
+    ZOOM_STEP = 1.1
+    MIN_ZOOM = 0.005
+    MAX_ZOOM = 200.0
+    # Wheel steps closer together than this are previewed by scaling the last
+    # render; full quality follows once the wheel has been idle this long
+    ZOOM_SETTLE_MS = 150
+    # Emitted with a StrokeStats after each freeform stroke is fitted
+    stroke_fitted = pyqtSignal(object)
+    # Emitted from the proxy worker thread; delivered on the GUI thread
+    proxies_ready = pyqtSignal()
+
+    def __init__(self, path_manager, tool_state, history=None):
         super().__init__()
         self.path_manager = path_manager
         self.tool_state = tool_state
+        # Each press-drag-release gesture becomes one undo entry
+        self.history = history
         self.zoom = 1.0
         self.offset = QPointF(0, 0)
-        self.grid_size = 20
         self.last_freeform_pos = None
-        self.freeform_distance_threshold = 10
+        # Raw samples are cheap now that strokes are fitted, so keep them dense
+        self.freeform_distance_threshold = 2
+        # Maximum fitting error for freeform strokes, in screen pixels
+        self.freeform_tolerance = 2.0
+        self.stroke_fitter = None
+        # Pointer moves are batched and applied once per frame
+        self.move_scheduler = FrameScheduler(self.process_moves, self.keeps_every_sample, self)
+        # Off by default; see `set_profiler_hud` and `FrameProfiler`
+        self.profiler = FrameProfiler()
+        self.hud_rect = QRect()
+        self.path_cache = PainterPathCache()
+        # Simplified stand-ins for paths in zoomed-out views, see `lod`
+        self.proxy_cache = ProxyCache(self.proxies_ready.emit)
+        self.proxies_ready.connect(self.on_proxies_ready)
+        self.grid_renderer = GridRenderer()
+        self.static_layer = None
+        self.static_layer_key = None
+        self.static_layer_dirty = True
+        # (zoom, offset) the static layer was rendered at
+        self.static_layer_view = None
+        self.zoom_settle_timer = QTimer(self)
+        self.zoom_settle_timer.setSingleShot(True)
+        self.zoom_settle_timer.setInterval(self.ZOOM_SETTLE_MS)
+        self.zoom_settle_timer.timeout.connect(self.update)
+        # Middle-drag or Space-drag pans; pointer position and button of the pan
+        self.pan_last = None
+        self.pan_button = None
+        self.space_held = False
+        # Paths drawn every frame on top of the static layer
+        self.live_path_ids = set()
+        # Select tool drags: a rubber band (start, end) or a transform
+        self.rubber_band = None
+        self.selection_transform = None
+        self.transform_mode = None
+        self.transform_start = None
+        self.transform_origin = None
+        self.transform_box = None
+        self.transform_current = None
+        # (pixmap, path ids, view) of fully selected paths rendered at drag start
+        self.transform_layer = None
+        self.path_manager.observers.append(self.on_path_changed)
+        self.tool_state.snap_engine.point_index = self.path_manager.point_index
         self.setMouseTracking(True)
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        # The static layer covers the widget, so scrolling can move its pixels
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+
+    @property
+    def grid_size(self):
+        # Kept by the snap engine, so snapping and drawing use the same grid
+        return self.tool_state.snap_engine.grid_size
+
+    @grid_size.setter
+    def grid_size(self, value):
+        self.tool_state.snap_engine.grid_size = value
+        self.update()
 
     def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        profiler = self.profiler
+        with profiler.span("frame"):
+            active_path = self.path_manager.current_path
+            live_paths = self.live_paths()
+            with profiler.span("cull"):
+                scene_rect = self.visible_scene_rect()
+                visible_paths = self.path_manager.paths_in_rect(*scene_rect)
+            if profiler.active:
+                profiler.count("paths culled", len(self.path_manager.paths) - len(visible_paths))
+
+            # Grid, snap points and paths not being edited come from a cached
+            # layer, which is only scaled while wheel zooming is in progress
+            previewing = self.zoom_settle_timer.isActive() and self.static_layer is not None
+            if not previewing:
+                self.update_static_layer(live_paths, visible_paths)
+
+            # Only the damaged part of the widget needs repainting
+            dirty_rect = event.rect()
+            ratio = self.static_layer.devicePixelRatio()
+            painter = QPainter(self)
+            painter.setClipRect(dirty_rect)
+            with profiler.span("static layer"):
+                if previewing:
+                    self.draw_zoom_preview(painter)
+                else:
+                    painter.drawPixmap(
+                        QRectF(dirty_rect), self.static_layer,
+                        QRectF(dirty_rect.x() * ratio, dirty_rect.y() * ratio,
+                               dirty_rect.width() * ratio, dirty_rect.height() * ratio)
+                    )
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+            # Apply zoom and pan
+            painter.translate(self.offset)
+            painter.scale(self.zoom, self.zoom)
+
+            dirty_scene_rect = self.widget_to_scene_rect(dirty_rect)
+
+            # Draw the paths being edited
+            if self.transform_layer is not None and self.transform_layer[2] != self.view_key():
+                self.transform_layer = None
+            previewed = set()
+            with profiler.span("live paths"):
+                if self.transform_layer is not None:
+                    self.draw_transform_layer(painter)
+                    previewed = self.transform_layer[1]
+                for path in live_paths:
+                    if id(path) in previewed:
+                        continue
+                    if self.intersects(path.bounds(), dirty_scene_rect):
+                        self.draw_path(painter, path)
+                        profiler.count("paths drawn")
+
+            if self.tool_state.current_mode == ToolMode.SELECT:
+                with profiler.span("selection"):
+                    self.draw_selection(painter, dirty_scene_rect)
+            elif active_path:
+                # Draw control points and handles
+                with profiler.span("control points"):
+                    self.draw_control_points(painter, dirty_scene_rect)
+
+            if profiler.enabled:
+                painter.resetTransform()
+                self.draw_hud(painter)
+            painter.end()
+        self.count_snap_queries()
+        profiler.end_frame()
+
+    def count_snap_queries(self):
+        """Move the snap engine's query cost since the last frame into the profiler."""
+        stats = self.tool_state.snap_engine.stats
+        if self.profiler.active and stats.query_count:
+            self.profiler.count("snap queries", stats.query_count)
+            self.profiler.count("snap max ms", stats.max_time * 1000)
+        stats.reset()
+
+    def draw_zoom_preview(self, painter):
+        """Draw the static layer scaled from the view it was rendered at."""
+        zoom, offset = self.static_layer_view
+        painter.save()
+        painter.fillRect(self.rect(), QColor(Colors.BACKGROUND))
+        painter.translate(self.offset)
+        painter.scale(self.zoom / zoom, self.zoom / zoom)
+        painter.translate(-offset)
+        painter.drawPixmap(0, 0, self.static_layer)
+        painter.restore()
+
+    def document_changed(self):
+        """Drop cached rendering after the whole document was replaced."""
+        self.path_cache.clear()
+        self.proxy_cache.clear()
+        self.static_layer_dirty = True
+        self.update()
+
+    def on_proxies_ready(self):
+        # Paths drawn in full while their proxies were built can now be redrawn
+        if self.proxy_cache.collect():
+            self.static_layer_dirty = True
+            self.update()
+
+    def set_profiler_hud(self, enabled):
+        """Show or hide the profiler HUD; timing only runs while it is shown."""
+        self.profiler.enabled = enabled
+        self.profiler.reset()
+        self.hud_rect = QRect()
+        self.update()
+
+    def draw_hud(self, painter):
+        """Draw the profiler's summary of the last frame in the top-left corner."""
+        lines = self.profiler.hud_lines()
+        metrics = painter.fontMetrics()
+        line_height = metrics.height()
+        rect = QRect(8, 8, max(metrics.horizontalAdvance(line) for line in lines) + 12,
+                     len(lines) * line_height + 8)
+        # The HUD grows with the number of stages; repaint its largest extent
+        self.hud_rect = self.hud_rect.united(rect)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 170))
+        painter.drawRect(rect)
+        painter.setPen(QColor(Colors.BACKGROUND))
+        for row, line in enumerate(lines):
+            painter.drawText(rect.left() + 6, rect.top() + 4 + metrics.ascent() + row * line_height,
+                             line)
+
+    def history_changed(self):
+        """Repaint after undo or redo replaced edits anywhere in the document."""
+        self.tool_state.reset_state()
+        self.static_layer_dirty = True
+        self.update()
+
+    def on_path_changed(self, path, indices):
+        if id(path) not in self.live_path_ids:
+            self.static_layer_dirty = True
+
+    def live_paths(self):
+        """Paths drawn every frame instead of from the static layer.
+
+        That is the path being edited and, with the select tool, every path
+        with selected points, so dragging a selection never re-renders the
+        rest of the document.
+        """
+        current = self.path_manager.current_path
+        live = [] if current is None else [current]
+        if self.tool_state.current_mode == ToolMode.SELECT:
+            live += [path for path in self.tool_state.selection.paths() if path is not current]
+        return live
+
+    def layer_key(self, live_ids):
+        """Everything the static layer's pixels depend on besides the paths."""
+        return (
+            self.width(), self.height(), self.devicePixelRatioF(),
+            self.zoom, self.offset.x(), self.offset.y(), self.grid_size,
+            self.tool_state.show_snap_radius, len(self.tool_state.snap_points),
+            live_ids,
+        )
+
+    def update_static_layer(self, live_paths, visible_paths):
+        """Re-render the cached static layer if anything it shows changed."""
+        live_ids = tuple(map(id, live_paths))
+        key = self.layer_key(live_ids)
+        if (self.static_layer is not None and not self.static_layer_dirty
+                and key == self.static_layer_key):
+            return
 
-        # Apply zoom and pan
+        self.live_path_ids = set(live_ids)
+        self.static_layer = self.new_layer()
+        self.render_static_layer(self.static_layer, visible_paths)
+        self.static_layer_key = key
+        self.static_layer_view = (self.zoom, QPointF(self.offset))
+        self.static_layer_dirty = False
+
+    def new_layer(self):
+        """Widget-sized pixmap filled with the canvas background."""
+        ratio = self.devicePixelRatioF()
+        layer = QPixmap(max(1, round(self.width() * ratio)), max(1, round(self.height() * ratio)))
+        layer.setDevicePixelRatio(ratio)
+        layer.fill(QColor(Colors.BACKGROUND))
+        return layer
+
+    def render_static_layer(self, layer, visible_paths=None, rect=None):
+        """Draw the grid, snap points and non-live paths into `layer`.
+
+        With a widget `rect` only that part is drawn, e.g. a strip scrolled
+        into view, and the paths reaching into it are looked up here.
+        """
+        painter = QPainter(layer)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        scene_rect = self.visible_scene_rect()
+        draw_path = self.draw_path
+        if rect is not None:
+            painter.setClipRect(rect)
+            # Include lines and antialiasing that spill into the strip
+            scene_rect = self.widget_to_scene_rect(rect.adjusted(-2, -2, 2, 2))
+            visible_paths = self.path_manager.paths_in_rect(*scene_rect)
+            draw_path = lambda painter, path: draw_path_part(painter, path, self.path_cache, scene_rect)
         painter.translate(self.offset)
         painter.scale(self.zoom, self.zoom)
 
+        profiler = self.profiler
         # Draw grid
-        self.draw_grid(painter)
+        with profiler.span("grid"):
+            self.draw_grid(painter, scene_rect)
 
         # Draw snap points and their radii
         if self.tool_state.show_snap_radius:
-            self.draw_snap_points(painter)
-
-        # Draw paths
-        for path in self.path_manager.paths:
-            self.draw_path(painter, path)
-
-        # Draw control points and handles
-        if self.path_manager.current_path:
-            self.draw_control_points(painter)
-
+            with profiler.span("snap points"):
+                self.draw_snap_points(painter, scene_rect)
+
+        # Draw paths that intersect the visible scene area
+        drawn = 0
+        with profiler.span("paths"):
+            if level_for_zoom(self.zoom) < 0:
+                for path in visible_paths:
+                    if id(path) not in self.live_path_ids:
+                        draw_path(painter, path)
+                        drawn += 1
+            else:
+                # Zoomed out far enough that simplified proxies look the same
+                static_paths = [path for path in visible_paths
+                                if id(path) not in self.live_path_ids]
+                proxies = draw_proxies(painter, static_paths, self.zoom, self.proxy_cache,
+                                       lambda path: draw_path(painter, path))
+                drawn = len(static_paths)
+                profiler.count("paths from proxies", proxies)
+        profiler.count("paths drawn", drawn)
         painter.end()
 
-    def draw_snap_points(self, painter):
+    def draw_snap_points(self, painter, scene_rect=None):
+        if scene_rect is not None:
+            # Leave room for the pens
+            left, top, right, bottom = scene_rect
+            scene_rect = (left - 1, top - 1, right + 1, bottom + 1)
         for snap_point in self.tool_state.snap_points:
+            if scene_rect is not None and not self.intersects(self.snap_point_box(snap_point), scene_rect):
+                continue
             # Draw snap point
             painter.setPen(QPen(QColor(Colors.ACCENT), 2))
             painter.drawEllipse(QPointF(*snap_point.position), 4, 4)
@@ -96,51 +345,25 @@ class Canvas(QWidget):
                     snap_point.radius
                 )
 
-    def draw_grid(self, painter):
-        painter.setPen(QPen(QColor(Colors.GRID), 1))
-
-        # Calculate visible area
-        visible_rect = self.rect()
-        start_x = int(visible_rect.left() / self.grid_size) * self.grid_size
-        end_x = int(visible_rect.right() / self.grid_size + 1) * self.grid_size
-        start_y = int(visible_rect.top() / self.grid_size) * self.grid_size
-        end_y = int(visible_rect.bottom() / self.grid_size + 1) * self.grid_size
-
-        # Draw vertical lines
-        for x in range(start_x, end_x, self.grid_size):
-            painter.drawLine(x, start_y, x, end_y)
-
-        # Draw horizontal lines
-        for y in range(start_y, end_y, self.grid_size):
-            painter.drawLine(start_x, y, end_x, y)
+    def draw_grid(self, painter, scene_rect=None):
+        self.grid_renderer.draw(
+            painter, scene_rect or self.visible_scene_rect(), self.grid_size, self.zoom
+        )
 
     def draw_path(self, painter, path):
-        if not path.points:
-            return
-
-        painter_path = QPainterPath()
-        bezier_points = path.get_bezier_points()
+        draw_path(painter, path, self.path_cache)
 
-        if len(bezier_points) < 4:
-            return
-
-        painter_path.moveTo(bezier_points[0][0], bezier_points[0][1])
-
-        for i in range(1, len(bezier_points)-2, 3):
-            painter_path.cubicTo(
-                bezier_points[i][0], bezier_points[i][1],
-                bezier_points[i+1][0], bezier_points[i+1][1],
-                bezier_points[i+2][0], bezier_points[i+2][1]
+    def draw_control_points(self, painter, scene_rect=None):
+        points = self.path_manager.current_path.points
+        if scene_rect is None:
+            indices = range(len(points))
+        else:
+            indices = self.control_points_in_rect(
+                self.path_manager.current_path, scene_rect
             )
 
-        if path.is_closed:
-            painter_path.closeSubpath()
-
-        painter.setPen(QPen(QColor(path.stroke_color), path.stroke_width))
-        painter.drawPath(painter_path)
-
-    def draw_control_points(self, painter):
-        for point in self.path_manager.current_path.points:
+        for index in indices:
+            point = points[index]
             # Draw anchor point in accent color
             painter.setPen(QPen(QColor(Colors.ACCENT), 2))
             painter.setBrush(QColor(Colors.ACCENT))
@@ -171,52 +394,194 @@ class Canvas(QWidget):
                 painter.setBrush(QColor(Colors.ACTIVE))
                 painter.drawEllipse(QPointF(*point.handle_out), 3, 3)
 
+    def draw_selection(self, painter, scene_rect):
+        """Mark the selected anchors, frame the selection and the rubber band."""
+        selection = self.tool_state.selection
+        pen = QPen(QColor(Colors.ACCENT), 1)
+        pen.setCosmetic(True)
+        # Huge selections are only framed; markers would hide the shapes
+        if selection and len(selection) <= self.MAX_SELECTION_MARKERS:
+            anchors = selection.anchors()
+            left, top, right, bottom = scene_rect
+            visible = anchors[(anchors[:, 0] >= left) & (anchors[:, 0] <= right) &
+                              (anchors[:, 1] >= top) & (anchors[:, 1] <= bottom)]
+            size = 3 / self.zoom
+            painter.setPen(pen)
+            painter.setBrush(QColor(Colors.ACCENT))
+            painter.drawRects([QRectF(x - size, y - size, 2 * size, 2 * size)
+                               for x, y in visible.tolist()])
+        if selection:
+            if self.selection_transform is not None:
+                # The frame follows the drag, so a rotation shows as one
+                left, top, right, bottom = self.transform_box
+                corners = np.array([[left, top, 1], [right, top, 1],
+                                    [right, bottom, 1], [left, bottom, 1]])
+                corners = corners @ self.transform_current.T
+            else:
+                left, top, right, bottom = selection.bounds()
+                corners = np.array([[left, top], [right, top], [right, bottom], [left, bottom]])
+            pen.setStyle(Qt.PenStyle.DashLine)
+            painter.setPen(pen)
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawPolygon([QPointF(x, y) for x, y in corners[:, :2].tolist()])
+
+        if self.rubber_band is not None:
+            (x0, y0), (x1, y1) = self.rubber_band
+            pen.setStyle(Qt.PenStyle.DashLine)
+            painter.setPen(pen)
+            fill = QColor(Colors.ACCENT)
+            fill.setAlpha(40)
+            painter.setBrush(fill)
+            painter.drawRect(QRectF(min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0)))
+
+    def control_points_in_rect(self, path, scene_rect):
+        """Indices of points whose anchor or handles reach into `scene_rect`."""
+        storage = path.storage
+        n = storage.count
+        positions = storage.positions[:n]
+        handles_in = np.where(storage.has_in[:n, None], storage.handles_in[:n], positions)
+        handles_out = np.where(storage.has_out[:n, None], storage.handles_out[:n], positions)
+        low = np.minimum(np.minimum(positions, handles_in), handles_out) - self.CONTROL_POINT_EXTENT
+        high = np.maximum(np.maximum(positions, handles_in), handles_out) + self.CONTROL_POINT_EXTENT
+
+        left, top, right, bottom = scene_rect
+        inside = ((low[:, 0] <= right) & (high[:, 0] >= left) &
+                  (low[:, 1] <= bottom) & (high[:, 1] >= top))
+        return np.flatnonzero(inside)
+
     def mousePressEvent(self, event):
+        # Panning takes over only when no other drag is in progress
+        if (self.pan_last is None and event.buttons() == event.button() and
+                (event.button() == Qt.MouseButton.MiddleButton or
+                 event.button() == Qt.MouseButton.LeftButton and self.space_held)):
+            self.begin_pan(event.position(), event.button())
+            return
+        if self.pan_last is not None:
+            return
+        with self.profiler.span("mousePressEvent", "input"):
+            self.apply_press(event)
+
+    def apply_press(self, event):
+        """Apply a press that starts a tool gesture."""
+        self.move_scheduler.flush()
+        if self.history is not None:
+            self.history.begin()
         pos = self.transform_pos(event.position())
         current_pos = np.array([pos.x(), pos.y()])
-        snapped_pos = self.tool_state.get_snap_position(current_pos)
+        with self.profiler.span("snap", "input"):
+            snapped_pos = self.tool_state.get_snap_position(current_pos)
+        previous_path = self.path_manager.current_path
+        damage = QRegion()
 
         if self.tool_state.current_mode == ToolMode.ADD_SNAP_POINT:
             self.tool_state.add_snap_point(current_pos)
+            snap_point = self.tool_state.snap_points[-1]
+            damage += self.scene_box_to_widget_rect(
+                self.snap_point_box(snap_point), self.CONTROL_POINT_EXTENT
+            )
         elif self.tool_state.current_mode == ToolMode.PEN:
             if not self.path_manager.current_path:
                 self.path_manager.start_new_path()
             self.tool_state.is_drawing = True
-            self.path_manager.current_path.add_point(snapped_pos)
+            current_path = self.path_manager.current_path
+            damage += self.damaged_rect(current_path, len(current_path.points) - 1)
+            current_path.add_point(snapped_pos)
+            damage += self.damaged_rect(current_path, len(current_path.points) - 1)
         elif self.tool_state.current_mode == ToolMode.DIRECT_SELECT:
-            if self.path_manager.current_path:
-                point, is_handle, is_in_handle = DirectSelectTool.find_closest_point(
-                    current_pos,
-                    self.path_manager.current_path,
-                    DirectSelectTool.SELECTION_THRESHOLD / self.zoom
+            threshold = DirectSelectTool.SELECTION_THRESHOLD / self.zoom
+            with self.profiler.span("hit test", "input"):
+                path, point, is_handle, is_in_handle = self.path_manager.find_closest_point(
+                    current_pos, threshold
                 )
-                self.tool_state.selected_point = point
-                self.tool_state.selected_handle = is_handle
-                self.tool_state.is_handle_in = is_in_handle
-                self.tool_state.last_pos = snapped_pos
+                # Clicking the stroke itself selects its path; with Ctrl it
+                # also inserts an anchor there, ready to be dragged
+                hit = None if path is not None else \
+                    self.path_manager.find_closest_segment(current_pos, threshold)
+            if hit is not None:
+                path, segment, t, _ = hit
+                if (event.modifiers() & Qt.KeyboardModifier.ControlModifier
+                        and path.segments_follow_points()):
+                    damage += self.damaged_rect(path)
+                    point = path.points[path.split_segment(segment, t)]
+            if path is not None:
+                self.path_manager.current_path = path
+            self.tool_state.selected_point = point
+            self.tool_state.selected_handle = is_handle
+            self.tool_state.is_handle_in = is_in_handle
+            self.tool_state.last_pos = snapped_pos
+        elif self.tool_state.current_mode == ToolMode.SELECT:
+            self.begin_selection_drag(current_pos, snapped_pos, event.modifiers())
+            damage += self.rect()
         elif self.tool_state.current_mode == ToolMode.FREEFORM:
             if not self.path_manager.current_path:
                 self.path_manager.start_new_path()
             self.tool_state.is_drawing = True
             self.last_freeform_pos = current_pos
-            self.path_manager.current_path.add_point(snapped_pos)
-
-        self.update()
+            current_path = self.path_manager.current_path
+            self.stroke_fitter = StrokeFitter(current_path, self.freeform_tolerance / self.zoom)
+            damage += self.damaged_rect(current_path, len(current_path.points) - 1)
+            self.stroke_fitter.begin(snapped_pos)
+            damage += self.damaged_rect(current_path, len(current_path.points) - 1)
+
+        if self.path_manager.current_path is not previous_path:
+            # The edited path moves between layers, so repaint everything
+            self.update()
+        else:
+            self.update_region(damage)
 
     def mouseMoveEvent(self, event):
-        pos = self.transform_pos(event.position())
-        current_pos = np.array([pos.x(), pos.y()])
-        snapped_pos = self.tool_state.get_snap_position(current_pos)
+        if self.pan_last is not None:
+            # Pans work in widget pixels
+            self.move_scheduler.push(event.position())
+        else:
+            pos = self.transform_pos(event.position())
+            self.move_scheduler.push(np.array([pos.x(), pos.y()]))
+        self.profiler.count("input events")
+
+    def keeps_every_sample(self):
+        """Freeform strokes need every sample; other drags only the latest."""
+        return self.tool_state.current_mode == ToolMode.FREEFORM and self.tool_state.is_drawing
+
+    def process_moves(self, samples):
+        with self.profiler.span("mouse moves", "input"):
+            self.profiler.count("input samples", len(samples))
+            if self.pan_last is not None:
+                self.pan_to(samples[-1])
+                return
+            damage = QRegion()
+            for current_pos in samples:
+                damage += self.apply_move(current_pos)
+            self.update_region(damage)
+
+    def apply_move(self, current_pos):
+        """Apply one pointer sample and return the widget region it damaged."""
+        with self.profiler.span("snap", "input"):
+            snapped_pos = self.tool_state.get_snap_position(
+                current_pos, exclude=self.tool_state.selected_point
+            )
+        damage = QRegion()
 
         if self.tool_state.current_mode == ToolMode.PEN and self.tool_state.is_drawing:
             current_path = self.path_manager.current_path
             if current_path and current_path.points:
                 last_point = current_path.points[-1]
+                # Adding a handle shifts the segment layout of the whole path
+                index = None if last_point.handle_out is None else last_point.index
+                damage += self.damaged_rect(current_path, index)
                 # Use snapped position for handle
                 last_point.handle_out = snapped_pos
+                damage += self.damaged_rect(current_path, index)
 
         elif self.tool_state.current_mode == ToolMode.DIRECT_SELECT:
             if self.tool_state.selected_point:
+                point = self.tool_state.selected_point
+                index = point.index
+                if self.tool_state.selected_handle and point.is_smooth:
+                    partner = point.handle_out if self.tool_state.is_handle_in else point.handle_in
+                    if partner is None:
+                        index = None
+                damage += self.damaged_rect(point.path, index)
+
                 if self.tool_state.selected_handle:
                     # Moving a handle - use snapped position
                     if self.tool_state.is_handle_in:
@@ -234,39 +599,390 @@ class Canvas(QWidget):
                                 self.tool_state.selected_point.position + diff
                             )
                 else:
-                    # Moving the anchor point
+                    # Moving the anchor point with its handles in one update
                     delta = snapped_pos - self.tool_state.last_pos
-                    self.tool_state.selected_point.position += delta
-                    if self.tool_state.selected_point.handle_in is not None:
-                        self.tool_state.selected_point.handle_in += delta
-                    if self.tool_state.selected_point.handle_out is not None:
-                        self.tool_state.selected_point.handle_out += delta
+                    storage = point.path.storage
+                    point.path.set_points((index,), storage.positions[index] + delta,
+                                          storage.handles_in[index] + delta,
+                                          storage.handles_out[index] + delta)
                     self.tool_state.last_pos = snapped_pos
 
+                damage += self.damaged_rect(point.path, index)
+
+        elif self.tool_state.current_mode == ToolMode.SELECT:
+            if self.rubber_band is not None:
+                self.rubber_band = (self.rubber_band[0], current_pos)
+                damage += self.rect()
+            elif self.selection_transform is not None:
+                self.transform_current = self.transform_matrix(snapped_pos)
+                self.selection_transform.apply(self.transform_current)
+                damage += self.rect()
+
         elif self.tool_state.current_mode == ToolMode.FREEFORM and self.tool_state.is_drawing:
             if self.last_freeform_pos is not None:
                 dist = distance(current_pos, self.last_freeform_pos)
-                if dist >= self.freeform_distance_threshold:
-                    self.path_manager.current_path.add_point(snapped_pos)
+                if dist >= self.freeform_distance_threshold / self.zoom:
+                    # The fitter may rewrite the stroke from its last committed anchor
+                    fitter = self.stroke_fitter
+                    start = fitter.anchor_index
+                    damage += self.damaged_tail(fitter.path, start)
+                    with self.profiler.span("fit stroke", "input"):
+                        fitter.add_sample(snapped_pos)
+                    damage += self.damaged_tail(fitter.path, start)
                     self.last_freeform_pos = current_pos
 
-        self.update()
+        return damage
 
     def mouseReleaseEvent(self, event):
+        if self.pan_last is not None:
+            if event.button() == self.pan_button:
+                self.move_scheduler.flush()
+                self.end_pan()
+            return
+        with self.profiler.span("mouseReleaseEvent", "input"):
+            self.apply_release()
+
+    def apply_release(self):
+        """Finish the tool gesture started by `apply_press`."""
+        self.move_scheduler.flush()
         if self.tool_state.current_mode == ToolMode.FREEFORM:
             self.last_freeform_pos = None
+            if self.stroke_fitter is not None:
+                self.finish_stroke()
+        if self.rubber_band is not None:
+            self.finish_rubber_band()
+        if self.selection_transform is not None:
+            self.finish_transform()
         self.tool_state.is_drawing = False
         self.tool_state.selected_point = None
         self.tool_state.selected_handle = None
+        if self.history is not None:
+            self.history.commit()
+
+    def begin_selection_drag(self, pos, snapped_pos, modifiers):
+        """Start a select-tool drag depending on what was clicked.
+
+        Clicking an anchor or a stroke selects it and starts moving the
+        selection; with Shift it is added to the selection instead, or an
+        already selected anchor is deselected. Ctrl-drag scales and Alt-drag
+        rotates the selection about its centre. Anywhere else starts a
+        rubber band.
+        """
+        selection = self.tool_state.selection
+        extend = bool(modifiers & Qt.KeyboardModifier.ShiftModifier)
+        if selection and modifiers & Qt.KeyboardModifier.ControlModifier:
+            self.start_transform("scale", snapped_pos)
+            return
+        if selection and modifiers & Qt.KeyboardModifier.AltModifier:
+            self.start_transform("rotate", snapped_pos)
+            return
+
+        threshold = DirectSelectTool.SELECTION_THRESHOLD / self.zoom
+        with self.profiler.span("hit test", "input"):
+            path, point, _, _ = self.path_manager.find_closest_point(pos, threshold)
+            hit = None if path is not None else \
+                self.path_manager.find_closest_segment(pos, threshold)
+        if point is not None:
+            if extend and selection.contains(path, point.index):
+                selection.toggle(path, point.index)
+                return
+            if not selection.contains(path, point.index):
+                if not extend:
+                    selection.clear()
+                selection.add(path, (point.index,))
+        elif hit is not None:
+            path = hit[0]
+            if path not in selection.items or extend:
+                if not extend:
+                    selection.clear()
+                selection.select_path(path)
+        else:
+            if not extend:
+                selection.clear()
+            self.rubber_band = (pos, pos)
+            return
+        self.start_transform("move", snapped_pos)
+
+    def start_transform(self, mode, pos):
+        selection = self.tool_state.selection
+        box = selection.bounds()
+        self.transform_box = box
+        self.selection_transform = SelectionTransform(selection)
+        self.transform_mode = mode
+        self.transform_start = pos
+        self.transform_origin = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+        self.transform_current = np.eye(3)
+        # The dragged points are re-indexed once, when the drag ends
+        for path in selection.paths():
+            self.path_manager.point_index.suspend_path(path)
+        # Paths that move as a whole keep their shape, so they are drawn
+        # once and the image is transformed for the rest of the drag
+        rigid = [path for path in selection.paths()
+                 if len(selection.indices(path)) == path.storage.count]
+        if rigid:
+            self.render_transform_layer(rigid)
+
+    def view_key(self):
+        return (self.width(), self.height(), self.devicePixelRatioF(),
+                self.zoom, self.offset.x(), self.offset.y())
+
+    def render_transform_layer(self, paths):
+        ratio = self.devicePixelRatioF()
+        layer = QPixmap(max(1, round(self.width() * ratio)), max(1, round(self.height() * ratio)))
+        layer.setDevicePixelRatio(ratio)
+        layer.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(layer)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.translate(self.offset)
+        painter.scale(self.zoom, self.zoom)
+        for path in paths:
+            self.draw_path(painter, path)
+        painter.end()
+        self.transform_layer = (layer, {id(path) for path in paths}, self.view_key())
+
+    def draw_transform_layer(self, painter):
+        """Draw the drag-start image of rigidly moved paths under the current matrix."""
+        m = self.transform_current
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        # Widget -> scene, then the drag's affine matrix, then back to the widget
+        painter.setTransform(QTransform(m[0, 0], m[1, 0], m[0, 1], m[1, 1], m[0, 2], m[1, 2]), True)
+        painter.scale(1 / self.zoom, 1 / self.zoom)
+        painter.translate(-self.offset)
+        painter.drawPixmap(0, 0, self.transform_layer[0])
+        painter.restore()
+
+    def transform_matrix(self, pos):
+        """Affine matrix of the current drag for pointer position `pos`."""
+        start, origin = self.transform_start, self.transform_origin
+        if self.transform_mode == "scale":
+            base = distance(start, origin)
+            factor = distance(pos, origin) / base if base > 1e-9 else 1.0
+            return scaling(factor, factor, origin)
+        if self.transform_mode == "rotate":
+            angle = (math.atan2(pos[1] - origin[1], pos[0] - origin[0]) -
+                     math.atan2(start[1] - origin[1], start[0] - origin[0]))
+            return rotation(angle, origin)
+        return translation(pos[0] - start[0], pos[1] - start[1])
+
+    def finish_transform(self):
+        selection = self.tool_state.selection
+        for path in selection.paths():
+            self.path_manager.point_index.resume_path(path, selection.indices(path))
+        self.selection_transform = None
+        self.transform_mode = None
+        self.transform_layer = None
         self.update()
 
-    def wheelEvent(self, event):
-        zoom_factor = 1.1
-        if event.angleDelta().y() < 0:
-            self.zoom /= zoom_factor
+    def finish_rubber_band(self):
+        (x0, y0), (x1, y1) = self.rubber_band
+        self.rubber_band = None
+        self.tool_state.selection.select_rect(
+            self.path_manager, min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+        )
+        self.update()
+
+    def finish_stroke(self):
+        """Fit the rest of the freeform stroke and report its point reduction."""
+        fitter = self.stroke_fitter
+        self.stroke_fitter = None
+        start = fitter.anchor_index
+        damage = QRegion(self.damaged_tail(fitter.path, start))
+        stats = fitter.finish()
+        damage += self.damaged_tail(fitter.path, start)
+        self.update_region(damage)
+        self.stroke_fitted.emit(stats)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key.Key_Space:
+            if not event.isAutoRepeat():
+                self.space_held = True
+                if self.pan_last is None:
+                    self.setCursor(Qt.CursorShape.OpenHandCursor)
+            return
+        super().keyPressEvent(event)
+
+    def keyReleaseEvent(self, event):
+        if event.key() == Qt.Key.Key_Space:
+            if not event.isAutoRepeat():
+                self.space_held = False
+                if self.pan_last is None:
+                    self.unsetCursor()
+            return
+        super().keyReleaseEvent(event)
+
+    def begin_pan(self, pos, button):
+        self.move_scheduler.flush()
+        self.pan_last = QPointF(pos)
+        self.pan_button = button
+        self.setCursor(Qt.CursorShape.ClosedHandCursor)
+        # Render the settled zoom now so the pan can reuse it
+        if self.zoom_settle_timer.isActive():
+            self.zoom_settle_timer.stop()
+            self.update()
+
+    def pan_to(self, pos):
+        # Whole pixels only, so rendered pixels can be reused as they are;
+        # the remainder is carried over to the next move
+        dx = round(pos.x() - self.pan_last.x())
+        dy = round(pos.y() - self.pan_last.y())
+        if dx or dy:
+            self.pan_last += QPointF(dx, dy)
+            self.scroll_view(dx, dy)
+
+    def end_pan(self):
+        self.pan_last = None
+        self.pan_button = None
+        if self.space_held:
+            self.setCursor(Qt.CursorShape.OpenHandCursor)
         else:
-            self.zoom *= zoom_factor
+            self.unsetCursor()
+
+    def scroll_view(self, dx, dy):
+        """Move the view by whole widget pixels, reusing rendered pixels.
+
+        The static layer is shifted and only the strips scrolled into view
+        are rendered. `QWidget.scroll` shifts the widget's own pixels the
+        same way, so the paint event that follows covers just those strips.
+        """
+        live_ids = tuple(map(id, self.live_paths()))
+        reusable = (self.static_layer is not None and not self.static_layer_dirty and
+                    self.static_layer_key == self.layer_key(live_ids) and
+                    abs(dx) < self.width() and abs(dy) < self.height() and
+                    # Fractional scales would put the old pixels between device pixels
+                    self.devicePixelRatioF().is_integer())
+        self.offset += QPointF(dx, dy)
+        if not reusable:
+            self.update()
+            return
+
+        with self.profiler.span("scroll", "input"):
+            layer = self.new_layer()
+            painter = QPainter(layer)
+            painter.drawPixmap(dx, dy, self.static_layer)
+            painter.end()
+            # Strips scrolled into view: a full-width one, then the rest of the edge
+            width, height = self.width(), self.height()
+            strips = []
+            if dy:
+                strips.append(QRect(0, 0 if dy > 0 else height + dy, width, abs(dy)))
+            if dx:
+                strips.append(QRect(0 if dx > 0 else width + dx, max(dy, 0), abs(dx), height - abs(dy)))
+            for rect in strips:
+                self.render_static_layer(layer, rect=rect)
+        self.static_layer = layer
+        self.static_layer_key = self.layer_key(live_ids)
+        self.static_layer_view = (self.zoom, QPointF(self.offset))
+        self.scroll(dx, dy)
+        if self.profiler.enabled:
+            # The HUD stays put, so repaint both where it was and where it moved
+            self.update(self.hud_rect)
+            self.update(self.hud_rect.translated(dx, dy))
+
+    def wheelEvent(self, event):
+        # Trackpads report fractions of a 120-unit wheel step
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.zoom_at(event.position(), self.zoom * self.ZOOM_STEP ** steps)
+
+    def zoom_at(self, pos, zoom):
+        """Zoom to `zoom`, keeping the scene point under widget point `pos` in place.
+
+        Steps in quick succession are shown by scaling the last render; the
+        static layer is re-rendered once they stop for ZOOM_SETTLE_MS.
+        """
+        zoom = min(max(zoom, self.MIN_ZOOM), self.MAX_ZOOM)
+        anchor = self.transform_pos(pos)
+        self.zoom = zoom
+        self.offset = pos - anchor * zoom
+        if self.static_layer is not None:
+            self.zoom_settle_timer.start()
         self.update()
 
     def transform_pos(self, pos):
-        return (pos - self.offset) / self.zoom
\ No newline at end of file
+        return (pos - self.offset) / self.zoom
+
+    def update_region(self, region):
+        if not region.isEmpty():
+            if self.profiler.enabled:
+                # Keep the HUD current whenever anything is repainted
+                region = QRegion(region) + self.hud_rect
+            self.update(region)
+
+    def damaged_rect(self, path, index=None):
+        """Widget rect covering everything drawn from point `index` of `path`.
+
+        A cubic segment spans four consecutive control points, so points up
+        to three rows away can share a segment with `index`. The path ends are
+        included when `index` is near them, because the last row wraps around
+        to the first point's in handle and closing draws a line between them.
+        With `index` None the whole path is covered.
+        """
+        storage = path.storage
+        n = storage.count
+        if n == 0:
+            return QRect()
+
+        if index is None:
+            box = path.control_bounds()
+        else:
+            low, high = max(0, index - 3), min(n, index + 4)
+            box = storage.control_bounds(low, high)
+            if low == 0 or high == n:
+                for end_box in (storage.control_bounds(0, 4), storage.control_bounds(max(0, n - 4), n)):
+                    box = self.union_boxes(box, end_box)
+
+        pad = path.stroke_width + self.CONTROL_POINT_EXTENT
+        return self.scene_box_to_widget_rect(box, pad)
+
+    def damaged_tail(self, path, start):
+        """Widget rect covering everything drawn from point `start` to the end."""
+        storage = path.storage
+        if storage.count == 0:
+            return QRect()
+        box = self.union_boxes(storage.control_bounds(start - 3),
+                               storage.control_bounds(0, 4))
+        pad = path.stroke_width + self.CONTROL_POINT_EXTENT
+        return self.scene_box_to_widget_rect(box, pad)
+
+    def snap_point_box(self, snap_point):
+        x, y = snap_point.position
+        radius = max(snap_point.radius, 4)
+        return (x - radius, y - radius, x + radius, y + radius)
+
+    @staticmethod
+    def union_boxes(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+    @staticmethod
+    def intersects(box, rect):
+        if box is None:
+            return False
+        return box[0] <= rect[2] and box[2] >= rect[0] and box[1] <= rect[3] and box[3] >= rect[1]
+
+    def scene_box_to_widget_rect(self, box, pad=0):
+        """Map a scene (left, top, right, bottom) box to a padded widget QRect."""
+        if box is None:
+            return QRect()
+        left, top, right, bottom = box
+        rect = QRectF(
+            QPointF((left - pad) * self.zoom, (top - pad) * self.zoom) + self.offset,
+            QPointF((right + pad) * self.zoom, (bottom + pad) * self.zoom) + self.offset
+        )
+        # Leave room for antialiasing
+        return rect.toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    def widget_to_scene_rect(self, rect):
+        top_left = self.transform_pos(QPointF(rect.topLeft()))
+        bottom_right = self.transform_pos(QPointF(rect.bottomRight()) + QPointF(1, 1))
+        return (top_left.x(), top_left.y(), bottom_right.x(), bottom_right.y())
+
+    def visible_scene_rect(self):
+        """Return the scene area shown in the widget as (left, top, right, bottom)."""
+        top_left = self.transform_pos(QPointF(0, 0))
+        bottom_right = self.transform_pos(QPointF(self.width(), self.height()))
+        return (top_left.x(), top_left.y(), bottom_right.x(), bottom_right.y())
\ No newline at end of file
@@ -0,0 +1,262 @@
+import numpy as np
+
+def rdp_mask(points, tolerance):
+    """Ramer-Douglas-Peucker simplification of a polyline.
+
+    Returns a boolean mask of the points to keep. Ranges are processed from
+    an explicit stack and each range's point distances are computed in one
+    vectorized step.
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        chord = points[end] - points[start]
+        length = np.hypot(*chord)
+        offsets = inner - points[start]
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(offsets[:, 0] * chord[1] - offsets[:, 1] * chord[0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+def _unit(vector):
+    length = np.hypot(vector[0], vector[1])
+    return vector / length if length > 0 else vector
+
+def _bernstein(u):
+    v = 1 - u
+    return np.stack((v ** 3, 3 * v ** 2 * u, 3 * v * u ** 2, u ** 3), axis=1)
+
+def _evaluate(bezier, u):
+    return _bernstein(u) @ bezier
+
+def _chord_parameters(points):
+    lengths = np.hypot(*np.diff(points, axis=0).T)
+    u = np.concatenate(([0.0], np.cumsum(lengths)))
+    if u[-1] == 0:
+        return np.linspace(0, 1, len(points))
+    return u / u[-1]
+
+def _generate_bezier(points, u, left_tangent, right_tangent):
+    """Least-squares fit of the two handle lengths for fixed end tangents."""
+    first, last = points[0], points[-1]
+    basis = _bernstein(u)
+    a1 = basis[:, 1:2] * left_tangent
+    a2 = basis[:, 2:3] * right_tangent
+
+    c00 = np.sum(a1 * a1)
+    c01 = np.sum(a1 * a2)
+    c11 = np.sum(a2 * a2)
+    residual = points - (np.outer(basis[:, 0] + basis[:, 1], first) +
+                         np.outer(basis[:, 2] + basis[:, 3], last))
+    x0 = np.sum(a1 * residual)
+    x1 = np.sum(a2 * residual)
+
+    determinant = c00 * c11 - c01 * c01
+    chord = np.hypot(*(last - first))
+    epsilon = 1e-6 * chord
+    alpha_left = alpha_right = 0.0
+    if determinant != 0:
+        alpha_left = (x0 * c11 - x1 * c01) / determinant
+        alpha_right = (c00 * x1 - c01 * x0) / determinant
+    if alpha_left < epsilon or alpha_right < epsilon:
+        # Fall back to the Wu/Barsky heuristic
+        alpha_left = alpha_right = chord / 3.0
+
+    return np.array([
+        first,
+        first + left_tangent * alpha_left,
+        last + right_tangent * alpha_right,
+        last,
+    ])
+
+def _reparameterize(bezier, points, u):
+    """One Newton-Raphson step towards the closest curve parameter per point."""
+    d1 = 3 * np.diff(bezier, axis=0)
+    d2 = 2 * np.diff(d1, axis=0)
+    v = 1 - u
+    position = _evaluate(bezier, u)
+    derivative = np.outer(v ** 2, d1[0]) + np.outer(2 * v * u, d1[1]) + np.outer(u ** 2, d1[2])
+    second = np.outer(v, d2[0]) + np.outer(u, d2[1])
+    offset = position - points
+    numerator = np.sum(offset * derivative, axis=1)
+    denominator = np.sum(derivative * derivative, axis=1) + np.sum(offset * second, axis=1)
+    step = np.divide(numerator, denominator, out=np.zeros_like(u), where=denominator != 0)
+    return np.clip(u - step, 0.0, 1.0)
+
+def _max_error(bezier, points, u):
+    errors = np.sum((_evaluate(bezier, u) - points) ** 2, axis=1)
+    index = int(np.argmax(errors))
+    return errors[index], index
+
+def fit_cubic_segments(points, tolerance, left_tangent=None, right_tangent=None,
+                       max_iterations=4):
+    """Fit a chain of cubic Bezier segments through `points`.
+
+    Follows Schneider's algorithm: handle lengths are solved by least squares
+    for fixed end tangents, parameters are refined by Newton iterations and
+    the points are split at the worst fit until every segment is within
+    `tolerance`. Returns a list of (controls (4, 2), end index) in order,
+    where end index is the index in `points` of the segment's end.
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return []
+    if left_tangent is None:
+        left_tangent = _unit(points[1] - points[0])
+    if right_tangent is None:
+        right_tangent = _unit(points[-2] - points[-1])
+
+    tolerance_sq = tolerance * tolerance
+    segments = []
+    # Ranges are popped in path order: the stack holds them reversed
+    stack = [(0, len(points) - 1, left_tangent, right_tangent)]
+    while stack:
+        start, end, left, right = stack.pop()
+        chunk = points[start:end + 1]
+
+        if len(chunk) == 2:
+            third = np.hypot(*(chunk[1] - chunk[0])) / 3.0
+            bezier = np.array([chunk[0], chunk[0] + left * third,
+                               chunk[1] + right * third, chunk[1]])
+            segments.append((bezier, end))
+            continue
+
+        u = _chord_parameters(chunk)
+        bezier = _generate_bezier(chunk, u, left, right)
+        error, split = _max_error(bezier, chunk, u)
+
+        if error > tolerance_sq and error < 4 * tolerance_sq:
+            for _ in range(max_iterations):
+                u = _reparameterize(bezier, chunk, u)
+                bezier = _generate_bezier(chunk, u, left, right)
+                error, split = _max_error(bezier, chunk, u)
+                if error <= tolerance_sq:
+                    break
+
+        if error <= tolerance_sq:
+            segments.append((bezier, end))
+            continue
+
+        split = min(max(split, 1), len(chunk) - 2)
+        centre = _unit(chunk[split - 1] - chunk[split + 1])
+        middle = start + split
+        stack.append((middle, end, -centre, right))
+        stack.append((start, middle, left, centre))
+    return segments
+
+class StrokeStats:
+    def __init__(self, samples, anchors):
+        self.samples = samples
+        self.anchors = anchors
+
+    @property
+    def reduction(self):
+        """Fraction of raw samples removed by fitting."""
+        if not self.samples:
+            return 0.0
+        return 1.0 - self.anchors / self.samples
+
+class StrokeFitter:
+    """Fits a freeform stroke into smooth cubic anchors while it is drawn.
+
+    Raw samples after the last committed anchor are kept in the path as
+    straight segments so the stroke is visible immediately. Every `window`
+    new samples the pending run is decimated with RDP and fitted with cubic
+    segments; all but the last fitted segment are committed as anchors with
+    handles, and the rest stays pending. `finish` fits whatever is left.
+    """
+    WINDOW = 48
+    MAX_PENDING = 512
+
+    def __init__(self, path, tolerance=2.0):
+        self.path = path
+        self.tolerance = tolerance
+        self.anchor_index = None
+        self.pending = []
+        self.since_fit = 0
+        self.sample_count = 0
+        self.first_anchor = None
+
+    def begin(self, position):
+        self.path.add_point(position)
+        self.anchor_index = self.first_anchor = len(self.path.points) - 1
+        self.pending = [np.array(position, dtype=float)]
+        self.sample_count = 1
+
+    def add_sample(self, position):
+        position = np.array(position, dtype=float)
+        previous = self.path.points[-1]
+        previous.handle_out = previous.position.copy()
+        self.path.add_point(position, handle_in=position)
+        self.pending.append(position)
+        self.sample_count += 1
+        self.since_fit += 1
+
+        if self.since_fit >= self.WINDOW:
+            self._fit(final=len(self.pending) >= self.MAX_PENDING)
+
+    def finish(self):
+        """Fit the remaining samples and return the stroke's `StrokeStats`."""
+        self._fit(final=True)
+        anchors = len(self.path.points) - self.first_anchor
+        return StrokeStats(self.sample_count, anchors)
+
+    def _fit(self, final):
+        self.since_fit = 0
+        if len(self.pending) < 3:
+            return
+
+        samples = np.array(self.pending)
+        kept = np.flatnonzero(rdp_mask(samples, self.tolerance / 2))
+        anchor = self.path.points[self.anchor_index]
+        left_tangent = None
+        if anchor.handle_in is not None:
+            left_tangent = _unit(anchor.position - anchor.handle_in)
+            if not left_tangent.any():
+                left_tangent = None
+        segments = fit_cubic_segments(samples[kept], self.tolerance, left_tangent)
+        if not final:
+            segments = segments[:-1]
+            if not segments:
+                return
+
+        # Replace the straight pending segments with the fitted anchors
+        path = self.path
+        path.truncate(self.anchor_index + 1)
+        anchor.handle_out = segments[0][0][1]
+        count = len(segments)
+        controls = np.array([bezier for bezier, _ in segments])
+        handles_out = np.zeros((count, 2))
+        handles_out[:-1] = controls[1:, 1]
+        has_out = np.arange(count) < count - 1
+        path.extend_points(controls[:, 3], controls[:, 2], handles_out,
+                           has_out=has_out)
+
+        committed = kept[segments[-1][1]]
+        self.anchor_index = len(path.points) - 1
+        rest = samples[committed + 1:]
+        self.pending = [samples[committed]] + list(rest)
+        if len(rest):
+            # Keep the unfitted samples drawn as straight segments
+            last = path.points[-1]
+            last.handle_out = last.position.copy()
+            handles_out = rest.copy()
+            has_out = np.arange(len(rest)) < len(rest) - 1
+            path.extend_points(rest, rest, handles_out, has_out=has_out)
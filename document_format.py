@@ -0,0 +1,230 @@
+import os
+import struct
+import numpy as np
+from path_manager import Path, LazyPaths
+
+# Native document layout (little-endian):
+#   header        HEADER_FORMAT
+#   snap table    (snap_count, 3) float64 rows of x, y, radius
+#   string table  string_count UTF-8 strings, each after its uint32 byte
+#                 length, padded to 8 bytes
+#   path table    path_count PATH_RECORD rows; stroke colors and fills are
+#                 indices into the string table
+#   point data    per path: positions, handles_in, handles_out as (n, 2)
+#                 float64 blocks, then n flag bytes padded to 8 bytes
+MAGIC = b"VCDOC\0\0\0"
+VERSION = 2
+HEADER_FORMAT = "<8sIIQQQQQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+PATH_RECORD = np.dtype([
+    ("offset", "<u8"),
+    ("count", "<u8"),
+    ("stroke_width", "<f8"),
+    ("bounds", "<f8", (4,)),
+    ("closed", "u1"),
+    ("reserved", "V7"),
+    ("stroke_color", "<u4"),
+    ("fill", "<u4"),
+])
+
+HAS_IN = 1
+HAS_OUT = 2
+SMOOTH = 4
+
+class DocumentError(Exception):
+    pass
+
+def _block_size(count):
+    flags = (count + 7) // 8 * 8
+    return count * 48 + flags
+
+def _decode_width(value):
+    return int(value) if float(value).is_integer() else float(value)
+
+class _StringTable:
+    """Distinct strings in the order they were first added."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, text):
+        return self.rows.setdefault(text, len(self.rows))
+
+    def tobytes(self):
+        parts = []
+        for text in self.rows:
+            try:
+                data = text.encode("utf-8")
+            except UnicodeEncodeError as error:
+                raise DocumentError(f"cannot save the style {text!r}: {error}") from error
+            parts.append(struct.pack("<I", len(data)) + data)
+        data = b"".join(parts)
+        return data + bytes(-len(data) % 8)
+
+def save_document(filename, path_manager, snap_points=()):
+    """Save a document's paths and snap points in the native binary format.
+
+    Geometry is written as whole array blocks per path. Runs of paths that
+    are still unmaterialized in a `LazyPaths` list are copied from their
+    source file in one piece without being loaded. The file is written next
+    to `filename` and moved into place, so saving over the currently mapped
+    document is safe.
+    """
+    snaps = np.array([(*point.position, point.radius) for point in snap_points],
+                     dtype="<f8").reshape(-1, 3)
+
+    paths = path_manager.paths
+    count = len(paths)
+    table = np.zeros(count, dtype=PATH_RECORD)
+    table["bounds"] = path_manager.bounds_table()
+
+    strings = _StringTable()
+    lazy = isinstance(paths, LazyPaths)
+    if lazy:
+        loaded = paths.materialized_mask()
+        copied = np.flatnonzero(~loaded)
+        reader = paths.reader
+        table[copied] = reader.table[copied]
+        # Renumber the copied rows' styles for this file's string table
+        renumbered = np.array([strings.add(text) for text in reader.strings], dtype="<u4")
+        for column in ("stroke_color", "fill"):
+            table[column][copied] = renumbered[reader.table[column][copied]]
+    else:
+        loaded = np.ones(count, dtype=bool)
+
+    for row in np.flatnonzero(loaded):
+        path = paths[row]
+        table["count"][row] = path.storage.count
+        table["stroke_width"][row] = path.stroke_width
+        table["closed"][row] = path.is_closed
+        table["stroke_color"][row] = strings.add(path.stroke_color)
+        table["fill"][row] = strings.add(path.fill)
+    string_data = strings.tobytes()
+
+    strings_offset = HEADER_SIZE + snaps.nbytes
+    table_offset = strings_offset + len(string_data)
+    sizes = _block_size(table["count"].astype(np.int64))
+    table["offset"] = table_offset + table.nbytes + np.cumsum(sizes) - sizes
+
+    temporary = f"{filename}.tmp"
+    try:
+        with open(temporary, "wb") as stream:
+            stream.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, count, len(snaps),
+                                     table_offset, HEADER_SIZE, len(strings.rows),
+                                     strings_offset))
+            stream.write(snaps.tobytes())
+            stream.write(string_data)
+            stream.write(table.tobytes())
+
+            # Alternate between runs of loaded paths and runs of raw source blocks
+            boundaries = np.flatnonzero(np.diff(loaded)) + 1
+            for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, count]):
+                if start == end:
+                    continue
+                if loaded[start]:
+                    for row in range(start, end):
+                        _write_block(stream, paths[row].storage)
+                else:
+                    stream.write(paths.reader.raw_blocks(start, end))
+        os.replace(temporary, filename)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+def _write_block(stream, storage):
+    n = storage.count
+    for column in (storage.positions, storage.handles_in, storage.handles_out):
+        stream.write(np.ascontiguousarray(column[:n], dtype="<f8"))
+    flags = np.zeros((n + 7) // 8 * 8, dtype=np.uint8)
+    flags[:n] = (storage.has_in[:n] * HAS_IN | storage.has_out[:n] * HAS_OUT
+                 | storage.smooth[:n] * SMOOTH)
+    stream.write(flags)
+
+class DocumentReader:
+    """Memory-mapped view of a native document.
+
+    Opening only reads the header and maps the file; the path table and
+    point blocks are paged in by the OS as they are accessed.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        # np.memmap cannot map an empty file
+        if os.path.getsize(filename) < HEADER_SIZE:
+            raise DocumentError(f"{filename} is not a VectorCraft document")
+        self.data = np.memmap(filename, dtype=np.uint8, mode="r")
+
+        (magic, version, _, path_count, snap_count, table_offset, snap_offset,
+         string_count, strings_offset) = struct.unpack_from(HEADER_FORMAT, self.data)
+        if magic != MAGIC:
+            raise DocumentError(f"{filename} is not a VectorCraft document")
+        if version != VERSION:
+            raise DocumentError(f"unsupported document version {version}")
+
+        table_end = table_offset + path_count * PATH_RECORD.itemsize
+        if table_end > len(self.data) or snap_offset + snap_count * 24 > len(self.data):
+            raise DocumentError(f"{filename} is truncated")
+
+        self.strings = []
+        offset = strings_offset
+        for _ in range(string_count):
+            if offset + 4 > len(self.data):
+                raise DocumentError(f"{filename} is truncated")
+            size, = struct.unpack_from("<I", self.data, offset)
+            text = self.data[offset + 4:offset + 4 + size]
+            if len(text) < size:
+                raise DocumentError(f"{filename} is truncated")
+            try:
+                self.strings.append(text.tobytes().decode("utf-8"))
+            except UnicodeDecodeError as error:
+                raise DocumentError(f"{filename} is damaged") from error
+            offset += 4 + size
+
+        self.path_count = path_count
+        self.table = self.data[table_offset:table_end].view(PATH_RECORD)
+        if path_count:
+            ends = self.table["offset"] + _block_size(self.table["count"])
+            if ends.max() > len(self.data):
+                raise DocumentError(f"{filename} is truncated")
+            styles = np.maximum(self.table["stroke_color"], self.table["fill"])
+            if styles.max() >= string_count:
+                raise DocumentError(f"{filename} is damaged")
+        self.snap_points = self.data[snap_offset:snap_offset + snap_count * 24] \
+            .view("<f8").reshape(-1, 3)
+
+    @property
+    def bounds(self):
+        """(n, 4) stroke-padded path bounds, NaN for empty paths."""
+        return self.table["bounds"]
+
+    def raw_blocks(self, start, end):
+        """Return the contiguous point data of paths start..end-1."""
+        first = int(self.table["offset"][start])
+        last = int(self.table["offset"][end - 1]) + _block_size(int(self.table["count"][end - 1]))
+        return self.data[first:last]
+
+    def read_path(self, row):
+        """Materialize one path, copying its geometry out of the mapping."""
+        record = self.table[row]
+        n = int(record["count"])
+        start = int(record["offset"])
+        columns = self.data[start:start + n * 48].view("<f8").reshape(3, n, 2)
+        flags = self.data[start + n * 48:start + n * 49]
+
+        path = Path()
+        path.storage.reserve(n)
+        path.storage.extend(
+            columns[0], columns[1], columns[2],
+            has_in=(flags & HAS_IN) != 0,
+            has_out=(flags & HAS_OUT) != 0,
+            smooth=(flags & SMOOTH) != 0,
+        )
+        path.is_closed = bool(record["closed"])
+        path.stroke_width = _decode_width(record["stroke_width"])
+        path.stroke_color = self.strings[record["stroke_color"]]
+        path.fill = self.strings[record["fill"]]
+        return path
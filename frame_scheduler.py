@@ -0,0 +1,43 @@
+import time
+from PyQt6.QtCore import Qt, QTimer
+
+class FrameScheduler:
+    """Queues pointer samples and hands them over in batches once per frame.
+
+    `process(samples)` receives every queued sample when `keep_all()` is
+    true and only the latest one otherwise. A batch runs at most once per
+    FRAME_INTERVAL, but never later than one interval after the first
+    sample of the batch arrived, so latency stays bounded however many
+    events are delivered in between. Events received and samples processed
+    per frame are counted by the canvas's profiler.
+    """
+    FRAME_INTERVAL = 1 / 60
+
+    def __init__(self, process, keep_all, parent=None):
+        self.process = process
+        self.keep_all = keep_all
+        self.queue = []
+        self.last_flush = 0.0
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.flush)
+
+    def push(self, sample):
+        self.queue.append(sample)
+        if not self.timer.isActive():
+            delay = self.last_flush + self.FRAME_INTERVAL - time.perf_counter()
+            self.timer.start(max(0, int(delay * 1000)))
+
+    def flush(self):
+        """Process the queued samples now, e.g. before a press or release."""
+        self.timer.stop()
+        if not self.queue:
+            return
+        samples = self.queue
+        self.queue = []
+        if not self.keep_all():
+            samples = samples[-1:]
+        self.last_flush = time.perf_counter()
+        self.process(samples)
+
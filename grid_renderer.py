@@ -0,0 +1,59 @@
+import math
+import numpy as np
+from PyQt6.QtCore import QLineF
+from PyQt6.QtGui import QPen, QColor
+from styles import Colors
+
+class GridRenderer:
+    """Draws the background grid with a density adapted to the zoom level.
+
+    Minor lines are `grid_size * 5**level` apart, with the level chosen so
+    they are never closer than MIN_SPACING_PX on screen; every fifth line is
+    a major line. Minor lines fade out as they approach the threshold and
+    then become the major lines of the next level, so zooming is seamless.
+    The number of lines is bounded by the widget size, not by the zoom.
+    """
+    SUBDIVISION = 5
+    MIN_SPACING_PX = 4
+    FADE_SPACING_PX = 16
+
+    def spacing(self, grid_size, zoom):
+        """Return (minor_step, minor_alpha) in scene units for `zoom`."""
+        step = float(grid_size)
+        while step * zoom < self.MIN_SPACING_PX:
+            step *= self.SUBDIVISION
+        spacing_px = step * zoom
+        fade = (spacing_px - self.MIN_SPACING_PX) / (self.FADE_SPACING_PX - self.MIN_SPACING_PX)
+        return step, min(max(fade, 0.0), 1.0)
+
+    def draw(self, painter, scene_rect, grid_size, zoom):
+        left, top, right, bottom = scene_rect
+        step, minor_alpha = self.spacing(grid_size, zoom)
+
+        for vertical, start, stop in ((True, left, right), (False, top, bottom)):
+            first = math.floor(start / step)
+            last = math.ceil(stop / step)
+            indices = np.arange(first, last + 1)
+            is_major = indices % self.SUBDIVISION == 0
+            coords = indices * step
+
+            for major, alpha in ((False, minor_alpha), (True, 1.0)):
+                if alpha <= 0:
+                    continue
+                selected = coords[is_major == major]
+                if not len(selected):
+                    continue
+                if vertical:
+                    lines = [QLineF(x, top, x, bottom) for x in selected.tolist()]
+                else:
+                    lines = [QLineF(left, y, right, y) for y in selected.tolist()]
+                painter.setPen(self.pen(major, alpha))
+                painter.drawLines(lines)
+
+    def pen(self, major, alpha):
+        color = QColor(Colors.GRID_MAJOR if major else Colors.GRID)
+        color.setAlphaF(alpha)
+        pen = QPen(color, 1)
+        # Keep lines one device pixel wide at every zoom level
+        pen.setCosmetic(True)
+        return pen
@@ -0,0 +1,308 @@
+import numpy as np
+from path_storage import POINT_ROW
+
+# Rough fixed cost of an entry or delta object besides its arrays
+ENTRY_OVERHEAD = 200
+
+class PathDelta:
+    """Net change of one path over an entry.
+
+    `indices` are the points that existed before the edit and were changed
+    or removed, with their old values in `before` and, where they still
+    exist afterwards, new values in `after`. Points appended beyond the old
+    count are kept in `appended`.
+    """
+
+    def __init__(self, path, old_count, old_closed, indices, before):
+        self.path = path
+        self.old_count = old_count
+        self.old_closed = old_closed
+        self.indices = indices
+        self.before = before
+        self.new_count = old_count
+        self.new_closed = old_closed
+        self.after = before
+        self.appended = np.empty(0, dtype=POINT_ROW)
+
+    def capture_after(self):
+        """Read the new state of the touched points from the path."""
+        storage = self.path.storage
+        self.new_count = storage.count
+        self.new_closed = self.path.is_closed
+        self.after = storage.rows(self.indices[self.indices < self.new_count])
+        self.appended = storage.rows(np.arange(self.old_count, self.new_count))
+
+    @property
+    def is_empty(self):
+        return (self.new_count == self.old_count and self.new_closed == self.old_closed
+                and not len(self.indices))
+
+    @property
+    def nbytes(self):
+        return (self.indices.nbytes + self.before.nbytes + self.after.nbytes
+                + self.appended.nbytes + ENTRY_OVERHEAD)
+
+    def undo(self):
+        self.path.restore(self.old_count, self.indices, self.before, self.old_closed)
+
+    def redo(self):
+        indices = self.indices[self.indices < self.new_count]
+        appended = np.arange(self.old_count, self.new_count)
+        self.path.restore(self.new_count, np.concatenate((indices, appended)),
+                          np.concatenate((self.after, self.appended)), self.new_closed)
+
+class Entry:
+    """One undoable step: paths added to the document plus path deltas."""
+
+    def __init__(self, added_paths, deltas):
+        self.added_paths = added_paths
+        self.deltas = deltas
+        self.nbytes = ENTRY_OVERHEAD + sum(delta.nbytes for delta in deltas)
+
+    def undo(self, path_manager):
+        for delta in reversed(self.deltas):
+            delta.undo()
+        for _ in self.added_paths:
+            path_manager.pop_path()
+
+    def redo(self, path_manager):
+        for path in self.added_paths:
+            path_manager.add_path(path)
+        for delta in self.deltas:
+            delta.redo()
+
+class _Recording:
+    """Points of one path captured during an open transaction."""
+
+    def __init__(self, path):
+        storage = path.storage
+        self.path = path
+        self.old_count = storage.count
+        self.old_closed = path.is_closed
+        self.captured = np.zeros(self.old_count, dtype=bool)
+        self.last_indices = None
+        self.indices = []
+        self.rows = []
+
+    def capture(self, indices):
+        # Bulk transforms report the same index array on every update
+        if indices is self.last_indices:
+            return
+        if isinstance(indices, np.ndarray):
+            self.last_indices = indices
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[indices < self.old_count]
+        new = np.unique(indices[~self.captured[indices]])
+        if len(new):
+            self.captured[new] = True
+            self.indices.append(new)
+            self.rows.append(self.path.storage.rows(new))
+
+    def delta(self):
+        if self.indices:
+            indices = np.concatenate(self.indices)
+            before = np.concatenate(self.rows)
+        else:
+            indices = np.empty(0, dtype=np.int64)
+            before = np.empty(0, dtype=POINT_ROW)
+        delta = PathDelta(self.path, self.old_count, self.old_closed, indices, before)
+        delta.capture_after()
+        return delta
+
+class History:
+    """Undo/redo log built from compact per-edit deltas.
+
+    The document reports edits through `PathManager.recorder`: before a path
+    changes, the old values of the affected points are copied once per
+    transaction, and the new values are read when the transaction is
+    committed. A transaction is opened by `begin` (e.g. on mouse press) and
+    closed by `commit` (on release), so a whole drag becomes one entry;
+    edits made outside one are grouped until the next history call.
+
+    The log keeps at most `byte_budget` bytes, dropping the oldest entries
+    first. Every CHECKPOINT_INTERVAL entries the preceding run is merged
+    into one checkpoint delta, so undoing or redoing many steps applies
+    one delta per run instead of replaying every step.
+    """
+    CHECKPOINT_INTERVAL = 32
+
+    def __init__(self, path_manager, byte_budget=64 * 1024 * 1024):
+        self.path_manager = path_manager
+        self.byte_budget = byte_budget
+        self.entries = []
+        # Number of entries undone; entries[position:] can be redone
+        self.position = 0
+        # Sequence number of entries[0], grows as old entries are evicted
+        self.base = 0
+        # Maps the sequence number a run of entries starts at to its merge
+        self.checkpoints = {}
+        self.nbytes = 0
+        self._recordings = None
+        self._added_paths = None
+        self._replaying = False
+        path_manager.recorder = self
+
+    def clear(self):
+        self.entries = []
+        self.position = 0
+        self.base = 0
+        self.checkpoints = {}
+        self.nbytes = 0
+        self._recordings = None
+        self._added_paths = None
+
+    # Recording
+
+    def begin(self):
+        """Open a transaction; everything until `commit` is one entry."""
+        self.commit()
+        self._recordings = {}
+        self._added_paths = []
+
+    def commit(self):
+        """Close the open transaction and push it as an entry if non-empty."""
+        if self._recordings is None:
+            return
+        added_paths = self._added_paths
+        deltas = [recording.delta() for recording in self._recordings.values()]
+        deltas = [delta for delta in deltas if not delta.is_empty]
+        # Added paths are recorded as growing from empty, so their points can
+        # be restored even after later edits were undone
+        for path in added_paths:
+            delta = PathDelta(path, 0, False, np.empty(0, dtype=np.int64),
+                              np.empty(0, dtype=POINT_ROW))
+            delta.capture_after()
+            deltas.append(delta)
+        self._recordings = None
+        self._added_paths = None
+        if deltas or added_paths:
+            self._push(Entry(added_paths, deltas))
+
+    def path_will_change(self, path, indices):
+        if self._replaying:
+            return
+        if self._recordings is None:
+            self.begin()
+        if path in self._added_paths:
+            # Its whole content is recorded when the transaction is committed
+            return
+        recording = self._recordings.get(path)
+        if recording is None:
+            recording = self._recordings[path] = _Recording(path)
+        if isinstance(indices, range):
+            indices = range(indices.start, min(indices.stop, recording.old_count))
+        recording.capture(indices)
+
+    def path_added(self, path):
+        if self._replaying:
+            return
+        if self._recordings is None:
+            self.begin()
+        self._added_paths.append(path)
+
+    def _push(self, entry):
+        # A new edit discards everything that could have been redone
+        self.nbytes -= sum(old.nbytes for old in self.entries[self.position:])
+        del self.entries[self.position:]
+        end = self.base + self.position
+        for start in [start for start in self.checkpoints
+                      if start + self.CHECKPOINT_INTERVAL > end]:
+            self.nbytes -= self.checkpoints.pop(start).nbytes
+
+        self.entries.append(entry)
+        self.nbytes += entry.nbytes
+        self.position += 1
+
+        sequence = self.base + self.position
+        start = sequence - self.CHECKPOINT_INTERVAL
+        if sequence % self.CHECKPOINT_INTERVAL == 0 and start >= self.base:
+            merged = self.checkpoints[start] = self._merge(self.entries[start - self.base:])
+            self.nbytes += merged.nbytes
+        self._evict()
+
+    def _merge(self, entries):
+        """Merge consecutive entries, ending at the current state, into one."""
+        added_paths = [path for entry in entries for path in entry.added_paths]
+        first = {}
+        touched = {}
+        for entry in entries:
+            for delta in entry.deltas:
+                first.setdefault(delta.path, delta)
+                touched.setdefault(delta.path, []).append(delta)
+
+        deltas = []
+        for path, start in first.items():
+            # The earliest captured value of every point is its value before the run
+            indices, order = np.unique(
+                np.concatenate([delta.indices for delta in touched[path]]), return_index=True
+            )
+            before = np.concatenate([delta.before for delta in touched[path]])[order]
+            keep = indices < start.old_count
+            merged = PathDelta(path, start.old_count, start.old_closed,
+                               indices[keep], before[keep])
+            merged.capture_after()
+            deltas.append(merged)
+        return Entry(added_paths, deltas)
+
+    def _evict(self):
+        while self.nbytes > self.byte_budget and self.position > 1:
+            entry = self.entries.pop(0)
+            self.nbytes -= entry.nbytes
+            merged = self.checkpoints.pop(self.base, None)
+            if merged is not None:
+                self.nbytes -= merged.nbytes
+            self.base += 1
+            self.position -= 1
+
+    # Replaying
+
+    @property
+    def can_undo(self):
+        return self.position > 0 or bool(self._recordings or self._added_paths)
+
+    @property
+    def can_redo(self):
+        # Committing pending edits would discard the redo entries
+        return self.position < len(self.entries) and not (self._recordings or self._added_paths)
+
+    def undo(self, steps=1):
+        """Undo up to `steps` entries; returns how many were undone."""
+        self.commit()
+        done = 0
+        self._replaying = True
+        try:
+            while done < steps and self.position > 0:
+                sequence = self.base + self.position
+                start = sequence - self.CHECKPOINT_INTERVAL
+                merged = self.checkpoints.get(start)
+                if merged is not None and steps - done >= self.CHECKPOINT_INTERVAL:
+                    merged.undo(self.path_manager)
+                    self.position -= self.CHECKPOINT_INTERVAL
+                    done += self.CHECKPOINT_INTERVAL
+                else:
+                    self.position -= 1
+                    self.entries[self.position].undo(self.path_manager)
+                    done += 1
+        finally:
+            self._replaying = False
+        return done
+
+    def redo(self, steps=1):
+        """Redo up to `steps` entries; returns how many were redone."""
+        self.commit()
+        done = 0
+        self._replaying = True
+        try:
+            while done < steps and self.position < len(self.entries):
+                merged = self.checkpoints.get(self.base + self.position)
+                if merged is not None and steps - done >= self.CHECKPOINT_INTERVAL:
+                    merged.redo(self.path_manager)
+                    self.position += self.CHECKPOINT_INTERVAL
+                    done += self.CHECKPOINT_INTERVAL
+                else:
+                    self.entries[self.position].redo(self.path_manager)
+                    self.position += 1
+                    done += 1
+        finally:
+            self._replaying = False
+        return done
@@ -0,0 +1,594 @@
+import os
+import queue
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+from path_manager import PathManager, Path
+from path_storage import POINT_ROW
+from document_format import DocumentReader, save_document
+from tools import ToolState
+
+# Journal file layout (little-endian):
+#   header   JOURNAL_HEADER, then the base document's file name in UTF-8
+#   records  RECORD_HEADER (payload size, CRC-32 of the payload), then the
+#            payload: a type byte followed by the record's fields
+# The base is the document the records apply to: a file the user opened or
+# saved, a snapshot written by compaction, or nothing for an empty
+# document. Its size and modification time are stored to detect changes.
+# Records are only trusted up to the first one whose size or CRC does not
+# check out, which is where a crash cut the journal short.
+MAGIC = b"VCJRNL\0\0"
+VERSION = 1
+JOURNAL_HEADER = "<8sIIQQ"
+JOURNAL_HEADER_SIZE = struct.calcsize(JOURNAL_HEADER)
+RECORD_HEADER = "<II"
+RECORD_HEADER_SIZE = struct.calcsize(RECORD_HEADER)
+
+PATH_ADDED = 1
+PATH_POINTS = 2
+PATH_REMOVED = 3
+PATHS_CLEARED = 4
+SNAP_ADDED = 5
+SNAPS_CLEARED = 6
+
+# PATH_ADDED: row, stroke width, then stroke color and fill as short strings
+ADDED_FORMAT = "<Qd"
+# PATH_POINTS: row, point count, flags, number of rows, then the indices of
+# the rows unless ALL_POINTS is set, then the rows as POINT_ROW records
+POINTS_FORMAT = "<QQBQ"
+CLOSED = 1
+ALL_POINTS = 2
+
+JOURNAL_NAME = re.compile(r"journal-(\d+)\.log$")
+# Every running instance journals into its own subdirectory of the autosave
+# directory, locked through LOCK_NAME for as long as the instance runs
+INSTANCE_PREFIX = "instance-"
+LOCK_NAME = "lock"
+# Subdirectory of the autosave directory for journals that could not be recovered
+FAILED_DIRECTORY = "failed"
+
+class JournalError(Exception):
+    pass
+
+def _record(kind, body=b""):
+    payload = bytes((kind,)) + body
+    return struct.pack(RECORD_HEADER, len(payload), zlib.crc32(payload)) + payload
+
+def _encode_text(text):
+    data = text.encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+def _decode_text(data, offset):
+    size, = struct.unpack_from("<H", data, offset)
+    offset += 2
+    return bytes(data[offset:offset + size]).decode("utf-8"), offset + size
+
+def encode_path_added(path, row):
+    return _record(PATH_ADDED, struct.pack(ADDED_FORMAT, row, path.stroke_width)
+                   + _encode_text(path.stroke_color) + _encode_text(path.fill))
+
+def encode_path_points(path, row, indices):
+    """Record the current values of `indices`, or of every point for None."""
+    storage = path.storage
+    flags = CLOSED if path.is_closed else 0
+    # Listing most of a path's rows costs more than writing all of them
+    if indices is None or 2 * len(indices) > storage.count:
+        flags |= ALL_POINTS
+        indices = np.arange(storage.count)
+        index_bytes = b""
+    else:
+        index_bytes = indices.astype("<u8").tobytes()
+    return _record(PATH_POINTS, struct.pack(POINTS_FORMAT, row, storage.count, flags, len(indices))
+                   + index_bytes + storage.rows(indices).tobytes())
+
+def apply_record(kind, body, path_manager, tool_state):
+    """Replay one record on a document."""
+    mismatch = JournalError("the autosave journal does not match its base document")
+    if kind == PATH_POINTS:
+        row, count, flags, size = struct.unpack_from(POINTS_FORMAT, body)
+        offset = struct.calcsize(POINTS_FORMAT)
+        if flags & ALL_POINTS:
+            indices = np.arange(size)
+        else:
+            indices = np.frombuffer(body, "<u8", size, offset).astype(np.int64)
+            offset += 8 * size
+        rows = np.frombuffer(body, POINT_ROW, size, offset)
+        if row >= len(path_manager.paths) or (len(indices) and indices.max() >= count):
+            raise mismatch
+        path_manager.paths[row].restore(count, indices, rows, bool(flags & CLOSED))
+    elif kind == PATH_ADDED:
+        row, width = struct.unpack_from(ADDED_FORMAT, body)
+        if row != len(path_manager.paths):
+            raise mismatch
+        path = Path()
+        path.stroke_width = int(width) if width.is_integer() else width
+        path.stroke_color, offset = _decode_text(body, struct.calcsize(ADDED_FORMAT))
+        path.fill, _ = _decode_text(body, offset)
+        path_manager.add_path(path)
+    elif kind == PATH_REMOVED:
+        row, = struct.unpack("<Q", body)
+        if row != len(path_manager.paths) - 1:
+            raise mismatch
+        path_manager.pop_path()
+    elif kind == PATHS_CLEARED:
+        path_manager.clear()
+    elif kind == SNAP_ADDED:
+        x, y, radius = struct.unpack("<ddd", body)
+        tool_state.add_snap_point((x, y), radius)
+    elif kind == SNAPS_CLEARED:
+        tool_state.clear_snap_points()
+    else:
+        raise JournalError(f"unknown autosave record type {kind}")
+
+def read_header(stream):
+    """Return (base name or None, base size, base mtime) and leave `stream` after it."""
+    data = stream.read(JOURNAL_HEADER_SIZE)
+    if len(data) < JOURNAL_HEADER_SIZE:
+        raise JournalError("the autosave journal is truncated")
+    magic, version, name_size, size, mtime = struct.unpack(JOURNAL_HEADER, data)
+    if magic != MAGIC:
+        raise JournalError("not an autosave journal")
+    if version != VERSION:
+        raise JournalError(f"unsupported autosave journal version {version}")
+    name = stream.read(name_size)
+    if len(name) < name_size:
+        raise JournalError("the autosave journal is truncated")
+    return name.decode("utf-8") or None, size, mtime
+
+def iter_records(data, offset):
+    """Yield (type, body, end offset) for the intact records of `data`."""
+    while offset + RECORD_HEADER_SIZE <= len(data):
+        size, crc = struct.unpack_from(RECORD_HEADER, data, offset)
+        start = offset + RECORD_HEADER_SIZE
+        payload = data[start:start + size]
+        if size == 0 or len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        offset = start + size
+        yield payload[0], payload[1:], offset
+
+def replay_journal(filename, path_manager, tool_state):
+    """Load a journal's base document and apply its records.
+
+    Returns the offset just past the last intact record, where writing can
+    resume.
+    """
+    with open(filename, "rb") as stream:
+        base, size, mtime = read_header(stream)
+        offset = stream.tell()
+        stream.seek(0)
+        data = memoryview(stream.read())
+
+    if base is None:
+        path_manager.clear()
+        tool_state.clear_snap_points()
+    else:
+        status = os.stat(base)
+        if status.st_size != size or status.st_mtime_ns != mtime:
+            raise JournalError(f"{base} changed after the autosave journal was started")
+        reader = DocumentReader(base)
+        path_manager.load_document(reader)
+        tool_state.clear_snap_points()
+        for x, y, radius in reader.snap_points:
+            tool_state.add_snap_point((x, y), radius)
+
+    end = offset
+    for kind, body, end in iter_records(data, offset):
+        try:
+            apply_record(kind, body, path_manager, tool_state)
+        except (struct.error, ValueError) as error:
+            # A record that passed its CRC but does not decode
+            raise JournalError(f"damaged autosave record: {error}") from error
+    return end
+
+def _autosave_files(directory):
+    """Journals and snapshots in `directory`."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return set()
+    return {os.path.join(directory, name) for name in names
+            if JOURNAL_NAME.match(name) or name.startswith("snapshot-")}
+
+def set_aside(filename):
+    """Move a journal that failed to replay where new journals will not delete it.
+
+    The journal goes to the FAILED_DIRECTORY beside its instance directory,
+    together with its base if that is an autosave snapshot. Returns the
+    directory the files were moved to.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    failed = os.path.join(os.path.dirname(directory), FAILED_DIRECTORY,
+                          os.path.basename(directory))
+    os.makedirs(failed, exist_ok=True)
+    files = [filename]
+    try:
+        with open(filename, "rb") as stream:
+            base = read_header(stream)[0]
+    except JournalError:
+        base = None
+    if base is not None and os.path.dirname(base) == directory:
+        files.append(base)
+    for name in files:
+        if os.path.exists(name):
+            shutil.move(name, os.path.join(failed, os.path.basename(name)))
+    return failed
+
+def _lock(directory, create=False):
+    """Open and lock the lock file of `directory` without waiting.
+
+    Returns the open file, which holds the lock until it is closed, or None
+    while another process holds it or the file does not exist. The OS
+    releases the lock when its process ends, however it ends.
+    """
+    try:
+        stream = open(os.path.join(directory, LOCK_NAME), "a+b" if create else "r+b")
+    except FileNotFoundError:
+        return None
+    try:
+        stream.seek(0)
+        if fcntl is not None:
+            fcntl.flock(stream.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(stream.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        stream.close()
+        return None
+    return stream
+
+def claim_directory(root):
+    """Reserve a journal directory under the autosave directory `root`.
+
+    The directory of an instance that is no longer running is taken over
+    when it holds a journal to recover, so its edits can be offered; those
+    with nothing to recover are removed. Otherwise a new directory is made.
+    Returns (directory, lock), where the open lock file keeps other
+    instances out of the directory until `release_directory`.
+    """
+    os.makedirs(root, exist_ok=True)
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if not name.startswith(INSTANCE_PREFIX) or not os.path.isdir(directory):
+            continue
+        # Directories being created have no lock file yet
+        lock = _lock(directory)
+        if lock is None:
+            continue
+        if find_journal(directory) is not None:
+            return directory, lock
+        release_directory(directory, lock)
+
+    directory = tempfile.mkdtemp(prefix=f"{INSTANCE_PREFIX}{os.getpid()}-", dir=root)
+    lock = _lock(directory, create=True)
+    if lock is None:
+        raise OSError(f"could not lock {directory}")
+    return directory, lock
+
+def release_directory(directory, lock):
+    """Delete a claimed journal directory's autosave files, then the directory."""
+    for filename in _autosave_files(directory):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+    lock.close()
+    try:
+        os.remove(os.path.join(directory, LOCK_NAME))
+        os.rmdir(directory)
+    except OSError:
+        # Another instance removing it too, or files that are not ours
+        pass
+
+def find_journal(directory):
+    """Newest journal in `directory` holding records, or None.
+
+    Journals of older generations are only considered if newer ones are
+    unreadable, e.g. when a crash interrupted starting one.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    journals = sorted((int(match.group(1)), name) for name in names
+                      if (match := JOURNAL_NAME.match(name)))
+    for _, name in reversed(journals):
+        filename = os.path.join(directory, name)
+        try:
+            with open(filename, "rb") as stream:
+                base, _, _ = read_header(stream)
+                data = stream.read(RECORD_HEADER_SIZE)
+        except (OSError, JournalError):
+            continue
+        if base is not None and not os.path.exists(base):
+            continue
+        return filename if len(data) == RECORD_HEADER_SIZE else None
+    return None
+
+class _DirtyPoints:
+    """Points of one path changed since the last flush."""
+
+    def __init__(self, everything=False):
+        self.everything = everything
+        self.parts = []
+        self.last = None
+
+    def mark(self, indices):
+        if self.everything:
+            return
+        if indices is None:
+            self.everything = True
+            self.parts = []
+            return
+        # Bulk transforms report the same index array on every update
+        if indices is self.last:
+            return
+        if isinstance(indices, np.ndarray):
+            self.last = indices
+        if isinstance(indices, range):
+            indices = np.arange(indices.start, indices.stop)
+        if len(indices):
+            self.parts.append(indices)
+
+    def indices(self, count):
+        """Sorted indices below `count`, or None when all points changed."""
+        if self.everything:
+            return None
+        if not self.parts:
+            return np.empty(0, dtype=np.int64)
+        indices = np.unique(np.concatenate([np.asarray(part, dtype=np.int64)
+                                            for part in self.parts]))
+        return indices[indices < count]
+
+class Journal:
+    """Append-only autosave log of edits, written by a background thread.
+
+    The journal observes a `PathManager` and a `ToolState`. Adding,
+    removing and clearing paths and snap points are encoded as they happen;
+    point edits only mark the points dirty, and `flush` encodes the current
+    values of everything marked since the last flush, so a long drag costs
+    one record per path per flush. Encoded records go through a queue of at
+    most QUEUE_DEPTH flushes to the writer thread, which appends whatever
+    is queued and then calls fsync once for the batch. Autosave I/O thus
+    follows the amount of editing, not the size of the document.
+
+    When the journal has grown past COMPACT_BYTES and past the size of its
+    base document, the writer replays it onto a private copy of the base,
+    saves that as a snapshot and starts a new journal on it; the document
+    being edited is never touched. Every journal and snapshot carries a
+    generation number, and old generations are deleted only once the new
+    journal is on disk, so a crash at any point leaves a usable pair.
+
+    `directory` must be reserved for this journal with `claim_directory`.
+    Only the journal's own generations are ever deleted; files already in
+    the directory were left by an instance that is gone and count as the
+    journal's own once their edits are recovered or declined.
+    """
+    QUEUE_DEPTH = 16
+    COMPACT_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, directory, path_manager, tool_state):
+        self.directory = os.path.abspath(directory)
+        self.path_manager = path_manager
+        self.tool_state = tool_state
+        # Set by the writer thread when writing fails; later records are dropped
+        self.error = None
+        self.bytes_written = 0
+        self.syncs = 0
+        self.compactions = 0
+        self._dirty = {}
+        self._pending = []
+        self._queue = queue.Queue(self.QUEUE_DEPTH)
+        # Only used by the writer thread
+        self._file = None
+        self._filename = None
+        self._generation = 0
+        self._base_size = 0
+        self._journal_bytes = 0
+        self._files = _autosave_files(self.directory)
+
+        path_manager.journal = self
+        path_manager.observers.append(self.path_changed)
+        tool_state.journal = self
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    # Called on the GUI thread
+
+    def start(self, base=None):
+        """Start a new journal on `base`, a saved document, or on nothing.
+
+        The current document must equal `base`; edits not yet flushed are
+        dropped because `base` already has them.
+        """
+        self._dirty = {}
+        self._pending = []
+        self._queue.put(("start", base and os.path.abspath(base)))
+
+    def resume(self, filename, end):
+        """Keep appending to `filename` after its intact records end at `end`."""
+        self._queue.put(("resume", filename, end))
+
+    def flush(self, wait=False):
+        """Queue everything edited since the last flush for writing.
+
+        While the writer is QUEUE_DEPTH flushes behind, e.g. during a
+        compaction, the encoded records are kept for the next flush unless
+        `wait` is true.
+        """
+        records = self._pending
+        self._pending = []
+        dirty, self._dirty = self._dirty, {}
+        for path, points in dirty.items():
+            row = self.path_manager.row_of(path)
+            if row is not None:
+                records.append(encode_path_points(path, row, points.indices(path.storage.count)))
+        if records:
+            data = b"".join(records)
+            try:
+                self._queue.put(("records", data), block=wait)
+            except queue.Full:
+                self._pending = [data]
+
+    def close(self, discard=False):
+        """Write out everything and stop; `discard` deletes the journal files."""
+        if not discard:
+            self.flush(wait=True)
+        self._queue.put(("close", discard))
+        self._thread.join()
+
+    def path_changed(self, path, indices):
+        points = self._dirty.get(path)
+        if points is None:
+            points = self._dirty[path] = _DirtyPoints()
+        points.mark(indices)
+
+    def path_added(self, path, row):
+        self._pending.append(encode_path_added(path, row))
+        self._dirty[path] = _DirtyPoints(everything=True)
+
+    def path_removed(self, path, row):
+        self._dirty.pop(path, None)
+        self._pending.append(_record(PATH_REMOVED, struct.pack("<Q", row)))
+
+    def paths_cleared(self):
+        self._dirty = {}
+        self._pending.append(_record(PATHS_CLEARED))
+
+    def snap_point_added(self, snap_point):
+        x, y = snap_point.position
+        self._pending.append(_record(SNAP_ADDED, struct.pack("<ddd", x, y, snap_point.radius)))
+
+    def snap_points_cleared(self):
+        self._pending.append(_record(SNAPS_CLEARED))
+
+    # Writer thread
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Everything queued meanwhile shares one fsync
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for item in batch:
+                    if item[0] == "close":
+                        self._close(item[1])
+                        return
+                    self._handle(item)
+                if self._file is not None:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self.syncs += 1
+                    if self._journal_bytes > max(self.COMPACT_BYTES, self._base_size):
+                        self._compact()
+            except Exception as error:
+                # Keep draining the queue so the GUI thread is not held up by it
+                self.error = error
+                self._close_file()
+
+    def _handle(self, item):
+        kind = item[0]
+        if kind == "records":
+            if self._file is not None:
+                self._file.write(item[1])
+                self._journal_bytes += len(item[1])
+                self.bytes_written += len(item[1])
+        elif kind == "start":
+            self._start_generation(item[1])
+        elif kind == "resume":
+            filename, end = item[1], item[2]
+            self._close_file()
+            self.error = None
+            self._file = open(filename, "r+b")
+            base = read_header(self._file)[0]
+            self._base_size = os.stat(base).st_size if base else 0
+            self._file.truncate(end)
+            self._file.seek(end)
+            self._filename = filename
+            self._generation = int(JOURNAL_NAME.search(filename).group(1))
+            self._journal_bytes = end
+
+    def _start_generation(self, base):
+        os.makedirs(self.directory, exist_ok=True)
+        self._close_file()
+        self.error = None
+        # Numbered past anything left over, so recovery never prefers an old journal
+        existing = [int(match.group(1)) for name in os.listdir(self.directory)
+                    if (match := JOURNAL_NAME.match(name))]
+        self._generation = max(existing + [self._generation]) + 1
+        filename = os.path.join(self.directory, f"journal-{self._generation:06d}.log")
+        name = base.encode("utf-8") if base else b""
+        status = os.stat(base) if base else None
+        stream = open(filename, "wb")
+        stream.write(struct.pack(JOURNAL_HEADER, MAGIC, VERSION, len(name),
+                                 status.st_size if status else 0,
+                                 status.st_mtime_ns if status else 0) + name)
+        self._files.add(filename)
+        stream.flush()
+        os.fsync(stream.fileno())
+        self._sync_directory()
+        self._file = stream
+        self._filename = filename
+        self._base_size = status.st_size if status else 0
+        self._journal_bytes = stream.tell()
+        # Only now are older journals and snapshots no longer needed
+        keep = {filename, os.path.abspath(base) if base else None}
+        self._remove_files(keep)
+
+    def _compact(self):
+        path_manager = PathManager()
+        tool_state = ToolState()
+        replay_journal(self._filename, path_manager, tool_state)
+        snapshot = os.path.join(self.directory, f"snapshot-{self._generation + 1:06d}.vcd")
+        self._files.add(snapshot)
+        save_document(snapshot, path_manager, tool_state.snap_points)
+        self._start_generation(os.path.abspath(snapshot))
+        self.compactions += 1
+
+    def _close(self, discard):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._close_file()
+        if discard:
+            self._remove_files(set())
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+
+    def _remove_files(self, keep):
+        for filename in self._files - keep:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # e.g. a snapshot still mapped on Windows; removed next time
+                continue
+            self._files.discard(filename)
+
+    def _sync_directory(self):
+        # Makes the new journal's directory entry durable on POSIX systems
+        if hasattr(os, "O_DIRECTORY"):
+            descriptor = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
@@ -0,0 +1,182 @@
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PyQt6.QtGui import QPen, QColor, QPolygonF
+from utils import bezier_segments, flatten_beziers
+
+# Zoom at or below which each proxy level replaces the curves; level k is
+# accurate to about PIXEL_TOLERANCE screen pixels at LEVEL_ZOOMS[k]
+LEVEL_ZOOMS = (0.5, 0.25, 0.125, 0.0625, 0.03125)
+PIXEL_TOLERANCE = 0.5
+# Paths whose box is smaller than this on screen are drawn as a line across it
+SUBPIXEL_SIZE = 1.0
+BOX_LEVEL = len(LEVEL_ZOOMS)
+
+def level_for_zoom(zoom):
+    """Coarsest proxy level usable at `zoom`, or -1 when curves are needed."""
+    level = -1
+    for index, threshold in enumerate(LEVEL_ZOOMS):
+        if zoom <= threshold:
+            level = index
+    return level
+
+def level_tolerance(level):
+    """Largest error of a level's proxies, in scene units."""
+    return PIXEL_TOLERANCE / LEVEL_ZOOMS[level]
+
+def build_proxy(bezier_points, is_closed, tolerance):
+    """Polyline approximating a path to within about `tolerance`.
+
+    The curves are flattened, then runs of consecutive points in the same
+    `tolerance`-sized grid cell are merged, so at the level's zoom a proxy
+    has at most a few points per pixel. Returns an (n, 2) array, empty for
+    paths that draw nothing.
+    """
+    segments = bezier_segments(bezier_points)
+    if not len(segments):
+        return np.empty((0, 2))
+    points, _ = flatten_beziers(segments, tolerance)
+    if is_closed:
+        points = np.concatenate((points, points[:1]))
+    cells = np.floor(points / tolerance)
+    keep = np.empty(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[1:-1] = (cells[1:-1] != cells[:-2]).any(axis=1)
+    return points[keep]
+
+def build_box_proxy(path):
+    """One line across the control box, for paths smaller than a pixel."""
+    box = path.control_bounds()
+    if box is None or len(path.get_bezier_points()) < 4:
+        return np.empty((0, 2))
+    return np.array(((box[0], box[1]), (box[2], box[3])))
+
+def polygon_from_points(points):
+    """QPolygonF holding an (n, 2) array, filled through its buffer."""
+    polygon = QPolygonF()
+    polygon.resize(len(points))
+    if len(points):
+        data = polygon.data()
+        data.setsize(len(points) * 16)
+        np.frombuffer(data, dtype=np.float64).reshape(-1, 2)[:] = points
+    return polygon
+
+class ProxyCache:
+    """Simplified polyline proxies of paths, for drawing at low zoom.
+
+    A path gets a proxy for a level of `LEVEL_ZOOMS` the first time that
+    level is asked for. Proxies are valid for the `Path.version` they were
+    built from; a missing or outdated one is rebuilt on a worker thread from
+    a copy of the control points, and until it is ready `get` returns None
+    so the caller draws the full path. `ready` is called from the worker
+    thread after each batch, and `collect` picks the results up.
+    """
+
+    def __init__(self, ready=None):
+        self.ready = ready
+        # path -> {level: (version, QPolygonF)}
+        self._proxies = weakref.WeakKeyDictionary()
+        # path -> {level: version} of builds already queued
+        self._requested = weakref.WeakKeyDictionary()
+        self._queue = []
+        self._finished = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def clear(self):
+        self._proxies = weakref.WeakKeyDictionary()
+        self._requested = weakref.WeakKeyDictionary()
+        self._queue = []
+
+    def get(self, path, level):
+        """Return the polyline of a current proxy, or None."""
+        levels = self._proxies.get(path)
+        if levels is None:
+            levels = self._proxies[path] = {}
+        entry = levels.get(level)
+        if entry is not None and entry[0] == path.version:
+            return entry[1]
+        if level == BOX_LEVEL:
+            # Too cheap to be worth a round trip to the worker
+            polyline = polygon_from_points(build_box_proxy(path))
+            levels[level] = (path.version, polyline)
+            return polyline
+
+        requested = self._requested.get(path)
+        if requested is None:
+            requested = self._requested[path] = {}
+        if requested.get(level) != path.version:
+            requested[level] = path.version
+            self._queue.append((path, level, path.version,
+                                path.get_bezier_points(), path.is_closed))
+        return None
+
+    def flush(self):
+        """Start building the proxies asked for since the last flush."""
+        if not self._queue:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="proxies")
+        batch, self._queue = self._queue, []
+        self._executor.submit(self._build, batch)
+
+    def wait(self):
+        """Build everything queued and store it, blocking until done."""
+        self.flush()
+        if self._executor is not None:
+            # The single worker runs jobs in order
+            self._executor.submit(int).result()
+        self.collect()
+
+    def _build(self, batch):
+        # QPolygonF is a plain value type, so it can be built off the GUI thread
+        built = [(path, level, version, polygon_from_points(
+                      build_proxy(points, is_closed, level_tolerance(level))))
+                 for path, level, version, points, is_closed in batch]
+        with self._lock:
+            self._finished += built
+        if self.ready is not None:
+            self.ready()
+
+    def collect(self):
+        """Store proxies finished by the worker; True if there were any."""
+        with self._lock:
+            finished, self._finished = self._finished, []
+        for path, level, version, polyline in finished:
+            if path.version == version:
+                levels = self._proxies.get(path)
+                if levels is None:
+                    levels = self._proxies[path] = {}
+                levels[level] = (version, polyline)
+        return bool(finished)
+
+def draw_proxies(painter, paths, zoom, proxies, draw_full):
+    """Stroke `paths` in order using their proxies for `zoom`.
+
+    Paths whose proxy is not ready yet are passed to `draw_full`. Returns
+    the number of paths drawn from proxies.
+    """
+    level = level_for_zoom(zoom)
+    subpixel = SUBPIXEL_SIZE / zoom
+    proxies.collect()
+    style = None
+    drawn = 0
+    for path in paths:
+        box = path.control_bounds()
+        if box is None:
+            continue
+        small = box[2] - box[0] < subpixel and box[3] - box[1] < subpixel
+        polyline = proxies.get(path, BOX_LEVEL if small else level)
+        if polyline is None:
+            draw_full(path)
+            style = None
+            continue
+        # Dense drawings mostly share a few pens, so keep the current one
+        if style != (path.stroke_color, path.stroke_width):
+            style = (path.stroke_color, path.stroke_width)
+            painter.setPen(QPen(QColor(path.stroke_color), path.stroke_width))
+        painter.drawPolyline(polyline)
+        drawn += 1
+    proxies.flush()
+    return drawn
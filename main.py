@@ -1,19 +1,33 @@
+import os
 import sys
+import xml.etree.ElementTree as ET
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QToolBar,
                           QToolButton, QVBoxLayout, QWidget, QDialog,
-                          QTextEdit, QPushButton)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QIcon
+                          QTextEdit, QPushButton, QLabel, QFileDialog,
+                          QMessageBox)
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QIcon, QKeySequence
 from canvas import Canvas
 from path_manager import PathManager
 from tools import ToolState, ToolMode
 from styles import StyleSheet
+from document_format import DocumentReader, DocumentError, save_document
+from svg_import import iter_svg_paths
+from history import History
+from journal import (Journal, INSTANCE_PREFIX, claim_directory, release_directory,
+                     find_journal, replay_journal, set_aside)
+
+# Edits are journaled in a subdirectory of this one per running instance,
+# and flushed every AUTOSAVE_INTERVAL milliseconds
+AUTOSAVE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".vectorcraft", "autosave")
+AUTOSAVE_INTERVAL = 1000
 
 class SVGDialog(QDialog):
-    def __init__(self, svg_content, parent=None):
+    def __init__(self, svg_content, parent=None, truncated=False, save_callback=None):
         super().__init__(parent)
         self.setWindowTitle("SVG Path Commands")
         self.setMinimumSize(400, 300)
+        self.save_callback = save_callback
 
         layout = QVBoxLayout(self)
 
@@ -23,11 +37,34 @@ class SVGDialog(QDialog):
         self.text_edit.setReadOnly(True)
         layout.addWidget(self.text_edit)
 
+        # Note when only the beginning of a large document is shown
+        if truncated:
+            layout.addWidget(QLabel(
+                f"Showing the first {len(svg_content) // 1024} KB; save to get the full document."
+            ))
+
+        # Save button
+        if save_callback is not None:
+            save_button = QPushButton("Save...")
+            save_button.clicked.connect(self.save)
+            layout.addWidget(save_button)
+
         # Close button
         close_button = QPushButton("Close")
         close_button.clicked.connect(self.accept)
         layout.addWidget(close_button)
 
+    def save(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save SVG", "drawing.svg",
+            "SVG (*.svg);;Compressed SVG (*.svgz)"
+        )
+        if filename:
+            try:
+                self.save_callback(filename)
+            except OSError as error:
+                QMessageBox.warning(self, "Save SVG", str(error))
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -37,6 +74,7 @@ class MainWindow(QMainWindow):
         # Initialize managers and states
         self.path_manager = PathManager()
         self.tool_state = ToolState()
+        self.history = History(self.path_manager)
 
         # Create main widget and layout
         main_widget = QWidget()
@@ -48,12 +86,70 @@ class MainWindow(QMainWindow):
         self.create_toolbar()
 
         # Create canvas
-        self.canvas = Canvas(self.path_manager, self.tool_state)
+        self.canvas = Canvas(self.path_manager, self.tool_state, self.history)
         layout.addWidget(self.canvas)
+        self.canvas.stroke_fitted.connect(self.show_stroke_stats)
 
         # Set window properties
         self.setMinimumSize(800, 600)
 
+        self.start_autosave()
+
+    def start_autosave(self):
+        """Offer to recover edits left by a crash, then start journaling."""
+        try:
+            self.autosave_directory, self.autosave_lock = claim_directory(AUTOSAVE_DIRECTORY)
+            filename = find_journal(self.autosave_directory)
+        except OSError:
+            # The journal reports the error in the status bar once it writes
+            self.autosave_directory = os.path.join(AUTOSAVE_DIRECTORY, f"{INSTANCE_PREFIX}{os.getpid()}")
+            self.autosave_lock = None
+            filename = None
+        end = None
+        if filename is not None:
+            answer = QMessageBox.question(
+                self, "Recover",
+                "VectorCraft did not shut down cleanly. Recover the unsaved drawing?"
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                try:
+                    end = replay_journal(filename, self.path_manager, self.tool_state)
+                except Exception as error:
+                    # Any failure here would otherwise repeat on every launch.
+                    # Starting afresh must not delete the only copy of the edits.
+                    message = str(error)
+                    try:
+                        message += f"\n\nThe autosave files were moved to {set_aside(filename)}."
+                    except OSError:
+                        pass
+                    QMessageBox.warning(self, "Recover", message)
+                    self.path_manager.clear()
+                    self.tool_state.clear_snap_points()
+                self.history.clear()
+                self.canvas.document_changed()
+
+        self.journal = Journal(self.autosave_directory, self.path_manager, self.tool_state)
+        if end is not None:
+            self.journal.resume(filename, end)
+        else:
+            self.journal.start()
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start(AUTOSAVE_INTERVAL)
+
+    def autosave(self):
+        self.journal.flush()
+        if self.journal.error is not None:
+            self.statusBar().showMessage(f"Autosave failed: {self.journal.error}", AUTOSAVE_INTERVAL)
+
+    def closeEvent(self, event):
+        # Nothing is left to recover after a clean exit
+        self.autosave_timer.stop()
+        self.journal.close(discard=True)
+        if self.autosave_lock is not None:
+            release_directory(self.autosave_directory, self.autosave_lock)
+        super().closeEvent(event)
+
     def create_toolbar(self):
         toolbar = QToolBar()
         toolbar.setStyleSheet(StyleSheet.TOOLBAR)
@@ -67,6 +163,13 @@ class MainWindow(QMainWindow):
         pen_button.clicked.connect(lambda: self.set_tool_mode(ToolMode.PEN))
         toolbar.addWidget(pen_button)
 
+        # Select tool button
+        select_button = QToolButton()
+        select_button.setText("Select")
+        select_button.setCheckable(True)
+        select_button.clicked.connect(lambda: self.set_tool_mode(ToolMode.SELECT))
+        toolbar.addWidget(select_button)
+
         # Direct select tool button
         direct_select_button = QToolButton()
         direct_select_button.setText("Direct")
@@ -102,33 +205,170 @@ class MainWindow(QMainWindow):
         toggle_snap_radius_button.clicked.connect(self.toggle_snap_radius)
         toolbar.addWidget(toggle_snap_radius_button)
 
+        # Grid snapping toggle button
+        snap_grid_button = QToolButton()
+        snap_grid_button.setText("Snap Grid")
+        snap_grid_button.setCheckable(True)
+        snap_grid_button.clicked.connect(self.tool_state.toggle_grid_snapping)
+        toolbar.addWidget(snap_grid_button)
+
+        # Anchor snapping toggle button
+        snap_anchor_button = QToolButton()
+        snap_anchor_button.setText("Snap Anchors")
+        snap_anchor_button.setCheckable(True)
+        snap_anchor_button.clicked.connect(self.tool_state.toggle_anchor_snapping)
+        toolbar.addWidget(snap_anchor_button)
+
         # Close path button
         close_path_button = QToolButton()
         close_path_button.setText("Close")
         close_path_button.clicked.connect(self.close_current_path)
         toolbar.addWidget(close_path_button)
 
+        # Open document button
+        open_button = QToolButton()
+        open_button.setText("Open")
+        open_button.clicked.connect(self.open_document)
+        toolbar.addWidget(open_button)
+
+        # Save document button
+        save_button = QToolButton()
+        save_button.setText("Save")
+        save_button.clicked.connect(self.save_document)
+        toolbar.addWidget(save_button)
+
+        # Undo and redo buttons
+        undo_button = QToolButton()
+        undo_button.setText("Undo")
+        undo_button.setShortcut(QKeySequence.StandardKey.Undo)
+        undo_button.clicked.connect(self.undo)
+        toolbar.addWidget(undo_button)
+
+        redo_button = QToolButton()
+        redo_button.setText("Redo")
+        redo_button.setShortcut(QKeySequence.StandardKey.Redo)
+        redo_button.clicked.connect(self.redo)
+        toolbar.addWidget(redo_button)
+
         # Export SVG button
         export_svg_button = QToolButton()
         export_svg_button.setText("Export SVG")
         export_svg_button.clicked.connect(self.show_svg_export)
         toolbar.addWidget(export_svg_button)
 
+        # Profiler HUD and trace recording
+        profiler_button = QToolButton()
+        profiler_button.setText("Profiler")
+        profiler_button.setCheckable(True)
+        profiler_button.clicked.connect(lambda checked: self.canvas.set_profiler_hud(checked))
+        toolbar.addWidget(profiler_button)
+
+        record_trace_button = QToolButton()
+        record_trace_button.setText("Record Trace")
+        record_trace_button.setCheckable(True)
+        record_trace_button.clicked.connect(self.toggle_trace_recording)
+        toolbar.addWidget(record_trace_button)
+
     def set_tool_mode(self, mode):
         self.tool_state.set_mode(mode)
         self.canvas.update()
 
     def close_current_path(self):
         if self.path_manager.current_path:
+            self.history.begin()
             self.path_manager.current_path.close_path()
+            self.history.commit()
             self.path_manager.current_path = None
             self.canvas.update()
 
+    def open_document(self):
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Open", "",
+            "Drawings (*.vcd *.svg *.svgz);;VectorCraft (*.vcd);;SVG (*.svg *.svgz)"
+        )
+        if filename:
+            self.load_file(filename)
+
+    def load_file(self, filename):
+        try:
+            if filename.lower().endswith((".svg", ".svgz")):
+                # Parse the whole file first so a bad one leaves the drawing alone
+                paths = list(iter_svg_paths(filename))
+                # Imported paths are journaled as new edits
+                self.journal.start()
+                self.path_manager.clear()
+                self.tool_state.clear_snap_points()
+                for path in paths:
+                    self.path_manager.add_path(path)
+            else:
+                reader = DocumentReader(filename)
+                self.path_manager.load_document(reader)
+                self.tool_state.clear_snap_points()
+                for x, y, radius in reader.snap_points:
+                    self.tool_state.add_snap_point((x, y), radius)
+                # The opened file is the journal's new base
+                self.journal.start(filename)
+        except (OSError, EOFError, ET.ParseError, DocumentError) as error:
+            # Truncated .svgz files raise EOFError
+            QMessageBox.warning(self, "Open", str(error))
+            return
+        self.history.clear()
+        self.tool_state.reset_state()
+        self.canvas.document_changed()
+
+    def save_document(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save", "drawing.vcd", "VectorCraft (*.vcd)"
+        )
+        if filename:
+            try:
+                save_document(filename, self.path_manager, self.tool_state.snap_points)
+            except (OSError, DocumentError) as error:
+                QMessageBox.warning(self, "Save", str(error))
+                return
+            # Everything so far is in the saved file; journal from there on
+            self.journal.start(filename)
+
     def show_svg_export(self):
-        svg_content = self.path_manager.export_svg()
-        dialog = SVGDialog(svg_content, self)
+        svg_content, truncated = self.path_manager.export_svg_preview()
+        dialog = SVGDialog(
+            svg_content, self,
+            truncated=truncated,
+            save_callback=self.path_manager.save_svg
+        )
         dialog.exec()
 
+    def undo(self):
+        if self.history.undo():
+            self.canvas.history_changed()
+
+    def redo(self):
+        if self.history.redo():
+            self.canvas.history_changed()
+
+    def show_stroke_stats(self, stats):
+        self.statusBar().showMessage(
+            f"Freeform stroke: {stats.samples} samples -> {stats.anchors} anchors "
+            f"({stats.reduction:.0%} fewer points)", 5000
+        )
+
+    def toggle_trace_recording(self, checked):
+        profiler = self.canvas.profiler
+        if checked:
+            profiler.start_recording()
+            self.statusBar().showMessage("Recording trace...")
+            return
+        profiler.stop_recording()
+        self.statusBar().clearMessage()
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save Trace", "trace.json", "Chrome trace (*.json)"
+        )
+        if filename:
+            try:
+                profiler.save_trace(filename)
+            except OSError as error:
+                QMessageBox.warning(self, "Save Trace", str(error))
+
     def toggle_snap_radius(self):
         self.tool_state.toggle_snap_radius_visibility()
         self.canvas.update()
@@ -1,76 +1,558 @@
-from dataclasses import dataclass
+import io
 import numpy as np
-from utils import calculate_bezier_point, generate_svg_path
+from path_storage import PathStorage
+from spatial_index import PointIndex, ANCHOR, HANDLE_IN
+from utils import (calculate_bezier_point, generate_svg_path, bezier_segments,
+                   segment_lengths, bezier_bounds, nearest_on_beziers, split_bezier)
+from svg_export import write_svg, export_svg_file, svg_preview, PREVIEW_BYTES
+
+def _read_only(view):
+    view.flags.writeable = False
+    return view
 
-@dataclass
 class PathPoint:
-    position: np.ndarray
-    handle_in: np.ndarray = None
-    handle_out: np.ndarray = None
-    is_smooth: bool = True
+    """Lightweight view of one point stored in a path's `PathStorage`.
+
+    Reads return read-only views into the storage blocks, so an in-place
+    update raises; assign new values instead
+    (`point.position = point.position + delta`) so the path can record and
+    announce the edit. Copy a value to keep it across later edits.
+    """
+    __slots__ = ("path", "index")
+
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, PathPoint) and other.path is self.path
+                and other.index == self.index)
+
+    def __hash__(self):
+        return hash((id(self.path), self.index))
+
+    def __repr__(self):
+        return (f"PathPoint(position={self.position!r}, handle_in={self.handle_in!r}, "
+                f"handle_out={self.handle_out!r}, is_smooth={self.is_smooth!r})")
+
+    @property
+    def position(self):
+        return _read_only(self.path.storage.positions[self.index])
+
+    @position.setter
+    def position(self, value):
+        self.path.set_position(self.index, value)
+
+    @property
+    def handle_in(self):
+        storage = self.path.storage
+        if not storage.has_in[self.index]:
+            return None
+        return _read_only(storage.handles_in[self.index])
+
+    @handle_in.setter
+    def handle_in(self, value):
+        self.path.set_handle_in(self.index, value)
+
+    @property
+    def handle_out(self):
+        storage = self.path.storage
+        if not storage.has_out[self.index]:
+            return None
+        return _read_only(storage.handles_out[self.index])
+
+    @handle_out.setter
+    def handle_out(self, value):
+        self.path.set_handle_out(self.index, value)
+
+    @property
+    def is_smooth(self):
+        return bool(self.path.storage.smooth[self.index])
+
+    @is_smooth.setter
+    def is_smooth(self, value):
+        self.path.set_smooth(self.index, value)
+
+class PathPoints:
+    """Sequence of `PathPoint` views over a path's storage."""
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __len__(self):
+        return self.path.storage.count
+
+    def __getitem__(self, index):
+        count = len(self)
+        if isinstance(index, slice):
+            return [PathPoint(self.path, i) for i in range(*index.indices(count))]
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("path point index out of range")
+        return PathPoint(self.path, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield PathPoint(self.path, i)
 
 class Path:
     def __init__(self):
-        self.points = []
+        self.storage = PathStorage()
         self.is_closed = False
         self.stroke_width = 2
         self.stroke_color = "#000000"
         self.fill = "none"
+        self.observers = []
+        # Called as before_change(path, indices) before existing points are
+        # modified or removed, and with () before appends and close
+        self.before_change = None
+        self.version = 0
+        self._bounds = None
+        self._bounds_loose = False
+        self._segment_cache = None
+
+    @property
+    def points(self):
+        return PathPoints(self)
+
+    def _will_change(self, indices):
+        if self.before_change is not None:
+            self.before_change(self, indices)
+
+    def _changed(self, indices, grew=False):
+        """Bump the version and tell observers which point indices changed.
+
+        `indices` is None when any point may have changed; `grew` says the
+        indices were only appended, so the bounding box can just expand.
+        """
+        self.version += 1
+        self._update_bounds(indices, grew)
+        for observer in self.observers:
+            observer(self, indices)
+
+    def _update_bounds(self, indices, grew):
+        if indices is None:
+            self._bounds = None
+            return
+        if len(indices) == 0:
+            return
+        if isinstance(indices, np.ndarray):
+            # Bulk edits recompute the box once, when it is next needed
+            self._bounds = None
+            return
+        if not grew:
+            # Moved points may have defined the old box, so it can only be
+            # trusted as an upper bound until it is recomputed
+            self._bounds_loose = True
+        if self._bounds is not None:
+            if isinstance(indices, range):
+                low, high = indices.start, indices.stop
+            else:
+                low, high = min(indices), max(indices) + 1
+            changed = self.storage.control_bounds(low, high)
+            if changed is not None:
+                self._bounds = (
+                    min(self._bounds[0], changed[0]), min(self._bounds[1], changed[1]),
+                    max(self._bounds[2], changed[2]), max(self._bounds[3], changed[3]),
+                )
+
+    def control_bounds(self):
+        """Bounding box of all anchors and handles, or None for an empty path."""
+        if self._bounds is None or self._bounds_loose:
+            self._bounds = self.storage.control_bounds()
+            self._bounds_loose = False
+        return self._bounds
+
+    def bounds(self):
+        """Control-point bounding box padded by half the stroke width."""
+        box = self.control_bounds()
+        if box is None:
+            return None
+        pad = self.stroke_width / 2
+        return (box[0] - pad, box[1] - pad, box[2] + pad, box[3] + pad)
 
     def add_point(self, position, handle_in=None, handle_out=None):
-        point = PathPoint(
-            np.array(position),
-            np.array(handle_in) if handle_in is not None else None,
-            np.array(handle_out) if handle_out is not None else None
-        )
-        self.points.append(point)
+        self._will_change(())
+        index = self.storage.append(position, handle_in, handle_out)
+        self._changed((index,), grew=True)
+
+    def extend_points(self, positions, handles_in=None, handles_out=None,
+                      has_in=None, has_out=None):
+        """Append many points at once; see `PathStorage.extend`."""
+        self._will_change(())
+        start = self.storage.extend(positions, handles_in, handles_out, has_in, has_out)
+        if self.storage.count > start:
+            self._changed(range(start, self.storage.count), grew=True)
+
+    def truncate(self, count):
+        """Drop every point from `count` onwards."""
+        if count >= self.storage.count:
+            return
+        self._will_change(range(count, self.storage.count))
+        self.storage.truncate(count)
+        self._bounds_loose = True
+        self._changed(())
+
+    def set_position(self, index, value):
+        self._will_change((index,))
+        self.storage.positions[index] = value
+        self._changed((index,))
+
+    def set_handle_in(self, index, value):
+        self._will_change((index,))
+        storage = self.storage
+        storage.has_in[index] = value is not None
+        if value is not None:
+            storage.handles_in[index] = value
+        self._changed((index,))
+
+    def set_handle_out(self, index, value):
+        self._will_change((index,))
+        storage = self.storage
+        storage.has_out[index] = value is not None
+        if value is not None:
+            storage.handles_out[index] = value
+        self._changed((index,))
+
+    def set_smooth(self, index, value):
+        self._will_change((index,))
+        self.storage.smooth[index] = value
+        self._changed((index,))
+
+    def set_points(self, indices, positions, handles_in, handles_out, bounds=None):
+        """Overwrite the anchors and handles of many points at once.
+
+        Which points have handles is unchanged; used by bulk transforms.
+        Callers that already know the new control bounds of the whole path
+        can pass them as `bounds` to save recomputing them.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        self._will_change(indices)
+        storage = self.storage
+        storage.positions[indices] = positions
+        storage.handles_in[indices] = handles_in
+        storage.handles_out[indices] = handles_out
+        self._changed(indices)
+        if bounds is not None:
+            self._bounds = bounds
+            self._bounds_loose = False
 
     def close_path(self):
-        if len(self.points) >= 3:
+        if len(self.storage) >= 3:
+            self._will_change(())
             self.is_closed = True
+            self._changed(())
+
+    def restore(self, count, indices, rows, is_closed):
+        """Set the point count, write `rows` at `indices` and the closed flag.
+
+        Used by undo and redo; observers are told about the written rows and
+        any rows added by growing the count.
+        """
+        storage = self.storage
+        old_count = storage.count
+        storage.resize(count)
+        storage.set_rows(indices, rows)
+        self.is_closed = is_closed
+        self._bounds_loose = True
+        changed = np.union1d(indices, np.arange(old_count, count)).astype(np.int64)
+        self._changed(changed[changed < count])
 
     def get_bezier_points(self):
-        bezier_points = []
-        for i in range(len(self.points)):
-            current = self.points[i]
-            bezier_points.append(current.position)
+        return self.storage.bezier_points()
+
+    def segments(self):
+        """(m, 4, 2) cubic segments as drawn, excluding the closing line."""
+        return self.segment_table()[0]
+
+    def segment_table(self):
+        """Return (segments, boxes) with each segment's control-polygon box.
 
-            if current.handle_out is not None:
-                bezier_points.append(current.handle_out)
+        Both are cached until the path changes; the boxes contain the curve
+        and are used to prefilter hit tests.
+        """
+        if self._segment_cache is None or self._segment_cache[0] != self.version:
+            segments = bezier_segments(self.get_bezier_points())
+            boxes = np.concatenate((segments.min(axis=1), segments.max(axis=1)), axis=1) \
+                if len(segments) else np.empty((0, 4))
+            self._segment_cache = (self.version, segments, boxes)
+        return self._segment_cache[1:]
 
-            next_point = self.points[(i + 1) % len(self.points)]
-            if next_point.handle_in is not None:
-                bezier_points.append(next_point.handle_in)
+    def segments_follow_points(self):
+        """True when segment k runs from point k to point k + 1.
 
-            if i == len(self.points) - 1 and not self.is_closed:
-                break
+        That holds when every point but the last has an out handle and every
+        point but the first has an in handle; otherwise the drawn segments
+        group control points across anchors.
+        """
+        storage = self.storage
+        n = storage.count
+        return n >= 2 and storage.has_out[:n - 1].all() and storage.has_in[1:n].all()
 
-        return bezier_points
+    def split_segment(self, segment, t):
+        """Insert an anchor on `segment` at `t` without changing the curve.
+
+        Only valid when `segments_follow_points()`; returns the new index.
+        """
+        left, right = split_bezier(self.segments()[segment], t)
+        storage = self.storage
+        # Every following point shifts up by one
+        self._will_change(range(segment, storage.count))
+        storage.handles_out[segment] = left[1]
+        storage.handles_in[segment + 1] = right[2]
+        index = storage.insert(segment + 1, left[3], left[2], right[1])
+        # The halves lie inside the old control polygon, so bounds only need
+        # to cover the shifted points
+        self._changed(range(segment, storage.count), grew=True)
+        return index
+
+    def length(self):
+        """Arc length of the drawn path, including the closing line."""
+        segments = self.segments()
+        total = float(segment_lengths(segments).sum())
+        if self.is_closed and len(segments):
+            total += float(np.hypot(*(segments[0, 0] - segments[-1, 3])))
+        return total
+
+    def curve_bounds(self):
+        """Tight bounding box of the drawn curve, or None without segments.
+
+        Unlike `control_bounds` this does not include handles that pull the
+        control polygon outside the curve itself.
+        """
+        segments = self.segments()
+        if len(segments) == 0:
+            return None
+        boxes = bezier_bounds(segments)
+        low = boxes[:, :2].min(axis=0)
+        high = boxes[:, 2:].max(axis=0)
+        return (low[0], low[1], high[0], high[1])
 
     def to_svg(self, canvas_height=600):
         path_data = generate_svg_path(self.get_bezier_points(), canvas_height)
         return f'<path d="{path_data}" stroke="{self.stroke_color}" stroke-width="{self.stroke_width}" fill="{self.fill}"/>'
 
+class LazyPaths:
+    """List of paths that are read from a document reader on first access.
+
+    `on_materialize(path, row)` is called once for every path that is
+    loaded, so the owner can index it. Paths appended later are held
+    directly.
+    """
+
+    def __init__(self, reader, on_materialize):
+        self.reader = reader
+        self.on_materialize = on_materialize
+        self._items = [None] * reader.path_count
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self._items)
+        path = self._items[row]
+        if path is None:
+            path = self._items[row] = self.reader.read_path(row)
+            self.on_materialize(path, row)
+        return path
+
+    def __iter__(self):
+        for row in range(len(self._items)):
+            yield self[row]
+
+    def append(self, path):
+        self._items.append(path)
+
+    def pop(self):
+        path = self[len(self._items) - 1]
+        self._items.pop()
+        return path
+
+    def is_materialized(self, row):
+        return self._items[row] is not None
+
+    def materialized_count(self):
+        return sum(item is not None for item in self._items)
+
+    def materialized_mask(self):
+        return np.fromiter((item is not None for item in self._items),
+                           dtype=bool, count=len(self._items))
+
 class PathManager:
     def __init__(self):
         self.paths = []
         self.current_path = None
+        self.point_index = PointIndex()
+        self._rows = {}
+        self._bounds = np.full((16, 4), np.nan)
+        self._dirty_bounds = set()
+        self.observers = []
+        # Undo history notified before path edits and after paths are added
+        self.recorder = None
+        # Autosave journal notified when paths are added, removed or cleared
+        self.journal = None
 
     def start_new_path(self):
         self.current_path = Path()
-        self.paths.append(self.current_path)
+        self.add_path(self.current_path)
+
+    def add_path(self, path):
+        row = len(self.paths)
+        self.paths.append(path)
+        self._dirty_bounds.add(row)
+        self._register_path(path, row)
+        if self.recorder is not None:
+            self.recorder.path_added(path)
+        if self.journal is not None:
+            self.journal.path_added(path, row)
+
+    def row_of(self, path):
+        """Row of `path` in `paths`, or None if it is not in the document."""
+        return self._rows.get(path)
+
+    def pop_path(self):
+        """Remove and return the last path; used to undo adding it."""
+        path = self.paths[-1]
+        row = len(self.paths) - 1
+        self.paths.pop()
+        del self._rows[path]
+        path.observers.remove(self._path_changed)
+        path.before_change = None
+        self.point_index.remove_path(path)
+        # The table only grows when it is next read
+        if row < len(self._bounds):
+            self._bounds[row] = np.nan
+        self._dirty_bounds.discard(row)
+        if self.current_path is path:
+            self.current_path = None
+        if self.journal is not None:
+            self.journal.path_removed(path, row)
+        return path
+
+    def _register_path(self, path, row, defer_index=False):
+        self._rows[path] = row
+        path.observers.append(self._path_changed)
+        path.before_change = self._path_will_change
+        self.point_index.add_path(path, defer=defer_index)
+
+    def _register_loaded_path(self, path, row):
+        # Loaded paths are indexed only once a hit-test comes near them
+        self._register_path(path, row, defer_index=True)
+
+    def clear(self):
+        """Remove every path, keeping the manager and its index objects."""
+        self.paths = []
+        self.current_path = None
+        self.point_index.clear()
+        self._rows = {}
+        self._bounds = np.full((16, 4), np.nan)
+        self._dirty_bounds = set()
+        if self.journal is not None:
+            self.journal.paths_cleared()
+
+    def load_document(self, reader):
+        """Replace the paths with the lazily loaded paths of `reader`.
+
+        Paths are only read when they are accessed, e.g. when they become
+        visible or are hit-tested; their bounds come from the document.
+        """
+        self.clear()
+        self.paths = LazyPaths(reader, self._register_loaded_path)
+        self._bounds = np.array(reader.bounds, dtype=float)
+        self.point_index.before_query = self._materialize_near
+
+    def _path_will_change(self, path, indices):
+        if self.recorder is not None:
+            self.recorder.path_will_change(path, indices)
+
+    def _path_changed(self, path, indices):
+        self._dirty_bounds.add(self._rows[path])
+        for observer in self.observers:
+            observer(path, indices)
+
+    def bounds_table(self):
+        """Return an (n, 4) array of path bounds, NaN rows for empty paths.
+
+        Only rows of paths edited since the last call are recomputed.
+        """
+        count = len(self.paths)
+        if len(self._bounds) < count:
+            grown = np.full((max(count, 2 * len(self._bounds)), 4), np.nan)
+            grown[:len(self._bounds)] = self._bounds
+            self._bounds = grown
+
+        for row in self._dirty_bounds:
+            box = self.paths[row].bounds()
+            self._bounds[row] = box if box is not None else np.nan
+        self._dirty_bounds.clear()
+        return self._bounds[:count]
+
+    def paths_in_rect(self, left, top, right, bottom):
+        """Return the paths whose bounds intersect the rectangle, in order."""
+        bounds = self.bounds_table()
+        # NaN rows compare False and are rejected with everything else
+        visible = ((bounds[:, 0] <= right) & (bounds[:, 2] >= left) &
+                   (bounds[:, 1] <= bottom) & (bounds[:, 3] >= top))
+        paths = self.paths
+        return [paths[row] for row in np.flatnonzero(visible)]
+
+    def _materialize_near(self, pos, radius):
+        """Load and index lazily stored paths whose bounds reach `pos`."""
+        x, y = pos[0], pos[1]
+        bounds = self.bounds_table()
+        near = ((bounds[:, 0] - radius <= x) & (bounds[:, 2] + radius >= x) &
+                (bounds[:, 1] - radius <= y) & (bounds[:, 3] + radius >= y))
+        self.point_index.index_pending([self.paths[row] for row in np.flatnonzero(near)])
+
+    def find_closest_point(self, pos, threshold):
+        """Find the closest anchor or handle on any path within threshold.
+
+        Returns (path, point, is_handle, is_in_handle); path and point are
+        None when nothing is in range.
+        """
+        hit = self.point_index.nearest(pos, threshold)
+        if hit is None:
+            return None, None, False, False
+        path, index, kind, _ = hit
+        return path, path.points[index], kind != ANCHOR, kind == HANDLE_IN
+
+    def find_closest_segment(self, pos, threshold):
+        """Find the closest point on any drawn stroke within threshold.
+
+        Paths are culled with the bounds table and segments with their
+        control-polygon boxes, so only nearby segments are solved. The
+        threshold is measured from the stroke edge. Returns
+        (path, segment index, t, distance) or None.
+        """
+        x, y = float(pos[0]), float(pos[1])
+        best = None
+        for path in self.paths_in_rect(x - threshold, y - threshold, x + threshold, y + threshold):
+            reach = threshold + path.stroke_width / 2
+            segments, boxes = path.segment_table()
+            near = np.flatnonzero((boxes[:, 0] <= x + reach) & (boxes[:, 2] >= x - reach) &
+                                  (boxes[:, 1] <= y + reach) & (boxes[:, 3] >= y - reach))
+            if not len(near):
+                continue
+            index, t, dist = nearest_on_beziers(segments[near], (x, y))
+            if dist <= reach and (best is None or dist < best[3]):
+                best = (path, int(near[index]), t, dist)
+        return best
 
     def get_current_path(self):
         return self.current_path
 
     def export_svg(self, canvas_height=600):
-        svg_paths = []
-        for path in self.paths:
-            svg_paths.append(path.to_svg(canvas_height))
-
-        svg_content = (
-            '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">\n'
-            f'  {"".join(svg_paths)}\n'
-            '</svg>'
-        )
-        return svg_content
\ No newline at end of file
+        stream = io.StringIO()
+        write_svg(self.paths, stream, canvas_height)
+        return stream.getvalue()
+
+    def save_svg(self, filename, canvas_height=600, compress=None):
+        export_svg_file(self.paths, filename, canvas_height, compress)
+
+    def export_svg_preview(self, limit=PREVIEW_BYTES, canvas_height=600):
+        return svg_preview(self.paths, limit, canvas_height)
@@ -0,0 +1,190 @@
+import numpy as np
+
+# One packed point, as used for compact copies of individual rows
+POINT_ROW = np.dtype([
+    ("position", "<f8", (2,)),
+    ("handle_in", "<f8", (2,)),
+    ("handle_out", "<f8", (2,)),
+    ("has_in", "?"),
+    ("has_out", "?"),
+    ("smooth", "?"),
+])
+
+class PathStorage:
+    """Columnar storage for the points of one path.
+
+    Anchors and handles live in contiguous growable NumPy blocks instead of
+    one small array per point, so appends are amortized O(1) and whole-path
+    operations can be done with vectorized array code.
+    """
+    INITIAL_CAPACITY = 8
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.count = 0
+        self._allocate(max(int(capacity), 1))
+
+    def _allocate(self, capacity):
+        self.positions = np.zeros((capacity, 2))
+        self.handles_in = np.zeros((capacity, 2))
+        self.handles_out = np.zeros((capacity, 2))
+        self.has_in = np.zeros(capacity, dtype=bool)
+        self.has_out = np.zeros(capacity, dtype=bool)
+        self.smooth = np.ones(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.positions)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self._columns())
+
+    def _columns(self):
+        return (self.positions, self.handles_in, self.handles_out,
+                self.has_in, self.has_out, self.smooth)
+
+    def reserve(self, capacity):
+        """Grow the blocks so that at least `capacity` points fit."""
+        if capacity <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < capacity:
+            new_capacity *= 2
+
+        old = self._columns()
+        self._allocate(new_capacity)
+        for new_column, old_column in zip(self._columns(), old):
+            new_column[:self.count] = old_column[:self.count]
+
+    def append(self, position, handle_in=None, handle_out=None, is_smooth=True):
+        index = self.count
+        self.reserve(index + 1)
+        self.positions[index] = position
+        self.has_in[index] = handle_in is not None
+        self.has_out[index] = handle_out is not None
+        self.handles_in[index] = handle_in if handle_in is not None else 0.0
+        self.handles_out[index] = handle_out if handle_out is not None else 0.0
+        self.smooth[index] = is_smooth
+        self.count += 1
+        return index
+
+    def extend(self, positions, handles_in=None, handles_out=None,
+               has_in=None, has_out=None, smooth=None):
+        """Append many points at once.
+
+        `handles_in`/`handles_out` are (n, 2) arrays; the `has_*` masks say
+        which of their rows are present and default to "all present" when a
+        handle array is given and "none present" otherwise.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        start, added = self.count, len(positions)
+        end = start + added
+        self.reserve(end)
+
+        self.positions[start:end] = positions
+        for handles, mask, values, flags in (
+            (handles_in, has_in, self.handles_in, self.has_in),
+            (handles_out, has_out, self.handles_out, self.has_out),
+        ):
+            if handles is None:
+                values[start:end] = 0.0
+                flags[start:end] = False
+            else:
+                values[start:end] = np.asarray(handles, dtype=float).reshape(-1, 2)
+                flags[start:end] = True if mask is None else mask
+        self.smooth[start:end] = True if smooth is None else smooth
+        self.count = end
+        return start
+
+    def insert(self, index, position, handle_in=None, handle_out=None, is_smooth=True):
+        """Insert a point before `index`, shifting the following points up."""
+        count = self.count
+        self.reserve(count + 1)
+        for column in self._columns():
+            column[index + 1:count + 1] = column[index:count]
+        self.count = count + 1
+        self.positions[index] = position
+        self.has_in[index] = handle_in is not None
+        self.has_out[index] = handle_out is not None
+        self.handles_in[index] = handle_in if handle_in is not None else 0.0
+        self.handles_out[index] = handle_out if handle_out is not None else 0.0
+        self.smooth[index] = is_smooth
+        return index
+
+    def rows(self, indices):
+        """Copy the given points out as a POINT_ROW array."""
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = np.empty(len(indices), dtype=POINT_ROW)
+        rows["position"] = self.positions[indices]
+        rows["handle_in"] = self.handles_in[indices]
+        rows["handle_out"] = self.handles_out[indices]
+        rows["has_in"] = self.has_in[indices]
+        rows["has_out"] = self.has_out[indices]
+        rows["smooth"] = self.smooth[indices]
+        return rows
+
+    def set_rows(self, indices, rows):
+        """Overwrite the given points from a POINT_ROW array."""
+        indices = np.asarray(indices, dtype=np.int64)
+        self.positions[indices] = rows["position"]
+        self.handles_in[indices] = rows["handle_in"]
+        self.handles_out[indices] = rows["handle_out"]
+        self.has_in[indices] = rows["has_in"]
+        self.has_out[indices] = rows["has_out"]
+        self.smooth[indices] = rows["smooth"]
+
+    def resize(self, count):
+        """Set the point count; new rows are left for the caller to fill."""
+        self.reserve(count)
+        self.count = count
+
+    def truncate(self, count):
+        """Drop every point from `count` onwards."""
+        self.count = max(0, min(int(count), self.count))
+
+    def control_bounds(self, start=0, end=None):
+        """Return (min_x, min_y, max_x, max_y) over anchors and present handles.
+
+        Only points in [start, end) are considered; None if there are none.
+        """
+        start = max(start, 0)
+        end = self.count if end is None else min(end, self.count)
+        if start >= end:
+            return None
+        has_in = self.has_in[start:end]
+        has_out = self.has_out[start:end]
+        coords = np.concatenate((
+            self.positions[start:end],
+            self.handles_in[start:end][has_in],
+            self.handles_out[start:end][has_out],
+        ))
+        low = coords.min(axis=0)
+        high = coords.max(axis=0)
+        return (low[0], low[1], high[0], high[1])
+
+    def bezier_points(self):
+        """Vectorized equivalent of walking the points one by one.
+
+        Every point contributes its anchor, its out handle if present and the
+        in handle of the following point if present, wrapping around at the
+        end of the path. Open and closed paths share the same layout; the
+        closing segment is added by whoever draws the path.
+        """
+        n = self.count
+        if n == 0:
+            return np.empty((0, 2))
+
+        rows = np.empty((n, 3, 2))
+        rows[:, 0] = self.positions[:n]
+        rows[:, 1] = self.handles_out[:n]
+        rows[:, 2] = np.roll(self.handles_in[:n], -1, axis=0)
+
+        mask = np.empty((n, 3), dtype=bool)
+        mask[:, 0] = True
+        mask[:, 1] = self.has_out[:n]
+        mask[:, 2] = np.roll(self.has_in[:n], -1)
+
+        return rows[mask]
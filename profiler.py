@@ -0,0 +1,158 @@
+import collections
+import json
+import os
+import threading
+import time
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+# Handed out while the profiler is off, so an instrumented block costs one
+# attribute check and an empty with statement
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("profiler", "name", "category", "start")
+
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._finish(self.name, self.category, self.start, time.perf_counter_ns())
+        return False
+
+class FrameStats:
+    """What the last frame and the input handled before it cost."""
+
+    def __init__(self, frame_time, stages, counters):
+        self.frame_time = frame_time
+        self.stages = stages
+        self.counters = counters
+
+class FrameProfiler:
+    """Per-frame timing of the canvas, with optional trace recording.
+
+    Code is instrumented with `with profiler.span(name):` blocks and
+    `profiler.count(name, value)`. While `enabled`, span times and counters
+    are summed per frame and `end_frame` turns them into `last_frame` for
+    the on-canvas HUD. While `recording`, every span also becomes a Chrome
+    trace event that `save_trace` writes for chrome://tracing or Perfetto.
+    When both are off, `span` returns a shared no-op object.
+    """
+    HISTORY = 120
+    MAX_TRACE_EVENTS = 1_000_000
+
+    def __init__(self):
+        self.enabled = False
+        self.recording = False
+        self.stages = {}
+        self.counters = {}
+        self.last_frame = None
+        self.frame_times = collections.deque(maxlen=self.HISTORY)
+        self.trace_events = []
+        self.dropped_events = 0
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    @property
+    def active(self):
+        return self.enabled or self.recording
+
+    def span(self, name, category="paint"):
+        if not (self.enabled or self.recording):
+            return _NULL_SPAN
+        return _Span(self, name, category)
+
+    def count(self, name, value=1):
+        if self.enabled or self.recording:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _finish(self, name, category, start, end):
+        self.stages[name] = self.stages.get(name, 0) + (end - start) / 1e9
+        if self.recording:
+            if len(self.trace_events) >= self.MAX_TRACE_EVENTS:
+                self.dropped_events += 1
+                return
+            self.trace_events.append({
+                "name": name, "cat": category, "ph": "X",
+                "ts": (start - self._origin) / 1000, "dur": (end - start) / 1000,
+                "pid": self._pid, "tid": threading.get_ident(),
+            })
+
+    def end_frame(self, name="frame"):
+        """Close the current frame, whose total time is the `name` span."""
+        if not (self.enabled or self.recording):
+            return
+        frame_time = self.stages.pop(name, 0.0)
+        self.frame_times.append(frame_time)
+        self.last_frame = FrameStats(frame_time, self.stages, self.counters)
+        if self.recording and self.counters:
+            self.trace_events.append({
+                "name": "frame counters", "ph": "C",
+                "ts": (time.perf_counter_ns() - self._origin) / 1000,
+                "pid": self._pid, "args": dict(self.counters),
+            })
+        self.stages = {}
+        self.counters = {}
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.last_frame = None
+        self.frame_times.clear()
+
+    # Trace recording
+
+    def start_recording(self):
+        self.trace_events = []
+        self.dropped_events = 0
+        self.recording = True
+
+    def stop_recording(self):
+        self.recording = False
+
+    def save_trace(self, filename):
+        """Write the recorded events as Chrome trace-event JSON."""
+        thread_names = [{
+            "name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+            "args": {"name": "GUI" if tid == threading.main_thread().ident else str(tid)},
+        } for tid in {event["tid"] for event in self.trace_events if "tid" in event}]
+        with open(filename, "w") as file:
+            json.dump({
+                "traceEvents": thread_names + self.trace_events,
+                "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped_events},
+            }, file)
+
+    # HUD
+
+    def hud_lines(self):
+        """Text lines summarizing the last frame, for the on-canvas HUD."""
+        frame = self.last_frame
+        if frame is None:
+            return ["profiler: waiting for a frame"]
+        times = self.frame_times
+        counters = frame.counters
+        lines = [
+            f"frame {frame.frame_time * 1000:.2f} ms  "
+            f"avg {sum(times) / len(times) * 1000:.2f}  max {max(times) * 1000:.2f}",
+            f"paths {counters.get('paths drawn', 0)} drawn, "
+            f"{counters.get('paths culled', 0)} culled",
+            f"input {counters.get('input events', 0)} events, "
+            f"{counters.get('input samples', 0)} applied",
+            f"snap {counters.get('snap queries', 0)} queries, "
+            f"slowest {counters.get('snap max ms', 0):.3f} ms",
+        ]
+        for name, seconds in sorted(frame.stages.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name} {seconds * 1000:.2f} ms")
+        return lines
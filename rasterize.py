@@ -0,0 +1,92 @@
+import math
+import numpy as np
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QPainter, QColor
+from path_manager import PathManager
+from render_cache import PainterPathCache, draw_path
+from document_format import DocumentReader
+from svg_import import import_svg
+
+def load_document(filename):
+    """Load a .vcd, .svg or .svgz file into a new `PathManager`."""
+    path_manager = PathManager()
+    if filename.lower().endswith((".svg", ".svgz")):
+        import_svg(filename, path_manager)
+    else:
+        path_manager.load_document(DocumentReader(filename))
+    return path_manager
+
+def document_bounds(path_manager):
+    """Union of all path bounds as (left, top, right, bottom), or None."""
+    bounds = path_manager.bounds_table()
+    if not len(bounds) or np.isnan(bounds).all():
+        return None
+    return (np.nanmin(bounds[:, 0]), np.nanmin(bounds[:, 1]),
+            np.nanmax(bounds[:, 2]), np.nanmax(bounds[:, 3]))
+
+def fit_view(box, width=None, height=None, scale=1.0, margin=0):
+    """Return (scale, width, height) of an image showing `box`.
+
+    With `width` and/or `height` the box is scaled to fit inside them,
+    keeping its aspect ratio; otherwise it is drawn at `scale`. `margin`
+    is in output pixels on every side.
+    """
+    box_width = max(box[2] - box[0], 1e-9)
+    box_height = max(box[3] - box[1], 1e-9)
+    if width or height:
+        fits = []
+        if width:
+            fits.append((width - 2 * margin) / box_width)
+        if height:
+            fits.append((height - 2 * margin) / box_height)
+        scale = max(min(fits), 1e-9)
+    width = width or math.ceil(box_width * scale) + 2 * margin
+    height = height or math.ceil(box_height * scale) + 2 * margin
+    return scale, max(int(width), 1), max(int(height), 1)
+
+def view_origin(box, scale, width, height):
+    """Scene point at the image's top-left corner, centring `box` in it."""
+    left = (box[0] + box[2]) / 2 - width / scale / 2
+    top = (box[1] + box[3]) / 2 - height / scale / 2
+    return left, top
+
+def render_region(painter, path_manager, left, top, scale, width, height, cache=None,
+                  x=0, y=0):
+    """Draw the paths visible in a `width` x `height` pixel window.
+
+    The view maps scene point (left, top) to pixel (0, 0) at `scale`; the
+    window starts at pixel (x, y) of that view and is drawn at the
+    painter's origin, so tiles of one view line up exactly. Only paths
+    whose bounds reach the window are built and drawn, using the same pens
+    and painter paths as `Canvas.draw_path`.
+    """
+    cache = cache if cache is not None else PainterPathCache()
+    # Antialiasing reaches up to a pixel outside the stroke
+    pad = 1 / scale
+    window_left = left + x / scale
+    window_top = top + y / scale
+    painter.save()
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.translate(-x, -y)
+    painter.scale(scale, scale)
+    painter.translate(-left, -top)
+    for path in path_manager.paths_in_rect(window_left - pad, window_top - pad,
+                                           window_left + width / scale + pad,
+                                           window_top + height / scale + pad):
+        draw_path(painter, path, cache)
+    painter.restore()
+
+def render_document(path_manager, width=None, height=None, scale=1.0, margin=0,
+                    background="#FFFFFF"):
+    """Render a whole document to a new QImage framing all of its paths."""
+    box = document_bounds(path_manager) or (0.0, 0.0, 1.0, 1.0)
+    scale, width, height = fit_view(box, width, height, scale, margin)
+
+    left, top = view_origin(box, scale, width, height)
+
+    image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(background) if background else Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    render_region(painter, path_manager, left, top, scale, width, height)
+    painter.end()
+    return image
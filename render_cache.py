@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import numpy as np
+from PyQt6.QtGui import QPainterPath, QPen, QColor
+
+# Paths with more segments than this are cut down in `draw_path_part`
+PARTIAL_MIN_SEGMENTS = 64
+
+def build_painter_path(path):
+    """Build a QPainterPath from a path's bezier control points."""
+    bezier_points = path.get_bezier_points()
+    if len(bezier_points) < 4:
+        return None
+
+    painter_path = QPainterPath()
+    painter_path.moveTo(bezier_points[0][0], bezier_points[0][1])
+
+    for i in range(1, len(bezier_points)-2, 3):
+        painter_path.cubicTo(
+            bezier_points[i][0], bezier_points[i][1],
+            bezier_points[i+1][0], bezier_points[i+1][1],
+            bezier_points[i+2][0], bezier_points[i+2][1]
+        )
+
+    if path.is_closed:
+        painter_path.closeSubpath()
+
+    return painter_path
+
+def draw_path(painter, path, cache):
+    """Stroke `path` with its own pen, building it through `cache`.
+
+    Shared by the canvas and the offscreen renderers so they draw the same.
+    """
+    if not path.points:
+        return
+
+    cached = cache.get(path)
+    if cached is None:
+        return
+
+    painter_path, pen = cached
+    painter.setPen(pen)
+    painter.drawPath(painter_path)
+
+def draw_path_part(painter, path, cache, rect):
+    """Stroke the part of `path` that can reach into the scene `rect`.
+
+    Stroking costs the same however little of a path is visible, which
+    adds up when thin strips are drawn across long paths. Open paths with
+    many segments are therefore stroked from only the runs of segments near
+    `rect`; the pixels inside it come out the same.
+    """
+    segments, boxes = path.segment_table()
+    if path.is_closed or len(segments) <= PARTIAL_MIN_SEGMENTS:
+        draw_path(painter, path, cache)
+        return
+
+    # Caps and joins reach less than a stroke width past the control boxes
+    pad = path.stroke_width
+    left, top, right, bottom = rect
+    near = np.flatnonzero((boxes[:, 0] - pad <= right) & (boxes[:, 2] + pad >= left) &
+                          (boxes[:, 1] - pad <= bottom) & (boxes[:, 3] + pad >= top))
+    if not len(near):
+        return
+
+    painter_path = QPainterPath()
+    previous = None
+    for index, (p0, p1, p2, p3) in zip(near.tolist(), segments[near].tolist()):
+        if index - 1 != previous:
+            painter_path.moveTo(*p0)
+        painter_path.cubicTo(*p1, *p2, *p3)
+        previous = index
+    painter.setPen(QPen(QColor(path.stroke_color), path.stroke_width))
+    painter.drawPath(painter_path)
+
+class PainterPathCache:
+    """Least-recently-used cache of built painter paths and pens.
+
+    Entries are keyed by path and validated against `Path.version` and the
+    stroke style, so an unchanged path is rebuilt only after eviction. Memory
+    is bounded both by entry count and by the total number of path elements.
+    """
+
+    def __init__(self, max_entries=4096, max_elements=2_000_000):
+        self.max_entries = max_entries
+        self.max_elements = max_elements
+        self.element_count = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.element_count = 0
+
+    def discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.element_count -= entry[4]
+
+    def get(self, path):
+        """Return (painter_path, pen) for `path`, or None if it is too short."""
+        style = (path.stroke_color, path.stroke_width)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == path.version and entry[1] == style:
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[2], entry[3]
+
+        self.misses += 1
+        self.discard(path)
+        painter_path = build_painter_path(path)
+        if painter_path is None:
+            return None
+
+        pen = QPen(QColor(path.stroke_color), path.stroke_width)
+        cost = painter_path.elementCount()
+        self._entries[path] = (path.version, style, painter_path, pen, cost)
+        self.element_count += cost
+        self._evict()
+        return painter_path, pen
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone is over budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or self.element_count > self.max_elements
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.element_count -= entry[4]
@@ -0,0 +1,95 @@
+"""Render VectorCraft documents to PNG files without a window.
+
+Usage:
+
+    python render_cli.py drawings/*.vcd -o thumbnails --width 256 --height 256
+
+Files are spread over a pool of worker processes; each worker starts its
+own offscreen QGuiApplication once and renders with the canvas drawing code.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+_application = None
+
+def _init_worker():
+    # Qt is only imported in the workers, after the platform is chosen
+    global _application
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PyQt6.QtGui import QGuiApplication
+    _application = QGuiApplication([])
+    # Pay for the remaining imports once per worker, not in the first file
+    import rasterize  # noqa: F401
+
+def render_file(filename, output, width=None, height=None, scale=1.0, margin=0,
+                background="#FFFFFF"):
+    """Render one document to `output`; returns (filename, seconds, error)."""
+    from rasterize import load_document, render_document
+    start = time.perf_counter()
+    try:
+        path_manager = load_document(filename)
+        image = render_document(path_manager, width, height, scale, margin, background)
+        if not image.save(output):
+            raise OSError(f"could not write {output}")
+    except Exception as error:
+        return filename, time.perf_counter() - start, f"{type(error).__name__}: {error}"
+    return filename, time.perf_counter() - start, None
+
+def output_name(filename, output_dir):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(output_dir or os.path.dirname(filename), stem + ".png")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help=".vcd, .svg or .svgz documents")
+    parser.add_argument("-o", "--output-dir", help="directory for the PNG files "
+                        "(default: next to each input)")
+    parser.add_argument("--width", type=int, help="fit the drawing into this many pixels")
+    parser.add_argument("--height", type=int, help="fit the drawing into this many pixels")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="pixels per scene unit when no size is given")
+    parser.add_argument("--margin", type=int, default=0, help="border in pixels")
+    parser.add_argument("--background", default="#FFFFFF",
+                        help="background color, or 'none' for transparency")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    background = None if args.background.lower() == "none" else args.background
+
+    total = len(args.files)
+    failed = 0
+    start = time.perf_counter()
+    # Workers are spawned so no Qt state is inherited from the parent
+    context = multiprocessing.get_context("spawn")
+    jobs = max(1, min(args.jobs, total))
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=_init_worker) as executor:
+        futures = [
+            executor.submit(render_file, filename, output_name(filename, args.output_dir),
+                            args.width, args.height, args.scale, args.margin, background)
+            for filename in args.files
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            filename, elapsed, error = future.result()
+            if error is not None:
+                failed += 1
+                print(f"[{done}/{total}] {filename}: {error}", file=sys.stderr)
+            elif not args.quiet:
+                print(f"[{done}/{total}] {filename} ({elapsed * 1000:.0f} ms)", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    rendered = total - failed
+    print(f"Rendered {rendered} of {total} files in {elapsed:.2f} s "
+          f"({rendered / elapsed:.1f} files/s, {jobs} jobs)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
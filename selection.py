@@ -0,0 +1,149 @@
+import math
+import numpy as np
+
+def translation(dx, dy):
+    """3x3 affine matrix moving points by (dx, dy)."""
+    return np.array([[1.0, 0.0, dx],
+                     [0.0, 1.0, dy],
+                     [0.0, 0.0, 1.0]])
+
+def scaling(sx, sy, origin=(0.0, 0.0)):
+    """3x3 affine matrix scaling points about `origin`."""
+    ox, oy = origin
+    return np.array([[sx, 0.0, ox - sx * ox],
+                     [0.0, sy, oy - sy * oy],
+                     [0.0, 0.0, 1.0]])
+
+def rotation(angle, origin=(0.0, 0.0)):
+    """3x3 affine matrix rotating points by `angle` radians about `origin`."""
+    ox, oy = origin
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[c, -s, ox - c * ox + s * oy],
+                     [s, c, oy - s * ox - c * oy],
+                     [0.0, 0.0, 1.0]])
+
+class Selection:
+    """Selected anchors as a sorted array of point indices per path.
+
+    A selected anchor takes its handles along when the selection is
+    transformed, so handles are never selected on their own.
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def __len__(self):
+        return sum(len(indices) for indices in self.items.values())
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def paths(self):
+        return list(self.items)
+
+    def indices(self, path):
+        return self.items.get(path, np.empty(0, dtype=np.int64))
+
+    def contains(self, path, index):
+        indices = self.items.get(path)
+        if indices is None:
+            return False
+        position = np.searchsorted(indices, index)
+        return position < len(indices) and indices[position] == index
+
+    def clear(self):
+        self.items = {}
+
+    def add(self, path, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        if not len(indices):
+            return
+        old = self.items.get(path)
+        self.items[path] = np.unique(indices) if old is None else np.union1d(old, indices)
+
+    def toggle(self, path, index):
+        if self.contains(path, index):
+            remaining = self.items[path][self.items[path] != index]
+            if len(remaining):
+                self.items[path] = remaining
+            else:
+                del self.items[path]
+        else:
+            self.add(path, (index,))
+
+    def select_path(self, path):
+        self.add(path, np.arange(path.storage.count))
+
+    def select_rect(self, path_manager, left, top, right, bottom):
+        """Add every anchor inside the rectangle, across all paths."""
+        for path in path_manager.paths_in_rect(left, top, right, bottom):
+            positions = path.storage.positions[:path.storage.count]
+            inside = ((positions[:, 0] >= left) & (positions[:, 0] <= right) &
+                      (positions[:, 1] >= top) & (positions[:, 1] <= bottom))
+            self.add(path, np.flatnonzero(inside))
+
+    def anchors(self):
+        """(n, 2) positions of every selected anchor."""
+        if not self.items:
+            return np.empty((0, 2))
+        return np.concatenate([path.storage.positions[indices]
+                               for path, indices in self.items.items()])
+
+    def bounds(self):
+        """Bounding box of the selected anchors, or None when empty."""
+        anchors = self.anchors()
+        if not len(anchors):
+            return None
+        low = anchors.min(axis=0)
+        high = anchors.max(axis=0)
+        return (low[0], low[1], high[0], high[1])
+
+class SelectionTransform:
+    """Applies affine matrices to a selection during one drag.
+
+    The anchors and handles of every selected point are stacked once into
+    an (N, 3) array of homogeneous coordinates, so each `apply` is a single
+    matrix product over the whole selection followed by one block write per
+    path. Every update starts from the coordinates at the start of the drag,
+    so rounding errors do not build up. An affine map keeps a point's two
+    handles on one line through the anchor and keeps their length ratio,
+    so smooth points stay smooth under any move, scale or rotation.
+    """
+
+    def __init__(self, selection):
+        self.parts = []
+        blocks = []
+        start = 0
+        for path, indices in selection.items.items():
+            storage = path.storage
+            positions = storage.positions[indices]
+            # Missing handles are unused, so they are given their anchor's
+            # position; that keeps them out of the bounds taken in `apply`
+            blocks += [positions,
+                       np.where(storage.has_in[indices, None], storage.handles_in[indices], positions),
+                       np.where(storage.has_out[indices, None], storage.handles_out[indices], positions)]
+            whole = len(indices) == storage.count
+            self.parts.append((path, indices, start, whole))
+            start += 3 * len(indices)
+        self.count = start // 3
+        self.original = np.ones((start, 3))
+        if blocks:
+            self.original[:, :2] = np.concatenate(blocks)
+        self.starts = np.array([first for _, _, first, _ in self.parts], dtype=np.int64)
+
+    def apply(self, matrix):
+        """Set every selected point to `matrix` applied to its start value."""
+        moved = self.original @ np.asarray(matrix, dtype=float).T
+        boxes = []
+        if self.parts:
+            # Control bounds of every path in two reductions over the stack
+            boxes = np.concatenate((np.minimum.reduceat(moved[:, :2], self.starts),
+                                    np.maximum.reduceat(moved[:, :2], self.starts)),
+                                   axis=1).tolist()
+        for (path, indices, start, whole), box in zip(self.parts, boxes):
+            count = len(indices)
+            # Paths moved as a whole get their new bounds; others recompute them
+            bounds = tuple(box) if whole else None
+            path.set_points(indices, moved[start:start + count, :2],
+                            moved[start + count:start + 2 * count, :2],
+                            moved[start + 2 * count:start + 3 * count, :2], bounds)
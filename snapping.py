@@ -0,0 +1,107 @@
+import math
+import time
+import numpy as np
+from spatial_index import SpatialHashGrid, ANCHOR
+
+class SnapStats:
+    """Cost of the snap queries since the last `reset`, in seconds.
+
+    The canvas hands these to its profiler and resets them every frame.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.query_count = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        self.query_count += 1
+        self.total_time += elapsed
+        self.last_time = elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    @property
+    def mean_time(self):
+        if not self.query_count:
+            return 0.0
+        return self.total_time / self.query_count
+
+class SnapEngine:
+    """Resolves a pointer position to the nearest snap target in range.
+
+    Targets come from three sources: user snap points (each with its own
+    radius, bucketed in a spatial hash), grid intersections and the anchors
+    of existing paths via the document's `PointIndex`.
+    """
+    CELL_SIZE = 64.0
+
+    def __init__(self):
+        self.grid = SpatialHashGrid(self.CELL_SIZE)
+        self.snap_points = []
+        self.max_radius = 0
+
+        self.snap_to_grid = False
+        self.grid_size = 20
+        self.grid_radius = 6
+
+        self.snap_to_anchors = False
+        self.point_index = None
+        self.anchor_radius = 8
+
+        self.stats = SnapStats()
+
+    def add_snap_point(self, snap_point):
+        key = len(self.snap_points)
+        self.snap_points.append(snap_point)
+        self.max_radius = max(self.max_radius, snap_point.radius)
+        self.grid.insert(key, *snap_point.position)
+
+    def clear_snap_points(self):
+        self.snap_points = []
+        self.max_radius = 0
+        self.grid.clear()
+
+    def snap(self, position, exclude=None):
+        """Return the nearest snap target for `position`, or `position` itself.
+
+        `exclude` is a `PathPoint` that must not snap to its own anchor.
+        """
+        start = time.perf_counter()
+        x, y = float(position[0]), float(position[1])
+        best = None
+        best_dist = math.inf
+
+        if self.snap_points:
+            hit = self.grid.nearest(
+                x, y, self.max_radius,
+                lambda key: self.snap_points[key].position,
+                lambda key, dist: dist <= self.snap_points[key].radius
+            )
+            if hit is not None:
+                key, best_dist = hit
+                best = self.snap_points[key].get_snap_position()
+
+        if self.snap_to_grid and self.grid_size > 0:
+            gx = round(x / self.grid_size) * self.grid_size
+            gy = round(y / self.grid_size) * self.grid_size
+            dist = math.hypot(gx - x, gy - y)
+            if dist <= self.grid_radius and dist < best_dist:
+                best, best_dist = np.array([gx, gy], dtype=float), dist
+
+        if self.snap_to_anchors and self.point_index is not None:
+            excluded = (exclude.path, exclude.index) if exclude is not None else None
+            hit = self.point_index.nearest((x, y), min(self.anchor_radius, best_dist),
+                                           kinds=(ANCHOR,), exclude=excluded)
+            if hit is not None:
+                path, index, _, dist = hit
+                if dist < best_dist:
+                    best, best_dist = path.storage.positions[index].copy(), dist
+
+        self.stats.record(time.perf_counter() - start)
+        if best is None:
+            return np.array(position)
+        return best
@@ -0,0 +1,304 @@
+import math
+import numpy as np
+
+ANCHOR = 0
+HANDLE_IN = 1
+HANDLE_OUT = 2
+
+class SpatialHashGrid:
+    """Uniform grid that buckets keys by the cell containing their position.
+
+    The grid only stores keys; callers pass a `locate` function that maps a
+    key back to its current (x, y) so positions are never duplicated.
+    """
+
+    def __init__(self, cell_size=32.0):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._locations = {}
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, key):
+        return key in self._locations
+
+    def cell_of(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, key, x, y):
+        """Insert `key` at (x, y), moving it if it is already present."""
+        cell = self.cell_of(x, y)
+        old_cell = self._locations.get(key)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self._discard(key, old_cell)
+        self._cells.setdefault(cell, set()).add(key)
+        self._locations[key] = cell
+
+    def insert_many(self, keys, xs, ys):
+        """Insert or move many keys at once; cells are computed in bulk."""
+        cxs = np.floor(np.asarray(xs) / self.cell_size).astype(np.int64).tolist()
+        cys = np.floor(np.asarray(ys) / self.cell_size).astype(np.int64).tolist()
+        cells = self._cells
+        locations = self._locations
+        for key, cx, cy in zip(keys, cxs, cys):
+            cell = (cx, cy)
+            old_cell = locations.get(key)
+            if old_cell == cell:
+                continue
+            if old_cell is not None:
+                self._discard(key, old_cell)
+            bucket = cells.get(cell)
+            if bucket is None:
+                bucket = cells[cell] = set()
+            bucket.add(key)
+            locations[key] = cell
+
+    def remove(self, key):
+        cell = self._locations.pop(key, None)
+        if cell is not None:
+            self._discard(key, cell)
+
+    def _discard(self, key, cell):
+        bucket = self._cells[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._locations.clear()
+
+    def nearest(self, x, y, radius, locate, accept=None):
+        """Return (key, distance) of the closest key within `radius`, or None.
+
+        Cells are visited in rings of growing Chebyshev distance around the
+        query cell, stopping as soon as no unvisited ring can hold a closer
+        key. `accept(key, distance)` can veto candidates, e.g. to apply
+        per-key radii or skip keys being edited.
+        """
+        cx, cy = self.cell_of(x, y)
+        max_ring = int(math.ceil(radius / self.cell_size))
+        best_key = None
+        best_dist = radius
+
+        for ring in range(max_ring + 1):
+            # Every cell in this ring is at least (ring - 1) cells away
+            if best_key is not None and (ring - 1) * self.cell_size > best_dist:
+                break
+            for cell in self._ring_cells(cx, cy, ring):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                for key in bucket:
+                    px, py = locate(key)
+                    dist = math.hypot(px - x, py - y)
+                    if dist > best_dist:
+                        continue
+                    if accept is not None and not accept(key, dist):
+                        continue
+                    best_key, best_dist = key, dist
+
+        if best_key is None:
+            return None
+        return best_key, best_dist
+
+    def _ring_cells(self, cx, cy, ring):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
+
+class PointIndex:
+    """Document-wide spatial index over every anchor and handle.
+
+    Paths registered with `add_path` report their edits through
+    `Path.observers`, so only the touched points are re-bucketed.
+    """
+    INDEX_SHIFT = 2
+    SLOT_SHIFT = 34
+    # Above this many touched points, re-bucket with vectorized key and cell math
+    BULK_UPDATE_SIZE = 8
+
+    def __init__(self, cell_size=32.0):
+        self.grid = SpatialHashGrid(cell_size)
+        self._paths = []
+        self._slots = {}
+        self._counts = {}
+        self._pending = set()
+        self._suspended = set()
+        # Called with (pos, radius) before each query, e.g. to index deferred paths
+        self.before_query = None
+
+    def add_path(self, path, defer=False):
+        """Register `path`; with `defer` its points are bucketed on demand.
+
+        Deferred paths are indexed by `index_pending`, typically from the
+        `before_query` hook once a query comes near them.
+        """
+        slot = len(self._paths)
+        self._paths.append(path)
+        self._slots[path] = slot
+        self._counts[path] = 0
+        path.observers.append(self.update_path)
+        if defer:
+            self._pending.add(path)
+        else:
+            self.update_path(path, None)
+
+    def index_pending(self, paths):
+        for path in paths:
+            if path in self._pending:
+                self._pending.discard(path)
+                self.update_path(path, None)
+
+    def clear(self):
+        for path in self._paths:
+            if path is not None:
+                path.observers.remove(self.update_path)
+        self.grid.clear()
+        self._paths = []
+        self._slots = {}
+        self._counts = {}
+        self._pending = set()
+        self._suspended = set()
+        self.before_query = None
+
+    def suspend_path(self, path):
+        """Stop re-bucketing `path` on every edit, e.g. while it is dragged.
+
+        Its entries are left out of queries until `resume_path` re-buckets
+        the edited points once, so a large drag costs no index work per frame.
+        """
+        if path in self._slots:
+            self._suspended.add(path)
+
+    def resume_path(self, path, indices=None):
+        """Index the points of `path` edited while it was suspended."""
+        if path in self._suspended:
+            self._suspended.discard(path)
+            self.update_path(path, indices)
+
+    def remove_path(self, path):
+        slot = self._slots.pop(path, None)
+        if slot is None:
+            return
+        self._pending.discard(path)
+        self._suspended.discard(path)
+        for i in range(self._counts.pop(path)):
+            for kind in (ANCHOR, HANDLE_IN, HANDLE_OUT):
+                self.grid.remove(self._key(slot, i, kind))
+        self._paths[slot] = None
+        path.observers.remove(self.update_path)
+
+    def _key(self, slot, index, kind):
+        return (slot << self.SLOT_SHIFT) | (index << self.INDEX_SHIFT) | kind
+
+    def _decode(self, key):
+        slot = key >> self.SLOT_SHIFT
+        index = (key >> self.INDEX_SHIFT) & ((1 << (self.SLOT_SHIFT - self.INDEX_SHIFT)) - 1)
+        return self._paths[slot], index, key & 3
+
+    def update_path(self, path, indices):
+        """Re-bucket the given point indices of `path` (None means all)."""
+        if path in self._pending or path in self._suspended:
+            return
+        slot = self._slots[path]
+        storage = path.storage
+        count = storage.count
+        old_count = self._counts[path]
+
+        for i in range(count, old_count):
+            for kind in (ANCHOR, HANDLE_IN, HANDLE_OUT):
+                self.grid.remove(self._key(slot, i, kind))
+        self._counts[path] = count
+
+        if indices is None:
+            indices = range(count)
+        if len(indices) >= self.BULK_UPDATE_SIZE:
+            self._update_many(slot, storage, np.asarray(indices))
+            return
+        for i in indices:
+            if i >= count:
+                continue
+            x, y = storage.positions[i]
+            self.grid.insert(self._key(slot, i, ANCHOR), x, y)
+            for kind, handles, present in (
+                (HANDLE_IN, storage.handles_in, storage.has_in),
+                (HANDLE_OUT, storage.handles_out, storage.has_out),
+            ):
+                key = self._key(slot, i, kind)
+                if present[i]:
+                    x, y = handles[i]
+                    self.grid.insert(key, x, y)
+                else:
+                    self.grid.remove(key)
+
+    def _update_many(self, slot, storage, indices):
+        indices = indices[indices < storage.count]
+        base = (slot << self.SLOT_SHIFT) | (indices.astype(np.int64) << self.INDEX_SHIFT)
+        positions = storage.positions[indices]
+        self.grid.insert_many((base | ANCHOR).tolist(), positions[:, 0], positions[:, 1])
+
+        for kind, handles, present in (
+            (HANDLE_IN, storage.handles_in, storage.has_in),
+            (HANDLE_OUT, storage.handles_out, storage.has_out),
+        ):
+            mask = present[indices]
+            keys = base | kind
+            coords = handles[indices[mask]]
+            self.grid.insert_many(keys[mask].tolist(), coords[:, 0], coords[:, 1])
+            for key in keys[~mask].tolist():
+                if key in self.grid:
+                    self.grid.remove(key)
+
+    def _locate(self, key):
+        path, index, kind = self._decode(key)
+        storage = path.storage
+        if kind == ANCHOR:
+            return storage.positions[index]
+        if kind == HANDLE_IN:
+            return storage.handles_in[index]
+        return storage.handles_out[index]
+
+    def nearest(self, pos, radius, kinds=None, exclude=None):
+        """Return (path, index, kind, distance) of the closest entry, or None.
+
+        `kinds` restricts the search to ANCHOR/HANDLE_IN/HANDLE_OUT entries
+        and `exclude` is a (path, index) pair whose entries are skipped.
+        """
+        if self.before_query is not None:
+            self.before_query(pos, radius)
+        kinds = frozenset(kinds) if kinds is not None else None
+        excluded_slot = excluded_index = None
+        if exclude is not None and exclude[0] in self._slots:
+            excluded_slot = self._slots[exclude[0]]
+            excluded_index = exclude[1]
+        suspended_slots = {self._slots[path] for path in self._suspended}
+
+        def accept(key, dist):
+            if kinds is not None and (key & 3) not in kinds:
+                return False
+            if suspended_slots and key >> self.SLOT_SHIFT in suspended_slots:
+                return False
+            if excluded_slot is not None:
+                _, index, _ = self._decode(key)
+                if index == excluded_index and key >> self.SLOT_SHIFT == excluded_slot:
+                    return False
+            return True
+
+        use_filter = kinds is not None or excluded_slot is not None or bool(suspended_slots)
+        hit = self.grid.nearest(float(pos[0]), float(pos[1]), radius,
+                                self._locate, accept if use_filter else None)
+        if hit is None:
+            return None
+        key, dist = hit
+        path, index, kind = self._decode(key)
+        return path, index, kind, dist
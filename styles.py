@@ -6,6 +6,7 @@ class Colors:
     BACKGROUND = "#F0F0F0"
     ACTIVE = "#FF6B6B"
     GRID = "#CCCCCC"
+    GRID_MAJOR = "#B3B3B3"
 
 class StyleSheet:
     MAIN_WINDOW = """
@@ -0,0 +1,61 @@
+import gzip
+from utils import iter_svg_path_data
+
+SVG_HEADER = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">\n  '
+SVG_FOOTER = '\n</svg>'
+PREVIEW_BYTES = 64 * 1024
+
+class _PreviewFull(Exception):
+    pass
+
+class _PreviewWriter:
+    """Text sink that stops the export once `limit` characters arrived."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        remaining = self.limit - self.size
+        if len(text) > remaining:
+            self.chunks.append(text[:remaining])
+            self.size = self.limit
+            raise _PreviewFull()
+        self.chunks.append(text)
+        self.size += len(text)
+
+def write_svg(paths, stream, canvas_height=600):
+    """Stream an SVG document for `paths` into the text file-like `stream`.
+
+    The output is the same as `PathManager.export_svg`, but path data is
+    written a chunk of segments at a time instead of being built up in one
+    string.
+    """
+    stream.write(SVG_HEADER)
+    for path in paths:
+        stream.write('<path d="')
+        for chunk in iter_svg_path_data(path.get_bezier_points(), canvas_height):
+            stream.write(chunk)
+        stream.write(f'" stroke="{path.stroke_color}" stroke-width="{path.stroke_width}" fill="{path.fill}"/>')
+    stream.write(SVG_FOOTER)
+
+def export_svg_file(paths, filename, canvas_height=600, compress=None):
+    """Write an SVG file, gzip-compressed when `compress` is set.
+
+    By default compression is used for names ending in `.svgz`.
+    """
+    if compress is None:
+        compress = str(filename).lower().endswith(".svgz")
+    opener = gzip.open if compress else open
+    with opener(filename, "wt", encoding="utf-8", newline="") as stream:
+        write_svg(paths, stream, canvas_height)
+
+def svg_preview(paths, limit=PREVIEW_BYTES, canvas_height=600):
+    """Return (text, truncated) with at most `limit` characters of the SVG."""
+    writer = _PreviewWriter(limit)
+    try:
+        write_svg(paths, writer, canvas_height)
+    except _PreviewFull:
+        return "".join(writer.chunks), True
+    return "".join(writer.chunks), False
@@ -0,0 +1,260 @@
+import gzip
+import re
+import warnings
+import xml.etree.ElementTree as ET
+import numpy as np
+from path_manager import Path
+
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+COMMAND_SPLIT_RE = re.compile(r"([MmLlHhVvCcSsQqTtAaZz])")
+
+# Commands whose repeats can be parsed as one run of implicit repetitions
+MERGEABLE = frozenset("LlHhVvCcSsQqTtAa")
+
+def _starts_and_ends(current, relative_ends):
+    ends = np.cumsum(relative_ends, axis=0) + current
+    starts = np.vstack((current, ends[:-1]))
+    return starts, ends
+
+def _cubics(command, numbers, current, last_control, last_command):
+    """Convert one run of a drawing command to cubic segments.
+
+    Returns ((k, 3, 2) array of [control 1, control 2, end], last control
+    point for S/T reflection). Coordinates stay in SVG space.
+    """
+    kind = command.upper()
+    relative = command.islower()
+
+    if kind in "LHVA":
+        if kind == "L":
+            targets = numbers[:len(numbers) // 2 * 2].reshape(-1, 2)
+        elif kind == "A":
+            # Arcs are approximated by a straight line to their end point
+            targets = numbers[:len(numbers) // 7 * 7].reshape(-1, 7)[:, 5:7]
+        else:
+            axis = 0 if kind == "H" else 1
+            targets = np.empty((len(numbers), 2))
+            targets[:, axis] = numbers
+            targets[:, 1 - axis] = 0.0 if relative else current[1 - axis]
+        if not len(targets):
+            return np.empty((0, 3, 2)), last_control
+        if relative:
+            starts, ends = _starts_and_ends(current, targets)
+        else:
+            ends = targets
+            starts = np.vstack((current, ends[:-1]))
+        return np.stack((starts, ends, ends), axis=1), None
+
+    if kind == "C":
+        controls = numbers[:len(numbers) // 6 * 6].reshape(-1, 3, 2)
+        if relative:
+            starts, _ = _starts_and_ends(current, controls[:, 2])
+            controls = controls + starts[:, None, :]
+        return controls, controls[-1, 1] if len(controls) else last_control
+
+    if kind == "S":
+        pairs = numbers[:len(numbers) // 4 * 4].reshape(-1, 2, 2)
+        if relative:
+            starts, _ = _starts_and_ends(current, pairs[:, 1])
+            pairs = pairs + starts[:, None, :]
+        else:
+            starts = np.vstack((current, pairs[:-1, 1]))
+        previous = np.empty_like(starts)
+        previous[1:] = pairs[:-1, 0]
+        previous[0] = last_control if last_command in "CcSs" else current
+        first_controls = 2 * starts - previous
+        segments = np.stack((first_controls, pairs[:, 0], pairs[:, 1]), axis=1)
+        return segments, pairs[-1, 0] if len(pairs) else last_control
+
+    if kind == "Q":
+        pairs = numbers[:len(numbers) // 4 * 4].reshape(-1, 2, 2)
+        if relative:
+            starts, _ = _starts_and_ends(current, pairs[:, 1])
+            pairs = pairs + starts[:, None, :]
+        else:
+            starts = np.vstack((current, pairs[:-1, 1]))
+        return _quadratic_to_cubic(starts, pairs[:, 0], pairs[:, 1]), \
+            pairs[-1, 0] if len(pairs) else last_control
+
+    # T: every control point reflects the previous one, so walk in order
+    targets = numbers[:len(numbers) // 2 * 2].reshape(-1, 2)
+    control = last_control if last_command in "QqTt" else current
+    start = current
+    starts, quads, ends = [], [], []
+    for target in targets:
+        end = start + target if relative else target
+        control = 2 * start - control
+        starts.append(start)
+        quads.append(control)
+        ends.append(end)
+        start = end
+    if not ends:
+        return np.empty((0, 3, 2)), last_control
+    return _quadratic_to_cubic(np.array(starts), np.array(quads), np.array(ends)), control
+
+def _quadratic_to_cubic(starts, controls, ends):
+    return np.stack((
+        starts + 2.0 / 3.0 * (controls - starts),
+        ends + 2.0 / 3.0 * (controls - ends),
+        ends,
+    ), axis=1)
+
+def _parse_numbers(text):
+    """Parse all numbers in `text` into a float array.
+
+    Plain whitespace/comma separated lists, which is what exporters write,
+    are parsed in one NumPy call; compact forms such as "10-5" or "1.5.5"
+    fall back to a regular expression.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            return np.fromstring(text.replace(",", " "), sep=" ")
+    except (ValueError, DeprecationWarning):
+        return np.array(NUMBER_RE.findall(text), dtype=float)
+
+def _tokenize(d):
+    """Yield (command, numbers) with repeated commands merged into runs."""
+    parts = COMMAND_SPLIT_RE.split(d)
+    command, run = None, []
+    for i in range(1, len(parts), 2):
+        letter, arguments = parts[i], parts[i + 1]
+        if letter == command and letter in MERGEABLE:
+            run.append(arguments)
+            continue
+        if command is not None:
+            yield command, run
+        command, run = letter, [arguments]
+    if command is not None:
+        yield command, run
+
+def parse_path_data(d):
+    """Parse an SVG `d` attribute into subpaths.
+
+    Returns a list of (start point, (k, 3, 2) cubic segments, is_closed) in
+    SVG coordinates. M/L/H/V/C/S/Q/T/Z are supported in absolute and
+    relative form; arcs become straight lines to their end point.
+    """
+    subpaths = []
+    current = np.zeros(2)
+    start = current
+    segments = []
+    closed = False
+    last_control = current
+    last_command = ""
+
+    def finish():
+        if segments:
+            subpaths.append((start, np.concatenate(segments), closed))
+
+    for command, run in _tokenize(d):
+        numbers = _parse_numbers(" ".join(run))
+
+        if command in "Mm":
+            finish()
+            segments, closed = [], False
+            pairs = numbers[:len(numbers) // 2 * 2].reshape(-1, 2)
+            if not len(pairs):
+                continue
+            start = current + pairs[0] if command == "m" else pairs[0]
+            current = start
+            # Extra pairs after a move are implicit line commands
+            if len(pairs) > 1:
+                line, _ = _cubics("l" if command == "m" else "L", pairs[1:].ravel(),
+                                  current, last_control, last_command)
+                segments.append(line)
+                current = line[-1, 2]
+            last_command = "L"
+            continue
+
+        if command in "Zz":
+            closed = True
+            current = start
+            last_command = command
+            continue
+
+        new_segments, last_control = _cubics(command, numbers, current, last_control, last_command)
+        if len(new_segments):
+            segments.append(new_segments)
+            current = new_segments[-1, 2]
+        last_command = command
+
+    finish()
+    return subpaths
+
+def _parse_style(element):
+    style = {
+        "stroke": element.get("stroke"),
+        "stroke-width": element.get("stroke-width"),
+        "fill": element.get("fill"),
+    }
+    for declaration in (element.get("style") or "").split(";"):
+        name, _, value = declaration.partition(":")
+        if name.strip() in style and value.strip():
+            style[name.strip()] = value.strip()
+    return style
+
+def build_path(start, segments, closed, canvas_height=600, style=None):
+    """Create a `Path` from SVG-space cubic segments, undoing the y-flip."""
+    count = len(segments)
+    positions = np.empty((count + 1, 2))
+    positions[0] = start
+    positions[1:] = segments[:, 2]
+
+    handles_out = np.zeros((count + 1, 2))
+    handles_out[:count] = segments[:, 0]
+    handles_in = np.zeros((count + 1, 2))
+    handles_in[1:] = segments[:, 1]
+    has_out = np.arange(count + 1) < count
+    has_in = np.arange(count + 1) > 0
+
+    for block in (positions, handles_in, handles_out):
+        block[:, 1] = canvas_height - block[:, 1]
+
+    path = Path()
+    path.extend_points(positions, handles_in, handles_out, has_in, has_out)
+    if closed:
+        path.close_path()
+
+    style = style or {}
+    # Paths always get a pen, so an unstroked path keeps the default stroke
+    if style.get("stroke") and style["stroke"] != "none":
+        path.stroke_color = style["stroke"]
+    if style.get("fill"):
+        path.fill = style["fill"]
+    # Keywords such as "inherit" leave the default width
+    width = NUMBER_RE.search(style.get("stroke-width") or "")
+    if width is not None:
+        width = float(width.group())
+        path.stroke_width = int(width) if width.is_integer() else width
+    return path
+
+def iter_svg_paths(source, canvas_height=600):
+    """Yield a `Path` per subpath of every <path> element in `source`.
+
+    `source` is a filename or binary file object; `.svgz` files are
+    decompressed. Elements are parsed as they stream in and discarded
+    afterwards, so memory does not grow with the document. Transforms are
+    not applied.
+    """
+    if isinstance(source, str) and source.lower().endswith(".svgz"):
+        source = gzip.open(source, "rb")
+
+    for _, element in ET.iterparse(source, events=("end",)):
+        tag = element.tag.rpartition("}")[2]
+        if tag == "path":
+            d = element.get("d")
+            if d:
+                style = _parse_style(element)
+                for start, segments, closed in parse_path_data(d):
+                    yield build_path(start, segments, closed, canvas_height, style)
+        if tag != "svg":
+            element.clear()
+
+def import_svg(source, path_manager, canvas_height=600):
+    """Add every path in `source` to `path_manager` and return them."""
+    paths = []
+    for path in iter_svg_paths(source, canvas_height):
+        path_manager.add_path(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from curve_fitting import rdp_mask, fit_cubic_segments, StrokeFitter
+from path_manager import Path
+
+def sample_curves(segments, count=2000):
+    """Dense points along (m, 4, 2) cubic segments."""
+    t = np.linspace(0, 1, count)[:, None]
+    u = 1 - t
+    return np.concatenate([u ** 3 * p0 + 3 * u * u * t * p1 + 3 * u * t * t * p2 + t ** 3 * p3
+                           for p0, p1, p2, p3 in segments])
+
+def distances_to(points, curve):
+    return np.array([np.hypot(*(curve - point).T).min() for point in points])
+
+def cross(a, b):
+    return a[0] * b[1] - a[1] * b[0]
+
+def wavy_stroke(count, seed=0):
+    """Noisy samples along a sine wave, as a hand-drawn stroke would arrive."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 600, count)
+    points = np.stack((x, 80 * np.sin(x / 60)), axis=1)
+    return points + rng.normal(scale=0.3, size=points.shape)
+
+def test_rdp_keeps_ends_and_dropped_points_are_within_tolerance():
+    points = wavy_stroke(400)
+    tolerance = 1.5
+    keep = rdp_mask(points, tolerance)
+    assert keep[0] and keep[-1]
+    assert keep.sum() < len(points) / 4
+    kept = np.flatnonzero(keep)
+    for start, end in zip(kept[:-1], kept[1:]):
+        chord = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        distances = np.abs(offsets[:, 0] * chord[1] - offsets[:, 1] * chord[0]) / np.hypot(*chord)
+        assert (distances <= tolerance).all()
+
+@pytest.mark.parametrize("tolerance", [0.5, 2.0, 8.0])
+def test_fitted_curve_stays_within_tolerance(tolerance):
+    points = wavy_stroke(300)
+    segments = fit_cubic_segments(points, tolerance)
+
+    controls = np.array([bezier for bezier, _ in segments])
+    ends = [end for _, end in segments]
+    # A connected chain from the first to the last point
+    assert np.array_equal(controls[0, 0], points[0])
+    assert np.array_equal(controls[1:, 0], controls[:-1, 3])
+    assert ends == sorted(ends) and ends[-1] == len(points) - 1
+    assert np.array_equal(controls[:, 3], points[ends])
+    # Sampling slack: neighbouring curve samples are well under 0.1 apart
+    assert distances_to(points, sample_curves(controls)).max() <= tolerance + 0.1
+
+def test_fit_keeps_given_end_tangents():
+    points = wavy_stroke(100)
+    left = np.array([0.0, 1.0])
+    right = np.array([-1.0, 0.0])
+    segments = fit_cubic_segments(points, 1.0, left, right)
+    first, last = segments[0][0], segments[-1][0]
+    assert np.isclose(cross(first[1] - first[0], left), 0)
+    assert np.dot(first[1] - first[0], left) > 0
+    assert np.isclose(cross(last[2] - last[3], right), 0)
+    assert np.dot(last[2] - last[3], right) > 0
+
+def test_stroke_fitter_follows_the_samples():
+    samples = wavy_stroke(1500)
+    path = Path()
+    fitter = StrokeFitter(path, tolerance=2.0)
+    fitter.begin(samples[0])
+    for sample in samples[1:]:
+        fitter.add_sample(sample)
+    stats = fitter.finish()
+
+    assert stats.samples == len(samples)
+    assert stats.anchors == len(path.points) < len(samples) / 10
+    assert np.array_equal(path.points[0].position, samples[0])
+    assert np.array_equal(path.points[-1].position, samples[-1])
+    # Decimation and fitting each may use up the tolerance
+    assert distances_to(samples, sample_curves(path.segments())).max() <= 2 * 2.0
@@ -0,0 +1,122 @@
+import os
+import numpy as np
+import pytest
+import document_format
+from document_format import DocumentReader, DocumentError, save_document
+from path_manager import PathManager, Path
+from tools import ToolState
+
+def build_document():
+    path_manager = PathManager()
+    first = Path()
+    first.add_point((0.0, 0.0), handle_out=(5.0, -5.0))
+    first.add_point((20.0, 10.0), handle_in=(15.0, 15.0), handle_out=(25.0, 5.0))
+    first.add_point((40.5, 0.25), handle_in=(35.0, 0.0))
+    first.set_smooth(1, True)
+    path_manager.add_path(first)
+    second = Path()
+    second.add_point((100.0, 100.0))
+    second.add_point((150.0, 120.0), handle_in=(140.0, 130.0))
+    second.add_point((120.0, 160.0))
+    second.close_path()
+    second.stroke_width = 2.5
+    second.stroke_color = "#FF6B6B"
+    path_manager.add_path(second)
+    tool_state = ToolState()
+    tool_state.add_snap_point((10.0, 20.0), 15)
+    return path_manager, tool_state
+
+def assert_same_paths(expected, actual):
+    assert len(actual) == len(expected)
+    for old, new in zip(expected, actual):
+        n = old.storage.count
+        assert new.storage.count == n
+        for column in ("positions", "handles_in", "handles_out", "has_in", "has_out", "smooth"):
+            assert np.array_equal(getattr(new.storage, column)[:n], getattr(old.storage, column)[:n])
+        assert (new.is_closed, new.stroke_width, new.stroke_color, new.fill) == \
+            (old.is_closed, old.stroke_width, old.stroke_color, old.fill)
+
+def test_round_trip(tmp_path):
+    path_manager, tool_state = build_document()
+    filename = str(tmp_path / "drawing.vcd")
+    save_document(filename, path_manager, tool_state.snap_points)
+
+    reader = DocumentReader(filename)
+    loaded = PathManager()
+    loaded.load_document(reader)
+    assert_same_paths(path_manager.paths, list(loaded.paths))
+    assert reader.snap_points.tolist() == [[10.0, 20.0, 15.0]]
+    assert np.allclose(reader.bounds, path_manager.bounds_table())
+
+def test_resave_copies_unloaded_paths(tmp_path):
+    path_manager, tool_state = build_document()
+    first = str(tmp_path / "first.vcd")
+    save_document(first, path_manager, tool_state.snap_points)
+
+    loaded = PathManager()
+    loaded.load_document(DocumentReader(first))
+    # Only the second path is loaded; the first is copied as raw bytes
+    loaded.paths[1].set_position(0, (101.0, 99.0))
+    path_manager.paths[1].set_position(0, (101.0, 99.0))
+    second = str(tmp_path / "second.vcd")
+    save_document(second, loaded)
+
+    reloaded = PathManager()
+    reloaded.load_document(DocumentReader(second))
+    assert_same_paths(path_manager.paths, list(reloaded.paths))
+
+def test_styles_round_trip(tmp_path):
+    path_manager, tool_state = build_document()
+    path_manager.paths[0].stroke_color = "café"
+    path_manager.paths[0].fill = "url(#linearGradient-with-a-name-longer-than-32-bytes)"
+    first = str(tmp_path / "first.vcd")
+    save_document(first, path_manager, tool_state.snap_points)
+
+    # Resaving renumbers the styles of paths copied without loading them
+    loaded = PathManager()
+    loaded.load_document(DocumentReader(first))
+    loaded.paths[1].stroke_color = "#00FF00"
+    path_manager.paths[1].stroke_color = "#00FF00"
+    second = str(tmp_path / "second.vcd")
+    save_document(second, loaded)
+
+    reloaded = PathManager()
+    reloaded.load_document(DocumentReader(second))
+    assert_same_paths(path_manager.paths, list(reloaded.paths))
+
+def test_unencodable_style_raises(tmp_path):
+    path_manager, tool_state = build_document()
+    path_manager.paths[0].stroke_color = "\udc80"
+    with pytest.raises(DocumentError):
+        save_document(str(tmp_path / "drawing.vcd"), path_manager)
+    assert os.listdir(tmp_path) == []
+
+def test_failed_save_keeps_the_old_file(tmp_path, monkeypatch):
+    path_manager, tool_state = build_document()
+    filename = tmp_path / "drawing.vcd"
+    save_document(str(filename), path_manager, tool_state.snap_points)
+    data = filename.read_bytes()
+
+    def fail(stream, storage):
+        raise OSError("disk full")
+    monkeypatch.setattr(document_format, "_write_block", fail)
+    with pytest.raises(OSError):
+        save_document(str(filename), path_manager, tool_state.snap_points)
+    assert os.listdir(tmp_path) == ["drawing.vcd"]
+    assert filename.read_bytes() == data
+
+@pytest.mark.parametrize("fraction", [0.0, 0.05, 0.5, 0.99])
+def test_short_file_raises(tmp_path, fraction):
+    path_manager, tool_state = build_document()
+    filename = tmp_path / "drawing.vcd"
+    save_document(str(filename), path_manager, tool_state.snap_points)
+    data = filename.read_bytes()
+    filename.write_bytes(data[:int(len(data) * fraction)])
+    with pytest.raises(DocumentError):
+        DocumentReader(str(filename))
+
+def test_not_a_document(tmp_path):
+    filename = tmp_path / "drawing.vcd"
+    filename.write_bytes(b"<svg>" + bytes(100))
+    with pytest.raises(DocumentError):
+        DocumentReader(str(filename))
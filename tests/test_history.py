@@ -0,0 +1,64 @@
+import numpy as np
+from history import History
+from path_manager import PathManager, Path
+
+def snapshot(path_manager):
+    return [(path.storage.rows(np.arange(path.storage.count)).tobytes(), path.is_closed)
+            for path in path_manager.paths]
+
+def record_three_steps():
+    path_manager = PathManager()
+    history = History(path_manager)
+    states = [snapshot(path_manager)]
+
+    history.begin()
+    path = Path()
+    path_manager.add_path(path)
+    path.add_point((0.0, 0.0))
+    path.add_point((10.0, 5.0), handle_in=(8.0, 8.0))
+    history.commit()
+    states.append(snapshot(path_manager))
+
+    history.begin()
+    path.set_position(0, (3.0, -2.0))
+    path.set_handle_in(1, (7.0, 9.0))
+    history.commit()
+    states.append(snapshot(path_manager))
+
+    history.begin()
+    path.add_point((20.0, 0.0))
+    path.close_path()
+    history.commit()
+    states.append(snapshot(path_manager))
+    return path_manager, history, states
+
+def test_undo_redo_three_steps():
+    path_manager, history, states = record_three_steps()
+    for expected in reversed(states[:-1]):
+        assert history.undo() == 1
+        assert snapshot(path_manager) == expected
+    assert not history.can_undo
+    for expected in states[1:]:
+        assert history.redo() == 1
+        assert snapshot(path_manager) == expected
+    assert not history.can_redo
+
+def test_undo_redo_many_steps_at_once():
+    path_manager, history, states = record_three_steps()
+    assert history.undo(3) == 3
+    assert snapshot(path_manager) == states[0]
+    assert history.redo(3) == 3
+    assert snapshot(path_manager) == states[-1]
+
+def test_new_edit_discards_redo():
+    path_manager, history, states = record_three_steps()
+    history.undo()
+    history.begin()
+    path_manager.paths[0].set_position(1, (50.0, 50.0))
+    # Reading can_redo leaves the open transaction alone
+    assert not history.can_redo
+    assert history._recordings is not None
+    history.commit()
+    assert not history.can_redo
+    history.undo()
+    assert snapshot(path_manager) == states[2]
@@ -0,0 +1,7 @@
+from benchmarks.import_budget import CORE_MODULES, measure
+
+def test_core_imports_without_qt():
+    # The time budget depends on the machine, so only the benchmark checks it
+    rows = measure(CORE_MODULES)
+    qt = [name for name, _, _, _ in rows if name.split(".")[0] == "PyQt6"]
+    assert qt == []
@@ -0,0 +1,193 @@
+import os
+import struct
+import time
+import numpy as np
+import pytest
+from document_format import DocumentReader, save_document
+from journal import (Journal, JournalError, claim_directory, release_directory,
+                     find_journal, replay_journal, _record,
+                     PATH_POINTS, POINTS_FORMAT, ALL_POINTS)
+from path_manager import PathManager, Path
+from tools import ToolState
+
+def state(path_manager, tool_state):
+    paths = [(path.storage.rows(np.arange(path.storage.count)).tobytes(), path.is_closed,
+              path.stroke_color, path.stroke_width) for path in path_manager.paths]
+    snaps = [(tuple(point.position), point.radius) for point in tool_state.snap_points]
+    return paths, snaps
+
+def edit(path_manager, tool_state, flush):
+    """Make a few kinds of edits, flushing in between like the autosave timer."""
+    path = Path()
+    path.stroke_color = "#FF0000"
+    path.stroke_width = 3.5
+    path_manager.add_path(path)
+    for i in range(10):
+        path.add_point((i * 10.0, i * 5.0), handle_in=(i * 10.0 - 2, 0.0))
+    flush()
+    indices = np.arange(0, 10, 3)
+    for _ in range(5):
+        storage = path.storage
+        path.set_points(indices, storage.positions[indices] + 1,
+                        storage.handles_in[indices] + 1, storage.handles_out[indices] + 1)
+    path.set_smooth(1, True)
+    tool_state.add_snap_point((10.0, 20.0), 15)
+    flush()
+    extra = Path()
+    path_manager.add_path(extra)
+    extra.add_point((1.0, 1.0))
+    path_manager.pop_path()
+    path.close_path()
+    flush()
+    tool_state.add_snap_point((1.0, 2.0), 3)
+
+def record_session(directory, base=None, wait=False):
+    path_manager, tool_state = PathManager(), ToolState()
+    if base is not None:
+        reader = DocumentReader(base)
+        path_manager.load_document(reader)
+        for x, y, radius in reader.snap_points:
+            tool_state.add_snap_point((x, y), radius)
+    journal = Journal(directory, path_manager, tool_state)
+    journal.start(base)
+
+    def flush():
+        syncs = journal.syncs
+        journal.flush()
+        # Let the writer finish each batch, so it checks for compaction
+        deadline = time.monotonic() + 5
+        while wait and journal.syncs == syncs and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    edit(path_manager, tool_state, flush)
+    journal.close()
+    assert journal.error is None
+    return state(path_manager, tool_state)
+
+def replay(directory):
+    path_manager, tool_state = PathManager(), ToolState()
+    end = replay_journal(find_journal(directory), path_manager, tool_state)
+    return state(path_manager, tool_state), end
+
+def saved_base(tmp_path):
+    path_manager = PathManager()
+    path = Path()
+    path.extend_points(np.array([[0.0, 0.0], [50.0, 50.0], [100.0, 0.0]]))
+    path_manager.add_path(path)
+    filename = str(tmp_path / "base.vcd")
+    save_document(filename, path_manager)
+    return filename
+
+def test_round_trip(tmp_path):
+    directory = str(tmp_path / "autosave")
+    expected = record_session(directory)
+    assert replay(directory)[0] == expected
+
+def test_round_trip_on_base_document(tmp_path):
+    directory = str(tmp_path / "autosave")
+    expected = record_session(directory, saved_base(tmp_path))
+    assert len(expected[0]) == 2
+    assert replay(directory)[0] == expected
+
+def test_round_trip_through_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(Journal, "COMPACT_BYTES", 200)
+    directory = str(tmp_path / "autosave")
+    expected = record_session(directory, wait=True)
+    assert any(name.startswith("snapshot-") for name in os.listdir(directory))
+    assert replay(directory)[0] == expected
+
+def test_torn_tail_keeps_earlier_records(tmp_path):
+    directory = str(tmp_path / "autosave")
+    expected = record_session(directory)
+    _, end = replay(directory)
+    filename = find_journal(directory)
+    # The last record is the second snap point; cut it in half
+    os.truncate(filename, os.path.getsize(filename) - 10)
+    (paths, snaps), torn_end = replay(directory)
+    assert torn_end < end
+    assert paths == expected[0]
+    assert snaps == expected[1][:-1]
+
+def test_bad_crc_ends_replay(tmp_path):
+    directory = str(tmp_path / "autosave")
+    expected = record_session(directory)
+    filename = find_journal(directory)
+    with open(filename, "r+b") as stream:
+        stream.seek(-1, os.SEEK_END)
+        last = stream.read(1)
+        stream.seek(-1, os.SEEK_END)
+        stream.write(bytes((last[0] ^ 0xFF,)))
+    (paths, snaps), _ = replay(directory)
+    assert paths == expected[0]
+    assert snaps == expected[1][:-1]
+
+@pytest.mark.parametrize("change", ["size", "mtime"])
+def test_changed_base_is_rejected(tmp_path, change):
+    directory = str(tmp_path / "autosave")
+    base = saved_base(tmp_path)
+    record_session(directory, base)
+    if change == "size":
+        with open(base, "ab") as stream:
+            stream.write(bytes(8))
+    else:
+        status = os.stat(base)
+        os.utime(base, ns=(status.st_atime_ns, status.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(JournalError):
+        replay(directory)
+
+def test_record_for_missing_path_is_rejected(tmp_path):
+    directory = str(tmp_path / "autosave")
+    record_session(directory)
+    # A well-formed record for a row the document does not have
+    body = struct.pack(POINTS_FORMAT, 7, 1, ALL_POINTS, 1) + bytes(51)
+    with open(find_journal(directory), "ab") as stream:
+        stream.write(_record(PATH_POINTS, body))
+    with pytest.raises(JournalError):
+        replay(directory)
+
+def test_running_instance_keeps_its_journal(tmp_path):
+    root = str(tmp_path / "autosave")
+    first, first_lock = claim_directory(root)
+    expected = record_session(first)
+    # A second instance starts and exits cleanly while the first still runs
+    second, second_lock = claim_directory(root)
+    assert second != first
+    journal = Journal(second, PathManager(), ToolState())
+    journal.start()
+    journal.close(discard=True)
+    release_directory(second, second_lock)
+    assert not os.path.exists(second)
+    assert replay(first)[0] == expected
+    first_lock.close()
+
+def test_journal_of_exited_instance_is_claimed(tmp_path):
+    root = str(tmp_path / "autosave")
+    directory, lock = claim_directory(root)
+    expected = record_session(directory)
+    # The OS drops the lock when the process dies
+    lock.close()
+    claimed, claimed_lock = claim_directory(root)
+    assert claimed == directory
+    assert replay(claimed)[0] == expected
+    claimed_lock.close()
+
+def test_exited_instance_without_edits_is_removed(tmp_path):
+    root = str(tmp_path / "autosave")
+    directory, lock = claim_directory(root)
+    journal = Journal(directory, PathManager(), ToolState())
+    journal.start()
+    journal.close()
+    lock.close()
+    claimed, claimed_lock = claim_directory(root)
+    assert claimed != directory
+    assert not os.path.exists(directory)
+    claimed_lock.close()
+
+def test_journal_only_removes_its_own_files(tmp_path):
+    directory = str(tmp_path / "autosave")
+    record_session(directory)
+    journal = Journal(directory, PathManager(), ToolState())
+    os.rename(find_journal(directory), os.path.join(directory, "journal-999999.log"))
+    journal.start()
+    journal.close(discard=True)
+    assert os.listdir(directory) == ["journal-999999.log"]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from path_manager import PathManager, Path
+from utils import evaluate_bezier
+
+def curvy_path(count=5, seed=0):
+    rng = np.random.default_rng(seed)
+    path = Path()
+    positions = np.stack((np.arange(count) * 100.0, rng.uniform(-50, 50, count)), axis=1)
+    path.extend_points(positions, positions - (30, 20), positions + (30, 20),
+                       has_in=np.arange(count) > 0, has_out=np.arange(count) < count - 1)
+    return path
+
+def trace(path, count=2001):
+    return evaluate_bezier(path.segments(), np.linspace(0, 1, count)).reshape(-1, 2)
+
+def distances_to(points, curve):
+    return np.array([np.hypot(*(curve - point).T).min() for point in points])
+
+@pytest.mark.parametrize("segment, t", [(0, 0.5), (2, 0.25), (3, 0.9)])
+def test_split_segment_keeps_the_curve(segment, t):
+    path = curvy_path()
+    before = trace(path)
+    changes = []
+    path.observers.append(lambda path, indices: changes.append(list(indices)))
+
+    index = path.split_segment(segment, t)
+
+    assert index == segment + 1
+    assert len(path.points) == 6
+    assert path.segments_follow_points()
+    assert len(path.segments()) == 5
+    expected = evaluate_bezier(curvy_path().segments()[segment:segment + 1], [t])[0, 0]
+    np.testing.assert_allclose(path.points[index].position, expected)
+    # Both traces lie on each other
+    assert distances_to(trace(path), before).max() < 0.1
+    assert distances_to(before, trace(path)).max() < 0.1
+    assert changes == [list(range(segment, 6))]
+
+def test_find_closest_segment():
+    path_manager = PathManager()
+    path = curvy_path()
+    path_manager.add_path(path)
+    segment, t = 2, 0.4
+    on_curve = evaluate_bezier(path.segments()[segment:segment + 1], [t])[0, 0]
+
+    found, index, found_t, distance = path_manager.find_closest_segment(on_curve, 5)
+    assert found is path and index == segment
+    assert found_t == pytest.approx(t, abs=1e-6)
+    assert distance == pytest.approx(0, abs=1e-6)
+    assert path_manager.find_closest_segment(on_curve + (0, 500), 5) is None
+
+def test_point_values_are_read_only():
+    path = curvy_path()
+    changes = []
+    path.observers.append(lambda path, indices: changes.append(list(indices)))
+    point = path.points[1]
+    for value in (point.position, point.handle_in, point.handle_out):
+        with pytest.raises(ValueError):
+            value += 1
+        with pytest.raises(ValueError):
+            value[0] = 0
+    assert changes == []
+    # The storage itself stays writable for the path's own setters
+    point.position = point.position + (1, 2)
+    assert changes == [[1]]
+    assert path.storage.positions.flags.writeable
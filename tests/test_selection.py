@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from history import History
+from path_manager import PathManager, Path
+from selection import Selection, SelectionTransform, translation, scaling, rotation
+
+def storage_bytes(path_manager):
+    return [(path.storage.rows(np.arange(path.storage.count)).tobytes(), path.is_closed)
+            for path in path_manager.paths]
+
+def two_paths():
+    """Two paths with awkward coordinates, some points lacking handles."""
+    path_manager = PathManager()
+    rng = np.random.default_rng(0)
+    for count in (6, 4):
+        path = Path()
+        positions = rng.uniform(-100, 100, (count, 2)) / 3
+        path.extend_points(positions, positions - rng.random((count, 2)) / 7,
+                           positions + rng.random((count, 2)) / 7,
+                           has_in=np.arange(count) % 3 != 0, has_out=np.arange(count) % 2 == 0)
+        path_manager.add_path(path)
+    return path_manager
+
+def apply_all(matrix, points):
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+@pytest.mark.parametrize("matrix", [translation(0.1, -7.3), scaling(1.7, 0.3, (5.5, -2.25)),
+                                    rotation(0.7, (1 / 3, 2 / 3))],
+                         ids=["move", "scale", "rotate"])
+def test_transform_moves_selected_points_with_their_handles(matrix):
+    path_manager = two_paths()
+    first, second = path_manager.paths
+    before = [path.storage.rows(np.arange(path.storage.count)).copy() for path in (first, second)]
+    selection = Selection()
+    selection.add(first, [1, 2, 4])
+    selection.select_path(second)
+
+    SelectionTransform(selection).apply(matrix)
+
+    for path, old, indices in ((first, before[0], [1, 2, 4]), (second, before[1], np.arange(4))):
+        storage = path.storage
+        new = storage.rows(np.arange(storage.count))
+        assert np.array_equal(new["has_in"], old["has_in"])
+        assert np.array_equal(new["has_out"], old["has_out"])
+        np.testing.assert_allclose(storage.positions[indices], apply_all(matrix, old["position"][indices]))
+        for column, key, flag in (("handles_in", "handle_in", "has_in"),
+                                  ("handles_out", "handle_out", "has_out")):
+            has = old[flag][indices]
+            np.testing.assert_allclose(getattr(storage, column)[indices][has],
+                                       apply_all(matrix, old[key][indices][has]))
+    # Points outside the selection are untouched
+    untouched = np.array([0, 3, 5])
+    assert first.storage.rows(untouched).tobytes() == before[0][untouched].tobytes()
+
+def test_each_apply_starts_from_the_drag_start():
+    path_manager = two_paths()
+    selection = Selection()
+    selection.select_path(path_manager.paths[0])
+    transform = SelectionTransform(selection)
+    for angle in np.linspace(0, 2, 50):
+        transform.apply(rotation(angle, (3.0, 4.0)))
+    once = two_paths()
+    other = Selection()
+    other.select_path(once.paths[0])
+    SelectionTransform(other).apply(rotation(2.0, (3.0, 4.0)))
+    assert storage_bytes(path_manager) == storage_bytes(once)
+
+def test_undo_restores_the_exact_storage():
+    path_manager = two_paths()
+    history = History(path_manager)
+    first, second = path_manager.paths
+    start = storage_bytes(path_manager)
+    bounds = [path.bounds() for path in path_manager.paths]
+
+    selection = Selection()
+    selection.add(first, [0, 3, 5])
+    selection.select_path(second)
+    history.begin()
+    transform = SelectionTransform(selection)
+    # A drag applies many matrices before it is committed
+    for step in range(1, 20):
+        transform.apply(translation(step / 3, -step / 7) @ rotation(step / 11, (0.1, 0.2)))
+    transform.apply(scaling(1 / 3, 3.7, (1.1, -0.9)))
+    history.commit()
+    moved = storage_bytes(path_manager)
+    assert moved != start
+
+    assert history.undo() == 1
+    assert storage_bytes(path_manager) == start
+    assert [path.bounds() for path in path_manager.paths] == bounds
+    assert history.redo() == 1
+    assert storage_bytes(path_manager) == moved
+    assert history.undo() == 1
+    assert storage_bytes(path_manager) == start
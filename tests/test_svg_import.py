@@ -0,0 +1,122 @@
+import io
+import numpy as np
+import pytest
+from path_manager import Path
+from svg_export import write_svg
+from svg_import import iter_svg_paths, parse_path_data
+
+def import_paths(attributes):
+    source = f'<svg xmlns="http://www.w3.org/2000/svg"><path d="M0 0L10 0" {attributes}/></svg>'
+    return list(iter_svg_paths(io.BytesIO(source.encode("utf-8"))))
+
+@pytest.mark.parametrize("attributes, width", [
+    ('stroke-width="3"', 3),
+    ('stroke-width=" 2"', 2),
+    ('stroke-width="1.5px"', 1.5),
+    ('style="stroke-width: 4"', 4),
+    ('stroke-width="inherit"', 2),
+    ('stroke-width=""', 2),
+])
+def test_stroke_width(attributes, width):
+    path, = import_paths(attributes)
+    assert path.stroke_width == width
+
+def test_unstroked_path_keeps_the_default_stroke():
+    path, = import_paths('stroke="none" fill="#FF0000"')
+    assert path.stroke_color == "#000000"
+    assert path.fill == "#FF0000"
+
+def line(start, end):
+    return [start, end, end]
+
+def assert_subpaths(d, expected):
+    subpaths = parse_path_data(d)
+    assert len(subpaths) == len(expected)
+    for (start, segments, closed), (expected_start, expected_segments, expected_closed) \
+            in zip(subpaths, expected):
+        np.testing.assert_allclose(start, expected_start)
+        np.testing.assert_allclose(segments, np.array(expected_segments, dtype=float).reshape(-1, 3, 2))
+        assert closed == expected_closed
+
+# Each command in absolute and relative form, with repeated argument groups
+@pytest.mark.parametrize("absolute, relative, segments", [
+    ("M10 20 L30 40 50 20", "m10 20 l20 20 20 -20",
+     [line((10, 20), (30, 40)), line((30, 40), (50, 20))]),
+    ("M10 20 H30 5", "m10 20 h20 -25",
+     [line((10, 20), (30, 20)), line((30, 20), (5, 20))]),
+    ("M10 20 V30 5", "m10 20 v10 -25",
+     [line((10, 20), (10, 30)), line((10, 30), (10, 5))]),
+    ("M10 20 C10 0 30 0 30 20 30 40 50 40 50 20", "m10 20 c0-20 20-20 20 0 0 20 20 20 20 0",
+     [[(10, 0), (30, 0), (30, 20)], [(30, 40), (50, 40), (50, 20)]]),
+    ("M10 20 C10 0 30 0 30 20 S50 40 50 20 70 0 70 20",
+     "m10 20 c0-20 20-20 20 0 s20 20 20 0 20 -20 20 0",
+     [[(10, 0), (30, 0), (30, 20)], [(30, 40), (50, 40), (50, 20)],
+      [(50, 0), (70, 0), (70, 20)]]),
+    ("M0 0 S30 30 60 0", "m0 0 s30 30 60 0",
+     [[(0, 0), (30, 30), (60, 0)]]),
+    ("M0 0 Q30 30 60 0", "m0 0 q30 30 60 0",
+     [[(20, 20), (40, 20), (60, 0)]]),
+    ("M0 0 Q30 30 60 0 T120 0 180 0", "m0 0 q30 30 60 0 t60 0 60 0",
+     [[(20, 20), (40, 20), (60, 0)], [(80, -20), (100, -20), (120, 0)],
+      [(140, 20), (160, 20), (180, 0)]]),
+    ("M0 0 A5 5 0 0 1 10 0", "m0 0 a5 5 0 0 1 10 0",
+     [line((0, 0), (10, 0))]),
+])
+def test_commands(absolute, relative, segments):
+    start = (0, 0) if absolute.startswith("M0 0") else (10, 20)
+    for d in (absolute, relative):
+        assert_subpaths(d, [(start, segments, False)])
+
+def test_repeated_commands_match_implicit_repetition():
+    expected = [((0, 0), [line((0, 0), (1, 1)), line((1, 1), (3, 2)), line((3, 2), (3, 5))], False)]
+    assert_subpaths("M0,0 L1,1 L3,2 L3,5", expected)
+    assert_subpaths("M0 0 L1 1 3 2 3 5", expected)
+    assert_subpaths("m0 0 l1 1 l2 1 l0 3", expected)
+    assert_subpaths("M0 0 1 1 3 2 3 5", expected)
+    assert_subpaths("m0 0 1 1 2 1 0 3", expected)
+
+def test_compact_numbers():
+    assert_subpaths("M10-5L.5.5", [((10, -5), [line((10, -5), (0.5, 0.5))], False)])
+    assert_subpaths("M1e1,2E-1l-1-1", [((10, 0.2), [line((10, 0.2), (9, -0.8))], False)])
+
+def test_close_and_subpaths():
+    # After Z the current point is the subpath's start again
+    assert_subpaths("M0 0 L10 0 10 10 Z m5 5 l1 0 z M20 20 L30 30", [
+        ((0, 0), [line((0, 0), (10, 0)), line((10, 0), (10, 10))], True),
+        ((5, 5), [line((5, 5), (6, 5))], True),
+        ((20, 20), [line((20, 20), (30, 30))], False),
+    ])
+
+def test_move_only_has_no_subpaths():
+    assert parse_path_data("M10 10") == []
+    assert parse_path_data("M10 10 M20 20") == []
+
+def test_export_round_trip():
+    paths = []
+    rng = np.random.default_rng(0)
+    for count in (2, 3, 10):
+        path = Path()
+        # Exported coordinates have one decimal
+        positions, handles_in, handles_out = np.round(rng.random((3, count, 2)) * 500, 1)
+        path.extend_points(positions, handles_in, handles_out,
+                           has_in=np.arange(count) > 0, has_out=np.arange(count) < count - 1)
+        path.stroke_color = "#FF6B6B"
+        path.stroke_width = 2.5
+        path.fill = "#00FF00"
+        paths.append(path)
+
+    stream = io.StringIO()
+    write_svg(paths, stream)
+    imported = list(iter_svg_paths(io.BytesIO(stream.getvalue().encode("utf-8"))))
+
+    assert len(imported) == len(paths)
+    for old, new in zip(paths, imported):
+        n = old.storage.count
+        assert new.storage.count == n
+        for column in ("has_in", "has_out"):
+            assert np.array_equal(getattr(new.storage, column)[:n], getattr(old.storage, column)[:n])
+        # Flipping y twice is not exact in binary floating point
+        np.testing.assert_allclose(new.storage.positions[:n], old.storage.positions[:n])
+        np.testing.assert_allclose(new.storage.handles_in[1:n], old.storage.handles_in[1:n])
+        np.testing.assert_allclose(new.storage.handles_out[:n - 1], old.storage.handles_out[:n - 1])
+        assert (new.stroke_color, new.stroke_width, new.fill) == ("#FF6B6B", 2.5, "#00FF00")
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from utils import (bezier_segments, evaluate_bezier, bezier_bounds, flatten_beziers,
+                   segment_lengths, arc_length_table, parameter_at_length,
+                   nearest_on_beziers, split_bezier)
+
+def random_segments(count, seed=0):
+    return np.random.default_rng(seed).random((count, 4, 2)) * 200 - 100
+
+def smooth_segments(count, seed=0):
+    """Segments without cusps, like those fitted to strokes."""
+    rng = np.random.default_rng(seed)
+    segments = np.empty((count, 4, 2))
+    segments[:, :, 0] = np.arange(4) * 33 + rng.uniform(-10, 10, (count, 4))
+    segments[:, :, 1] = rng.uniform(-30, 30, (count, 4))
+    return segments
+
+def dense(segments, count=4001):
+    return evaluate_bezier(segments, np.linspace(0, 1, count))
+
+def distance_to_polyline(points, polyline):
+    """Distance from each point to the nearest piece of `polyline`."""
+    starts, ends = polyline[:-1], polyline[1:]
+    directions = ends - starts
+    lengths = np.maximum(np.einsum("ij,ij->i", directions, directions), 1e-300)
+    offsets = points[:, None, :] - starts[None]
+    t = np.clip(np.einsum("pij,ij->pi", offsets, directions) / lengths, 0, 1)
+    nearest = starts[None] + t[..., None] * directions[None]
+    return np.hypot(*(points[:, None, :] - nearest).T).T.min(axis=1)
+
+def test_bezier_segments_layout():
+    points = np.arange(20, dtype=float).reshape(10, 2)
+    segments = bezier_segments(points)
+    assert segments.shape == (3, 4, 2)
+    assert np.array_equal(segments[1], points[3:7])
+    # An incomplete trailing group is not drawn
+    assert len(bezier_segments(points[:9])) == 2
+    assert bezier_segments(points[:1]).shape == (0, 4, 2)
+
+def test_bezier_bounds_contain_the_curve_tightly():
+    segments = random_segments(200)
+    boxes = bezier_bounds(segments)
+    samples = dense(segments)
+    low, high = samples.min(axis=1), samples.max(axis=1)
+    assert (boxes[:, :2] <= low + 1e-9).all()
+    assert (boxes[:, 2:] >= high - 1e-9).all()
+    # The extremes are reached, not just bounded
+    np.testing.assert_allclose(boxes, np.concatenate((low, high), axis=1), atol=1e-3)
+
+def test_bezier_bounds_of_degenerate_segments():
+    # Evenly spaced control points on a line make the derivative constant
+    line = np.array([[[0, 0], [10, 5], [20, 10], [30, 15]]], dtype=float)
+    assert np.allclose(bezier_bounds(line), [[0, 0, 30, 15]])
+    point = np.zeros((1, 4, 2))
+    assert np.allclose(bezier_bounds(point), [[0, 0, 0, 0]])
+
+@pytest.mark.parametrize("tolerance, scale", [(0.25, 1.0), (1.0, 1.0), (0.25, 8.0)])
+def test_flatten_beziers_stays_within_tolerance(tolerance, scale):
+    segments = random_segments(20, seed=1)
+    points, starts = flatten_beziers(segments, tolerance, scale)
+    assert starts[0] == 0 and starts[-1] == len(points)
+    for segment, start, end in zip(segments, starts[:-1], starts[1:]):
+        polyline = points[start:end]
+        assert np.array_equal(polyline[0], segment[0])
+        assert np.allclose(polyline[-1], segment[3])
+        curve = dense(segment[None], 1001)[0]
+        assert distance_to_polyline(curve, polyline).max() <= tolerance / scale + 1e-9
+
+def test_segment_lengths_match_dense_polylines():
+    segments = smooth_segments(50, seed=2)
+    samples = dense(segments, 20001)
+    expected = np.hypot(*np.diff(samples, axis=1).T).sum(axis=0)
+    np.testing.assert_allclose(segment_lengths(segments), expected, rtol=1e-6)
+    assert len(segment_lengths(np.empty((0, 4, 2)))) == 0
+
+def test_arc_length_table():
+    segments = smooth_segments(5, seed=3)
+    table = arc_length_table(segments, samples=16)
+    assert len(table) == 5 * 16 + 1
+    assert table[0] == 0
+    assert (np.diff(table) >= 0).all()
+    np.testing.assert_allclose(table[16::16], np.cumsum(segment_lengths(segments)), rtol=1e-3)
+    assert np.array_equal(arc_length_table(np.empty((0, 4, 2))), [0.0])
+
+def test_parameter_at_length():
+    segments = random_segments(3, seed=4)
+    table = arc_length_table(segments, samples=8)
+
+    # Table entries map to the sample parameters they were measured at
+    j = np.arange(len(table) - 1)
+    segment, t = parameter_at_length(table, table[:-1], samples=8)
+    assert np.array_equal(segment, j // 8)
+    np.testing.assert_allclose(t, (j % 8) / 8, atol=1e-12)
+
+    # Between entries the parameter is interpolated linearly
+    segment, t = parameter_at_length(table, (table[9] + table[10]) / 2, samples=8)
+    assert segment == 1
+    assert t == pytest.approx(1.5 / 8)
+
+    # Lengths outside the chain are clamped to its ends
+    segment, t = parameter_at_length(table, np.array([-5.0, table[-1], table[-1] + 5]), samples=8)
+    assert segment.tolist() == [0, 2, 2]
+    np.testing.assert_allclose(t, [0, 1, 1])
+
+@pytest.mark.parametrize("t", [0.0, 0.3, 0.5, 0.9, 1.0])
+def test_split_bezier_halves_trace_the_curve(t):
+    segment = random_segments(1, seed=5)[0]
+    left, right = split_bezier(segment, t)
+    s = np.linspace(0, 1, 11)
+    curve = lambda u: evaluate_bezier(segment[None], u)[0]
+    np.testing.assert_allclose(evaluate_bezier(left[None], s)[0], curve(s * t), atol=1e-9)
+    np.testing.assert_allclose(evaluate_bezier(right[None], s)[0], curve(t + s * (1 - t)), atol=1e-9)
+
+@pytest.mark.parametrize("segments", [smooth_segments(8, seed=6), random_segments(8, seed=11)],
+                         ids=["smooth", "looping"])
+def test_nearest_on_beziers_matches_brute_force(segments):
+    samples = dense(segments, 20001)
+    rng = np.random.default_rng(8)
+    # Points near the stroke, where hit-testing asks, and further away
+    near = samples[rng.integers(8, size=100), rng.integers(20001, size=100)]
+    points = np.concatenate((near + rng.normal(scale=3, size=near.shape),
+                             rng.uniform(-150, 150, (100, 2))))
+    for point in points:
+        index, t, distance = nearest_on_beziers(segments, point)
+        found = evaluate_bezier(segments[index:index + 1], [t])[0, 0]
+        assert distance == pytest.approx(np.hypot(*(found - point)))
+        # Sampling slack: neighbouring samples of these curves are well under 0.1 apart
+        assert abs(distance - np.hypot(*(samples - point).T).min()) <= 0.1
@@ -0,0 +1,191 @@
+"""Render one VectorCraft document to a very large image, tile by tile.
+
+Usage:
+
+    python tiled_render.py poster.vcd poster.png --width 30000 --tile 1024 -j 8
+
+The image is split into square tiles that worker processes render in
+parallel, each drawing only the paths whose bounds reach its tile. Tiles are
+written straight into a memory-mapped output file, so memory use stays near
+one tile per worker whatever the image size. `.pam` outputs are that file
+(a Netpbm RGBA image); `.png` outputs are encoded from it in strips of rows
+once all tiles are done.
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import numpy as np
+
+PAM_HEADER = "P7\nWIDTH {}\nHEIGHT {}\nDEPTH 4\nMAXVAL 255\nTUPLTYPE RGB_ALPHA\nENDHDR\n"
+
+_application = None
+_document = None
+
+class RasterFile:
+    """A memory-mapped RGBA image stored as a Netpbm PAM file."""
+
+    def __init__(self, filename, width, height, mode="r+"):
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.offset = len(PAM_HEADER.format(width, height))
+        self.pixels = np.memmap(filename, dtype=np.uint8, mode=mode, offset=self.offset,
+                                shape=(height, width, 4))
+
+    @classmethod
+    def create(cls, filename, width, height):
+        header = PAM_HEADER.format(width, height).encode("ascii")
+        with open(filename, "wb") as file:
+            file.write(header)
+            # Sparse on most file systems; pages are only backed when written
+            file.truncate(len(header) + width * height * 4)
+        return cls(filename, width, height)
+
+    def close(self):
+        self.pixels.flush()
+        self.pixels = None
+
+def write_png(raster, filename, strip_rows=256, level=6):
+    """Encode a `RasterFile` as an RGBA PNG, `strip_rows` rows at a time."""
+    def chunk(file, kind, data):
+        file.write(struct.pack(">I", len(data)))
+        file.write(kind + data)
+        file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    compressor = zlib.compressobj(level)
+    with open(filename, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        chunk(file, b"IHDR", struct.pack(">IIBBBBB", raster.width, raster.height,
+                                         8, 6, 0, 0, 0))
+        for top in range(0, raster.height, strip_rows):
+            strip = raster.pixels[top:top + strip_rows]
+            # Every scanline starts with its filter type, 0 (none)
+            scanlines = np.zeros((len(strip), raster.width * 4 + 1), dtype=np.uint8)
+            scanlines[:, 1:] = strip.reshape(len(strip), -1)
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                chunk(file, b"IDAT", data)
+        chunk(file, b"IDAT", compressor.flush())
+        chunk(file, b"IEND", b"")
+
+def tile_grid(width, height, tile_size):
+    """(x, y, width, height) of the tiles covering the image, row by row."""
+    return [(x, y, min(tile_size, width - x), min(tile_size, height - y))
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)]
+
+def _init_worker(filename):
+    # Qt is only imported in the workers, after the platform is chosen
+    global _application, _document
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PyQt6.QtGui import QGuiApplication
+    _application = QGuiApplication([])
+    from rasterize import load_document
+    from render_cache import PainterPathCache
+    # Painter paths are kept for the worker's lifetime, so a path spanning
+    # several tiles is only built once per worker
+    _document = (load_document(filename), PainterPathCache())
+
+def render_tile(raster_name, image_width, image_height, view, tile, background):
+    """Render one tile of the view straight into the raster file."""
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QImage, QPainter, QColor
+    from rasterize import render_region
+    path_manager, cache = _document
+    left, top, scale = view
+    x, y, width, height = tile
+
+    image = QImage(width, height, QImage.Format.Format_RGBA8888_Premultiplied)
+    image.fill(QColor(background) if background else Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    render_region(painter, path_manager, left, top, scale, width, height, cache, x, y)
+    painter.end()
+    image = image.convertToFormat(QImage.Format.Format_RGBA8888)
+
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(bits, dtype=np.uint8)
+    pixels = pixels.reshape(height, image.bytesPerLine())[:, :width * 4]
+    raster = RasterFile(raster_name, image_width, image_height)
+    raster.pixels[y:y + height, x:x + width] = pixels.reshape(height, width, 4)
+    raster.close()
+    return tile
+
+def render_tiled(filename, output, width=None, height=None, scale=1.0, margin=0,
+                 background="#FFFFFF", tile_size=1024, jobs=None, progress=None):
+    """Render `filename` to a .pam or .png `output` using tiled workers.
+
+    Sizing follows `rasterize.render_document`, and every tile is drawn with
+    the same view, so the result matches a single-pass render exactly.
+    `progress(done, total)` is called after each tile.
+    """
+    from rasterize import load_document, document_bounds, fit_view, view_origin
+    box = document_bounds(load_document(filename)) or (0.0, 0.0, 1.0, 1.0)
+    scale, width, height = fit_view(box, width, height, scale, margin)
+    left, top = view_origin(box, scale, width, height)
+
+    is_png = output.lower().endswith(".png")
+    raster_name = output + ".pam.tmp" if is_png else output
+    raster = RasterFile.create(raster_name, width, height)
+    tiles = tile_grid(width, height, tile_size)
+    jobs = max(1, min(jobs or os.cpu_count(), len(tiles)))
+    try:
+        # Workers are spawned so no Qt state is inherited from the parent
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                                 initializer=_init_worker, initargs=(filename,)) as executor:
+            futures = [executor.submit(render_tile, raster_name, width, height,
+                                       (left, top, scale), tile, background)
+                       for tile in tiles]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if progress:
+                    progress(done, len(tiles))
+        if is_png:
+            write_png(raster, output)
+    finally:
+        raster.close()
+        if is_png:
+            os.remove(raster_name)
+    return width, height, len(tiles)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help=".vcd, .svg or .svgz document")
+    parser.add_argument("output", help="output image, .png or .pam")
+    parser.add_argument("--width", type=int, help="fit the drawing into this many pixels")
+    parser.add_argument("--height", type=int, help="fit the drawing into this many pixels")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="pixels per scene unit when no size is given")
+    parser.add_argument("--margin", type=int, default=0, help="border in pixels")
+    parser.add_argument("--background", default="#FFFFFF",
+                        help="background color, or 'none' for transparency")
+    parser.add_argument("--tile", type=int, default=1024, help="tile size in pixels")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    background = None if args.background.lower() == "none" else args.background
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"\r{done}/{total} tiles", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    width, height, tiles = render_tiled(args.file, args.output, args.width, args.height,
+                                        args.scale, args.margin, background,
+                                        max(args.tile, 16), args.jobs, progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Rendered {width}x{height} in {tiles} tiles in "
+          f"{time.perf_counter() - start:.2f} s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
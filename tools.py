@@ -1,9 +1,12 @@
 from enum import Enum
 import numpy as np
 from utils import distance, normalize_vector
+from snapping import SnapEngine
+from selection import Selection
 
 class ToolMode(Enum):
     PEN = "pen"
+    SELECT = "select"
     DIRECT_SELECT = "direct_select"
     FREEFORM = "freeform"
     ADD_SNAP_POINT = "add_snap_point"
@@ -20,42 +23,8 @@ class SnapPoint:
         return self.position.copy()
 
 class DirectSelectTool:
-    SELECTION_THRESHOLD = 8
-
-    @staticmethod
-    def find_closest_point(pos, path, threshold):
-        """Find the closest point or handle within threshold distance."""
-        min_dist = float('inf')
-        closest = None
-        is_handle = False
-        is_in_handle = False
-
-        for point in path.points:
-            # Check anchor point
-            dist = distance(np.array(pos), point.position)
-            if dist < min_dist and dist < threshold:
-                min_dist = dist
-                closest = point
-                is_handle = False
-
-            # Check handles
-            if point.handle_in is not None:
-                dist = distance(np.array(pos), point.handle_in)
-                if dist < min_dist and dist < threshold:
-                    min_dist = dist
-                    closest = point
-                    is_handle = True
-                    is_in_handle = True
-
-            if point.handle_out is not None:
-                dist = distance(np.array(pos), point.handle_out)
-                if dist < min_dist and dist < threshold:
-                    min_dist = dist
-                    closest = point
-                    is_handle = True
-                    is_in_handle = False
-
-        return closest, is_handle, is_in_handle
+    # Hit-testing goes through `PathManager.find_closest_point`
+    SELECTION_THRESHOLD = 10
 
 class ToolState:
     def __init__(self):
@@ -69,6 +38,11 @@ class ToolState:
         self.last_pos = None
         self.show_snap_radius = True
         self.snap_points = []
+        self.snap_engine = SnapEngine()
+        # Anchors picked with the select tool
+        self.selection = Selection()
+        # Autosave journal notified when snap points are added or cleared
+        self.journal = None
 
     def set_mode(self, mode):
         self.current_mode = mode
@@ -82,18 +56,32 @@ class ToolState:
         self.hover_handle = None
         self.is_handle_in = False
         self.last_pos = None
+        self.selection.clear()
+
+    def add_snap_point(self, position, radius=20):
+        snap_point = SnapPoint(position, radius)
+        self.snap_points.append(snap_point)
+        self.snap_engine.add_snap_point(snap_point)
+        if self.journal is not None:
+            self.journal.snap_point_added(snap_point)
 
-    def add_snap_point(self, position):
-        self.snap_points.append(SnapPoint(position))
+    def clear_snap_points(self):
+        self.snap_points = []
+        self.snap_engine.clear_snap_points()
+        if self.journal is not None:
+            self.journal.snap_points_cleared()
 
     def toggle_snap_radius_visibility(self):
         self.show_snap_radius = not self.show_snap_radius
 
-    def get_snap_position(self, position):
-        for snap_point in self.snap_points:
-            if snap_point.should_snap(position):
-                return snap_point.get_snap_position()
-        return np.array(position)
+    def toggle_grid_snapping(self):
+        self.snap_engine.snap_to_grid = not self.snap_engine.snap_to_grid
+
+    def toggle_anchor_snapping(self):
+        self.snap_engine.snap_to_anchors = not self.snap_engine.snap_to_anchors
+
+    def get_snap_position(self, position, exclude=None):
+        return self.snap_engine.snap(position, exclude)
 
 class PenTool:
     HANDLE_LENGTH = 50
@@ -10,30 +10,33 @@ def calculate_bezier_point(t, p0, p1, p2, p3):
         t**3 * p3
     )
 
-def generate_svg_path(points, canvas_height=600):
-    """Generate SVG path command from control points."""
-    if len(points) < 2:
-        return ""
+SVG_SEGMENT_FORMAT = "C %.1f,%.1f %.1f,%.1f %.1f,%.1f "
+SVG_CHUNK_SEGMENTS = 4096
 
-    # Transform function to flip y coordinates
-    def transform_point(point):
-        return (point[0], canvas_height - point[1])
+def iter_svg_path_data(points, canvas_height=600, chunk_segments=SVG_CHUNK_SEGMENTS):
+    """Yield SVG path commands for control points in chunks of segments.
+
+    Coordinates are y-flipped and formatted a whole chunk at a time.
+    """
+    if len(points) < 2:
+        return
 
-    # Transform the first point
-    first_point = transform_point(points[0])
-    path = f"M {first_point[0]:.1f},{first_point[1]:.1f} "
+    # Flip y coordinates
+    flipped = np.array(points, dtype=float).reshape(-1, 2)
+    flipped[:, 1] = canvas_height - flipped[:, 1]
 
-    for i in range(1, len(points)-2, 3):
-        # Transform control points and end point
-        c1 = transform_point(points[i])
-        c2 = transform_point(points[i+1])
-        end = transform_point(points[i+2])
+    yield "M %.1f,%.1f " % (flipped[0, 0], flipped[0, 1])
 
-        path += (f"C {c1[0]:.1f},{c1[1]:.1f} "
-                f"{c2[0]:.1f},{c2[1]:.1f} "
-                f"{end[0]:.1f},{end[1]:.1f} ")
+    # Every complete group of control point, control point, end point
+    segment_count = (len(flipped) - 1) // 3
+    segments = flipped[1:1 + 3 * segment_count].reshape(segment_count, 6)
+    for start in range(0, segment_count, chunk_segments):
+        chunk = segments[start:start + chunk_segments]
+        yield SVG_SEGMENT_FORMAT * len(chunk) % tuple(chunk.ravel().tolist())
 
-    return path
+def generate_svg_path(points, canvas_height=600):
+    """Generate SVG path command from control points."""
+    return "".join(iter_svg_path_data(points, canvas_height))
 
 def distance(p1, p2):
     """Calculate distance between two points."""
@@ -44,4 +47,235 @@ def normalize_vector(vector):
     length = np.linalg.norm(vector)
     if length == 0:
         return vector
-    return vector / length
\ No newline at end of file
+    return vector / length
+
+# Batched cubic Bezier geometry. Segments are (m, 4, 2) arrays of control
+# points; `bezier_segments` builds them from the `get_bezier_points` layout.
+
+def bezier_segments(points):
+    """Return the (m, 4, 2) cubic segments drawn for a control point list.
+
+    The first point starts the curve and every following complete group of
+    three points is one cubic, exactly as the canvas and SVG export draw it.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    count = max(len(points) - 1, 0) // 3
+    rows = np.arange(count)[:, None] * 3 + np.arange(4)
+    return points[rows]
+
+def _power_coefficients(segments):
+    """(4, m, 1, 2) coefficients a, b, c, d of a*t^3 + b*t^2 + c*t + d."""
+    p0, p1, p2, p3 = (segments[:, i, None, :] for i in range(4))
+    return (p3 - p0 + 3 * (p1 - p2),
+            3 * (p0 - 2 * p1 + p2),
+            3 * (p1 - p0),
+            p0)
+
+def _bernstein_basis(t):
+    """(k, 4) cubic Bernstein weights for parameters `t`."""
+    u = 1 - t
+    return np.stack((u ** 3, 3 * u * u * t, 3 * u * t * t, t ** 3), axis=1)
+
+def _parameters(t):
+    t = np.asarray(t, dtype=float)
+    if t.ndim < 2:
+        t = t.reshape(1, -1)
+    return t[..., None]
+
+def evaluate_bezier(segments, t):
+    """Evaluate many segments at many parameters.
+
+    A 1-D `t` of length k is applied to every segment and a 2-D `t` of shape
+    (m, k) gives each segment its own parameters; the result is (m, k, 2).
+    """
+    a, b, c, d = _power_coefficients(segments)
+    t = _parameters(t)
+    return ((a * t + b) * t + c) * t + d
+
+def bezier_derivative(segments, t):
+    """First derivative B'(t), with the same shapes as `evaluate_bezier`."""
+    a, b, c, _ = _power_coefficients(segments)
+    t = _parameters(t)
+    return (3 * a * t + 2 * b) * t + c
+
+def bezier_second_derivative(segments, t):
+    """Second derivative B''(t), with the same shapes as `evaluate_bezier`."""
+    a, b, _, _ = _power_coefficients(segments)
+    return 6 * a * _parameters(t) + 2 * b
+
+def flatten_segment_counts(segments, tolerance=0.25, scale=1.0):
+    """Number of line pieces per segment to stay within `tolerance`.
+
+    Uses Wang's formula on the second differences of the control points.
+    `tolerance` is in screen pixels and `scale` is the zoom factor, so the
+    flattening adapts to how large the curve is drawn.
+    """
+    first = segments[:, 0] - 2 * segments[:, 1] + segments[:, 2]
+    last = segments[:, 1] - 2 * segments[:, 2] + segments[:, 3]
+    second = np.sqrt(np.maximum(np.einsum("ij,ij->i", first, first),
+                                np.einsum("ij,ij->i", last, last)))
+    counts = np.ceil(np.sqrt(0.75 * second * scale / tolerance))
+    return np.maximum(counts, 1).astype(np.int64)
+
+def flatten_beziers(segments, tolerance=0.25, scale=1.0):
+    """Flatten many segments into polylines in one pass.
+
+    Returns (points, starts): segment i becomes the polyline
+    points[starts[i]:starts[i + 1]], which includes both of its endpoints.
+    """
+    segments = np.asarray(segments, dtype=float)
+    counts = flatten_segment_counts(segments, tolerance, scale)
+    sizes = counts + 1
+    starts = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=starts[1:])
+
+    # Segments needing the same number of pieces are evaluated together as
+    # one matrix product with the Bernstein basis of their parameters
+    points = np.empty((starts[-1], 2))
+    packed = points.view(np.complex128).reshape(-1)
+    for count in np.flatnonzero(np.bincount(counts)):
+        group = np.flatnonzero(counts == count)
+        basis = _bernstein_basis(np.linspace(0, 1, count + 1)).T
+        controls = segments[group]
+        xs = controls[:, :, 0] @ basis
+        ys = controls[:, :, 1] @ basis
+        # Scatter whole (x, y) pairs at once through a complex view
+        packed[starts[group, None] + np.arange(count + 1)] = xs + 1j * ys
+    return points, starts
+
+_GAUSS_LEGENDRE = None
+
+def _gauss_legendre():
+    """16-point Gauss-Legendre nodes and weights, computed on first use.
+
+    numpy.polynomial is only loaded here, which keeps it out of startup.
+    """
+    global _GAUSS_LEGENDRE
+    if _GAUSS_LEGENDRE is None:
+        _GAUSS_LEGENDRE = np.polynomial.legendre.leggauss(16)
+    return _GAUSS_LEGENDRE
+
+def segment_lengths(segments):
+    """Arc length of every segment by 16-point Gauss-Legendre quadrature."""
+    if len(segments) == 0:
+        return np.zeros(0)
+    nodes, weights = _gauss_legendre()
+    t = (nodes + 1) / 2
+    u = 1 - t
+    # Quadratic Bernstein basis of the derivative's control points
+    basis = 3 * np.stack((u * u, 2 * u * t, t * t))
+    deltas = np.diff(segments, axis=1)
+    speed = np.hypot(deltas[:, :, 0] @ basis, deltas[:, :, 1] @ basis)
+    return speed @ weights / 2
+
+def arc_length_table(segments, samples=16):
+    """Cumulative arc length along a chain of segments.
+
+    Entry j is the length up to parameter j / samples of the chain, where
+    segment i spans the parameters i..i+1; the result has
+    m * samples + 1 entries and starts at 0.
+    """
+    if len(segments) == 0:
+        return np.zeros(1)
+    t = np.linspace(0, 1, samples + 1)
+    polyline = evaluate_bezier(segments, t)
+    steps = np.hypot(*np.diff(polyline, axis=1).T).T
+    table = np.zeros(len(segments) * samples + 1)
+    np.cumsum(steps.ravel(), out=table[1:])
+    return table
+
+def parameter_at_length(table, lengths, samples=16):
+    """Map arc lengths to (segment index, t) arrays using an `arc_length_table`."""
+    lengths = np.clip(np.asarray(lengths, dtype=float), 0, table[-1])
+    upper = np.clip(np.searchsorted(table, lengths, side="right"), 1, len(table) - 1)
+    low, high = table[upper - 1], table[upper]
+    span = high - low
+    fraction = np.divide(lengths - low, span, out=np.zeros_like(lengths), where=span > 0)
+    position = (upper - 1 + fraction) / samples
+    segment = np.minimum(position.astype(np.int64), len(table) // samples - 1)
+    return segment, position - segment
+
+def bezier_bounds(segments):
+    """Exact (m, 4) bounding boxes of the curves as (left, top, right, bottom).
+
+    The extremes are at the endpoints or where the derivative of a
+    coordinate vanishes, which is a quadratic solved for all segments at once.
+    """
+    p0, p1, p2, p3 = (segments[:, i] for i in range(4))
+    a = -p0 + 3 * p1 - 3 * p2 + p3
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(np.maximum(b * b - 4 * a * c, 0))
+        has_roots = b * b - 4 * a * c >= 0
+        linear = np.abs(a) < 1e-12
+        candidates = np.stack((
+            np.where(linear, -c / b, (-b + root) / (2 * a)),
+            np.where(linear, np.nan, (-b - root) / (2 * a)),
+        ))
+    valid = (candidates > 0) & (candidates < 1) & (has_roots | linear)
+    candidates = np.where(valid, candidates, 0.0)
+
+    # Evaluate each coordinate at its own critical parameters
+    u = 1 - candidates
+    values = (u ** 3 * p0 + 3 * u ** 2 * candidates * p1 +
+              3 * u * candidates ** 2 * p2 + candidates ** 3 * p3)
+    values = np.where(valid, values, p0)
+
+    low = np.minimum(np.minimum(p0, p3), values.min(axis=0))
+    high = np.maximum(np.maximum(p0, p3), values.max(axis=0))
+    return np.concatenate((low, high), axis=1)
+
+def nearest_on_beziers(segments, point, samples=16, iterations=4):
+    """Return (segment index, t, distance) of the closest curve point.
+
+    Every segment is sampled coarsely to bracket its closest parameters,
+    which are then refined with Newton steps on (B(t) - P) . B'(t) kept
+    inside their brackets. Every local minimum of the samples is refined,
+    as the closest sample can lie in the wrong basin of a looping segment.
+    All candidates are solved together.
+    """
+    point = np.asarray(point, dtype=float)
+    grid = np.linspace(0, 1, samples + 1)
+    offsets = evaluate_bezier(segments, grid) - point
+    squared = np.einsum("mkj,mkj->mk", offsets, offsets)
+    padded = np.pad(squared, ((0, 0), (1, 1)), constant_values=np.inf)
+    minima = np.pad((squared <= padded[:, :-2]) & (squared <= padded[:, 2:]), ((0, 0), (1, 1)))
+    # Newton stalls where the distance is concave, so also start next to each minimum
+    rows, coarse = np.nonzero(minima[:, :-2] | minima[:, 1:-1] | minima[:, 2:])
+    candidates = segments[rows]
+    low = np.maximum(coarse - 1, 0) / samples
+    high = np.minimum(coarse + 1, samples) / samples
+
+    t = grid[coarse]
+    for _ in range(iterations):
+        offset = evaluate_bezier(candidates, t[:, None])[:, 0] - point
+        first = bezier_derivative(candidates, t[:, None])[:, 0]
+        second = bezier_second_derivative(candidates, t[:, None])[:, 0]
+        numerator = np.einsum("mj,mj->m", offset, first)
+        denominator = np.einsum("mj,mj->m", first, first) + np.einsum("mj,mj->m", offset, second)
+        step = np.divide(numerator, denominator, out=np.zeros_like(t), where=denominator > 0)
+        t = np.clip(t - step, low, high)
+
+    # Newton may wander off a flat spot; never do worse than the sample
+    refined = evaluate_bezier(candidates, t[:, None])[:, 0] - point
+    distances = np.hypot(refined[:, 0], refined[:, 1])
+    sampled = np.sqrt(squared[rows, coarse])
+    worse = sampled < distances
+    t[worse] = grid[coarse[worse]]
+    distances[worse] = sampled[worse]
+
+    index = int(np.argmin(distances))
+    return int(rows[index]), float(t[index]), float(distances[index])
+
+def split_bezier(segment, t):
+    """Split one (4, 2) segment at `t` into its left and right halves."""
+    p0, p1, p2, p3 = np.asarray(segment, dtype=float)
+    q0 = p0 + (p1 - p0) * t
+    q1 = p1 + (p2 - p1) * t
+    q2 = p2 + (p3 - p2) * t
+    r0 = q0 + (q1 - q0) * t
+    r1 = q1 + (q2 - q1) * t
+    s = r0 + (r1 - r0) * t
+    return np.array([p0, q0, r0, s]), np.array([s, r1, q2, p3])